@@ -0,0 +1,124 @@
+"""REST-клиент Streamlit-приложения: пул соединений, TTL-кэш по параметрам, параллельная загрузка."""
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+import pyarrow as pa
+import requests
+import streamlit as st
+from requests.adapters import HTTPAdapter
+from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
+
+
+def _setting(name: str, default: str) -> str:
+    """Переменная окружения, затем .streamlit/secrets.toml, затем значение по умолчанию."""
+    if name in os.environ:
+        return os.environ[name]
+    try:
+        return str(st.secrets.get(name, default))
+    except FileNotFoundError:  # secrets.toml нет — это не ошибка
+        return default
+
+
+BASE = _setting("API_BASE", "http://localhost:8000/api").rstrip("/")
+# (соединение, чтение), сек; чтение с запасом на обучение модели прогноза
+TIMEOUT = (float(_setting("API_CONNECT_TIMEOUT", "3")), float(_setting("API_READ_TIMEOUT", "120")))
+ARROW = {"Accept": "application/vnd.apache.arrow.stream"}
+TTL = 600
+
+
+class ApiError(Exception):
+    """Ответ API с кодом ошибки; текст ответа — в str(e)."""
+
+
+@st.cache_resource
+def session() -> requests.Session:
+    s = requests.Session()
+    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=16)
+    s.mount("http://", adapter)
+    s.mount("https://", adapter)
+    return s
+
+
+def _call(method: str, path: str, **kwargs) -> requests.Response:
+    try:
+        r = session().request(method, f"{BASE}{path}", timeout=TIMEOUT, **kwargs)
+    except (requests.ConnectionError, requests.Timeout) as e:
+        raise ApiError(f"API недоступен ({BASE}): {e}") from e
+    if not r.ok:
+        raise ApiError(r.text)
+    return r
+
+
+def _read_arrow(resp: requests.Response) -> tuple[pd.DataFrame, dict]:
+    table = pa.ipc.open_stream(resp.content).read_all()
+    meta = json.loads((table.schema.metadata or {}).get(b"meta", b"{}"))
+    return table.to_pandas(), meta
+
+
+@st.cache_data(ttl=TTL, show_spinner=False)
+def find_indices(q: str, cursor: str | None = None, limit: int = 50) -> tuple[pd.DataFrame, str | None, int | None]:
+    """Страница поиска: (индексы, курсор следующей страницы, всего найдено — только для первой)."""
+    r = _call("GET", "/index/indices", params={"q": q, "cursor": cursor, "limit": limit})
+    total = r.headers.get("X-Total-Count")
+    return pd.DataFrame(r.json()), r.headers.get("X-Next-Cursor"), int(total) if total else None
+
+
+@st.cache_data(ttl=TTL, show_spinner=False)
+def securities(year: int, quarter: int) -> pd.DataFrame:
+    r = _call("GET", "/securities", params={"year": year, "quarter": quarter}, headers=ARROW)
+    return _read_arrow(r)[0].set_axis(["ID", "Name"], axis=1)
+
+
+@st.cache_data(ttl=TTL, show_spinner=False)
+def index_series(index_id: int, d_from, d_till, points: int) -> pd.DataFrame:
+    r = _call(
+        "GET", f"/index/{index_id}/series",
+        params={"from": str(d_from), "till": str(d_till), "points": points},
+        headers=ARROW,
+    )
+    df = _read_arrow(r)[0]
+    return df.set_index("date") if not df.empty else df
+
+
+@st.cache_data(ttl=TTL, show_spinner=False)
+def index_stats(index_id: int) -> dict:
+    return _call("GET", f"/index/{index_id}/stats").json()
+
+
+@st.cache_data(ttl=TTL, show_spinner=False)
+def forecast(assets: tuple[tuple[str, int], ...], model: str) -> tuple[pd.DataFrame, dict]:
+    payload = {"assets": [{"secid": s, "shares": n} for s, n in assets], "model": model}
+    frame, metrics = _read_arrow(_call("POST", "/forecast", json=payload, headers=ARROW))
+    return frame.set_index("date"), metrics
+
+
+@st.cache_data(ttl=TTL, show_spinner=False)
+def report(assets: tuple[tuple[str, int], ...]) -> bytes:
+    payload = {"assets": [{"secid": s, "shares": n} for s, n in assets]}
+    return _call("POST", "/report", json=payload).content
+
+
+def create_index(payload: dict) -> dict:
+    info = _call("POST", "/index", json=payload).json()
+    find_indices.clear()
+    return info
+
+
+def parallel(*calls) -> list:
+    """Выполнить независимые вызовы (fn, *args) параллельно; ошибки возвращаются как значения."""
+    ctx = get_script_run_ctx()
+
+    def run(call):
+        add_script_run_ctx(ctx=ctx)
+        fn, *args = call
+        try:
+            return fn(*args)
+        except ApiError as e:
+            return e
+
+    if len(calls) <= 1:
+        return [run(c) for c in calls]
+    with ThreadPoolExecutor(max_workers=len(calls)) as pool:
+        return list(pool.map(run, calls))
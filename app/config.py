@@ -1,9 +1,56 @@
+from datetime import time
 from pathlib import Path
 from pydantic_settings import BaseSettings
 
 
 class Settings(BaseSettings):
     DB_URL: str = f"sqlite:///{Path(__file__).resolve().parent.parent / 'db.sqlite3'}"
+    WARMUP: bool = False  # прогреть ML-стек в фоне при старте воркера
+    UPSTREAM_URL: str | None = None  # перенаправить запросы к MOEX на локальный стенд (benchmarks/fake_iss.py)
+
+    # Обращения к MOEX (services/upstream.py)
+    UPSTREAM_TIMEOUT: float = 10  # на одну попытку, сек
+    UPSTREAM_DEADLINE: float = 25  # на вызов вместе с ретраями, сек
+    UPSTREAM_RETRIES: int = 2
+    UPSTREAM_BACKOFF: float = 0.2  # база экспоненциальной задержки между попытками, сек
+    UPSTREAM_HEDGE_PCTL: float = 0.95  # перцентиль задержки, после которого шлётся дубль; 0 — без дублей
+    UPSTREAM_BREAKER_FAILURES: int = 5  # неудач подряд до размыкания хоста
+    UPSTREAM_BREAKER_COOLDOWN: float = 30  # сек до пробного запроса
+
+    # Торговая сессия (время московское) и прогрев кэшей после закрытия (services/prefetch.py)
+    SESSION_OPEN: time = time(9, 50)
+    SESSION_CLOSE: time = time(18, 50)
+    CALENDAR_REFRESH_H: float = 6  # как часто перечитывать торговый календарь из истории IMOEX
+    QUOTE_TTL: float = 60  # сек жизни котировки, пока идут торги; после закрытия — до следующего открытия
+    LIVE_IDLE_TICK: float = 300  # сек между пересчётами live-значений вне сессии (в сессию — QUOTE_TTL)
+    PREFETCH: bool = False  # включать на одном воркере/инстансе
+    PREFETCH_DELAY_MIN: float = 30  # через сколько минут после закрытия прогревать
+    PREFETCH_CONCURRENCY: int = 8
+    PREFETCH_RECENT_DAYS: int = 14  # бумаги из прогнозов/отчётов за столько дней
+
+    # Внутридневные бары: минутные хранятся столько дней, затем сворачиваются в 10-минутные, те — в часовые
+    INTRADAY_KEEP_1M_DAYS: int = 30
+    INTRADAY_KEEP_10M_DAYS: int = 365
+
+    # Бюджет CPU для обучения моделей и отчётов (services/cpu_budget.py)
+    CPU_BUDGET: int = 0  # потоков на процесс; 0 — по числу доступных ядер
+    CPU_INTERACTIVE_RESERVE: int = 1  # потоков, которые обучение TFT не занимает
+    CPU_QUEUE_MAX: int = 16  # ожидающих расчётов сверх бюджета; дальше — 503
+    CPU_QUEUE_TIMEOUT: float = 30  # сек ожидания потоков до 503
+
+    # Ковариация доходностей для весов min_variance / risk_parity / max_diversification (services/covariance.py)
+    COV_WINDOW: int = 252  # торговых дней в окне
+    COV_MIN_OBS: int = 60  # бумага с меньшим числом доходностей в окне в оптимизацию не берётся
+
+    RESULT_CACHE_MB: float = 64  # кэш готовых ответов /forecast, /report, /series, /stats
+    VALUATION_CACHE: int = 128  # наборов бумаг с выровненными ценами и IMOEX (services/valuation.py)
+
+    # Профилирование по запросу: без токена middleware не подключается вовсе
+    PROFILE_TOKEN: str | None = None
+    PROFILE_DIR: Path = Path(__file__).resolve().parent.parent / "profiles"
+    PROFILE_KEEP: int = 50  # сколько последних профилей хранить
+    PROFILE_MAX_AGE_H: float = 72
+    PROFILE_INTERVAL: float = 0.001  # период сэмплирования, сек
 
     class Config:
         env_file = ".env"
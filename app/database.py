@@ -1,9 +1,87 @@
+import time
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import Date, Float, Integer, String, event, text, type_coerce
+from sqlalchemy.sql import Select
 from sqlmodel import SQLModel, create_engine
 from config import settings
+from utils.metrics import DB_QUERY_SECONDS
 
 
 engine = create_engine(settings.DB_URL, echo=False, connect_args={"check_same_thread": False})
 
 
+# начало запроса хранится в его контексте исполнения: упавший запрос не оставляет
+# «висящей» метки на соединении, которая сбила бы замер следующих
+@event.listens_for(engine, "before_cursor_execute")
+def _query_start(conn, cursor, statement, parameters, context, executemany):
+    if context is not None:
+        context.query_t0 = time.perf_counter()
+
+
+@event.listens_for(engine, "after_cursor_execute")
+def _query_end(conn, cursor, statement, parameters, context, executemany):
+    t0 = getattr(context, "query_t0", None)
+    if t0 is not None:
+        DB_QUERY_SECONDS.observe(time.perf_counter() - t0, op=statement.lstrip().split(None, 1)[0].upper())
+
+
+# полнотекстовый индекс названий для /index/indices: внешнее содержимое — таблица "index",
+# синхронизируется триггерами при любой вставке, удалении и переименовании
+_INDEX_FTS = (
+    """CREATE VIRTUAL TABLE index_fts USING fts5(
+        name, content='index', content_rowid='id', tokenize='unicode61 remove_diacritics 2')""",
+    """CREATE TRIGGER index_fts_ai AFTER INSERT ON "index" BEGIN
+        INSERT INTO index_fts(rowid, name) VALUES (new.id, new.name);
+    END""",
+    """CREATE TRIGGER index_fts_ad AFTER DELETE ON "index" BEGIN
+        INSERT INTO index_fts(index_fts, rowid, name) VALUES ('delete', old.id, old.name);
+    END""",
+    """CREATE TRIGGER index_fts_au AFTER UPDATE OF name ON "index" BEGIN
+        INSERT INTO index_fts(index_fts, rowid, name) VALUES ('delete', old.id, old.name);
+        INSERT INTO index_fts(rowid, name) VALUES (new.id, new.name);
+    END""",
+    # индексы, созданные до появления index_fts
+    "INSERT INTO index_fts(index_fts) VALUES ('rebuild')",
+)
+
+
 def create_db_and_tables():
     SQLModel.metadata.create_all(engine)
+    if engine.dialect.name != "sqlite":
+        return
+    with engine.begin() as conn:
+        exists = conn.execute(text("SELECT 1 FROM sqlite_master WHERE name = 'index_fts'")).first()
+        if not exists:
+            for ddl in _INDEX_FTS:
+                conn.execute(text(ddl))
+
+
+def read_frame(stmt: Select) -> pd.DataFrame:
+    """Core SELECT → DataFrame по столбцам, без ORM-объектов и словарей на строку.
+
+    Столбцы Date приходят как datetime64[ns], Float — float64 (NULL → NaN),
+    Integer — int64 или float64, если есть NULL; остальное — object.
+    """
+    cols = list(stmt.selected_columns)
+    if engine.dialect.name == "sqlite":
+        # SQLite хранит даты ISO-строками: берём их как есть и разбираем одним вызовом numpy
+        stmt = stmt.with_only_columns(
+            *[type_coerce(c, String).label(c.name) if isinstance(c.type, Date) else c for c in cols]
+        )
+    with engine.connect() as conn:
+        rows = conn.execute(stmt).all()
+    values = list(zip(*rows)) if rows else [()] * len(cols)
+
+    data = {}
+    for c, v in zip(cols, values):
+        if isinstance(c.type, Date):
+            data[c.name] = np.array(v, dtype="datetime64[D]").astype("datetime64[ns]")
+        elif isinstance(c.type, Float) or (isinstance(c.type, Integer) and None in v):
+            data[c.name] = np.array(v, dtype=float)
+        elif isinstance(c.type, Integer):
+            data[c.name] = np.array(v, dtype=np.int64)
+        else:
+            data[c.name] = np.array(v, dtype=object)
+    return pd.DataFrame(data)
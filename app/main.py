@@ -1,15 +1,68 @@
-from fastapi import FastAPI
+import asyncio
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+from config import settings
 from database import create_db_and_tables
 from routers.index import router as index_router
 from routers.securities import router as sec_router
 from routers.forecast import router as forecast_router
 from routers.report import router as report_router
+from routers.metrics import router as metrics_router
+from routers.profiles import router as profiles_router
+from utils.profiling import ProfilingMiddleware
+from services.upstream import StaleDataMiddleware, UpstreamUnavailable, retry_after
+from services.prefetch import run_scheduler, flush_requested
+from services.cpu_budget import Overloaded
+from warmup import warm_up
 
-app = FastAPI(title="Custom MOEX Index Builder", version="0.1.0")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    if settings.WARMUP:
+        # в фоне: воркер сразу обслуживает /index и /securities
+        asyncio.get_running_loop().run_in_executor(None, warm_up)
+    scheduler = asyncio.create_task(run_scheduler()) if settings.PREFETCH else None
+    yield
+    if scheduler:
+        scheduler.cancel()
+    await flush_requested()  # запросы с последнего прогрева не теряются при рестарте
+
+
+app = FastAPI(title="Custom MOEX Index Builder", version="0.1.0", lifespan=lifespan)
 
 create_db_and_tables()
 
+app.add_middleware(StaleDataMiddleware)
+
+
+@app.exception_handler(UpstreamUnavailable)
+async def upstream_unavailable(request: Request, exc: UpstreamUnavailable):
+    # MOEX недоступен, а в кэше нечего отдать
+    return JSONResponse(
+        status_code=503,
+        content={"detail": str(exc)},
+        headers={"Retry-After": str(retry_after(exc.host))},
+    )
+
+
+@app.exception_handler(Overloaded)
+async def overloaded(request: Request, exc: Overloaded):
+    # бюджет CPU занят обучением, очередь полна
+    return JSONResponse(
+        status_code=503,
+        content={"detail": str(exc)},
+        headers={"Retry-After": str(exc.retry_after)},
+    )
+
+
 app.include_router(index_router, prefix="/api")
 app.include_router(sec_router, prefix="/api")
 app.include_router(forecast_router, prefix="/api")
 app.include_router(report_router, prefix="/api")
+app.include_router(metrics_router)
+
+if settings.PROFILE_TOKEN:
+    # без токена middleware не подключается: обычные запросы не платят ничего
+    app.add_middleware(ProfilingMiddleware)
+    app.include_router(profiles_router, prefix="/api")
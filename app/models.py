@@ -1,6 +1,7 @@
 from datetime import date
 from typing import List, Optional
 
+from sqlalchemy import Column, LargeBinary
 from sqlmodel import SQLModel, Field, Relationship, UniqueConstraint
 
 
@@ -56,7 +57,28 @@ class ImoexPrice(SQLModel, table=True):
     close: float
 
 
+# Отрезки истории IMOEX, целиком полученные из ISS: будни без значения внутри них — праздники
+class ImoexFetched(SQLModel, table=True):
+    start: date = Field(primary_key=True)
+    end: date
+
+
 class Price(SQLModel, table=True):
     secid: str = Field(default=None, primary_key=True)
     trade_date: date = Field(default=None, primary_key=True, alias="date")
     close: Optional[float]
+
+
+# Бумаги из недавних прогнозов и отчётов: их кэш прогревает services/prefetch.py
+class RecentSecurity(SQLModel, table=True):
+    secid: str = Field(primary_key=True)
+    last_requested: date
+
+
+# Внутридневные бары бумаги за день одного таймфрейма: упакованные массивы, см. services/intraday.py
+class IntradayBars(SQLModel, table=True):
+    secid: str = Field(primary_key=True)
+    day: date = Field(primary_key=True)
+    interval: int = Field(primary_key=True)
+    minutes: bytes = Field(sa_column=Column(LargeBinary, nullable=False))  # uint16, минуты от полуночи
+    close: bytes = Field(sa_column=Column(LargeBinary, nullable=False))  # float32
@@ -1,57 +1,121 @@
-import pandas as pd, numpy as np, asyncio
-from fastapi import APIRouter, HTTPException
-from services.price_cache import get_series
-from services.benchmark import get_imoex_series
+import pandas as pd, numpy as np, time
+from fastapi import APIRouter, HTTPException, Request
+from services.valuation import valuate
+from services import calendar, pipeline, result_cache
+from services.cpu_budget import budget, Priority
+from services.pipeline import Stage
 from schemas import SecurityWeight, ForecastRequest, ForecastResponse
-from utils.dataset import make_dataset
-from utils.catboost import fit_catboost, forecast_catboost, fit_predict_catboost_clf
-from utils.tft import fit_tft, forecast_tft
+from utils.encoding import negotiate
+from utils.metrics import INFLIGHT
 
 
 router = APIRouter(prefix="/forecast", tags=["Forecast"])
 
 
+def _stages(pf: pd.Series, imoex_ser: pd.Series, model: str, horizon: int) -> list[Stage]:
+    """Граф прогноза: классификатор, регрессор (или TFT) и симуляции GARCH независимы и идут параллельно.
+
+    dataset ─┬─ simulate ───────┐
+             ├─ clf             │
+             └─ reg ─── predict ┘   (fast)
+    tft                             (quality)
+    """
+    # тяжёлый ML-стек (arch, ta, catboost, torch) грузится при первом прогнозе, см. warmup.py
+    from utils.dataset import make_dataset
+    from utils.garch import simulate_returns, risk_metrics, fan, FAN_QUANTILES
+    from utils.catboost import fit_catboost, forecast_catboost, fit_predict_catboost_clf
+
+    # две обучаемые модели делят бюджет пополам, а не занимают его по очереди целиком
+    half = max(1, budget.capacity // 2)
+
+    def dataset(threads):
+        return make_dataset(pf, imoex_ser)
+
+    def simulate(ds, threads):
+        paths = simulate_returns(ds[1], horizon)
+        fan_q = dict(zip((f"p{q * 100:g}" for q in FAN_QUANTILES), fan(paths, pf.iloc[-1])))
+        return risk_metrics(paths), fan_q, paths
+
+    def clf(ds, threads):
+        return fit_predict_catboost_clf(ds[0], thread_count=threads)
+
+    def reg(ds, threads):
+        return fit_catboost(ds[0], thread_count=threads)
+
+    def predict(ds, fitted, sim, threads):
+        df, garch_fit = ds
+        cb, feats = fitted
+        return forecast_catboost(df, garch_fit, cb, feats, horizon, thread_count=threads, paths=sim[2])
+
+    def tft(threads):
+        from utils.tft import fit_tft, forecast_tft
+
+        tft_model, ds, enc_df = fit_tft(pf, imoex_ser, horizon, horizon, threads=threads)
+        return forecast_tft(tft_model, ds, enc_df)
+
+    stages = [
+        Stage("dataset", dataset, threads=1),
+        Stage("simulate", simulate, deps=("dataset",), threads=1),
+        Stage("clf", clf, deps=("dataset",), threads=half),
+    ]
+    if model == "quality":
+        return stages + [Stage("tft", tft, threads=half)]
+    return stages + [
+        Stage("reg", reg, deps=("dataset",), threads=half),
+        Stage("predict", predict, deps=("dataset", "reg", "simulate"), threads=1),
+    ]
+
+
 @router.post("/", response_model=ForecastResponse)
-async def forecast(req: ForecastRequest):
+@INFLIGHT.tracked(endpoint="forecast")
+async def forecast(req: ForecastRequest, request: Request):
     assets = req.assets
     if not assets:
         raise HTTPException(400, "empty assets")
 
-    dfs = await asyncio.gather(*[get_series(a.secid) for a in assets])
-    price_tbl = pd.concat(
-        [df.set_index("date")["close"].rename(a.secid) for a, df in zip(assets, dfs)],
-        axis=1
-    ).sort_index().ffill().dropna(how="any")
-    shares = pd.Series({a.secid: a.shares for a in assets})
-    pf = (price_tbl * shares).sum(axis=1)
-    ret = pf.pct_change().dropna()
-
-    imoex_df = await get_imoex_series(pf.index.min(), pf.index.max())
-    imoex_ser = imoex_df.set_index("date")["close"]
-    df, garch_fit = make_dataset(pf, imoex_ser)
-
-    vol_ann = ret.std() * np.sqrt(252)
-    var_95 = np.quantile(ret, 0.05)
-    increase_proba = fit_predict_catboost_clf(df)
-
-    horizon = 60
-    if req.model == "quality":
-        tft_model, ds, enc_df = fit_tft(pf, imoex_ser, horizon, horizon)
-        fc, lo_ci, hi_ci = forecast_tft(tft_model, ds, enc_df)
-    else:
-        cb, feats = fit_catboost(df)
-        fc, lo_ci, hi_ci = forecast_catboost(df, garch_fit, cb, feats, horizon)
-
-    f_dates = pd.bdate_range(pf.index[-1] + pd.Timedelta(days=1), periods=horizon).date
-
-    return ForecastResponse(
-        history=list(zip(pf.index, pf.values)),
-        forecast=list(zip(f_dates, fc)),
-        lo95=list(zip(f_dates, lo_ci)),
-        hi95=list(zip(f_dates, hi_ci)),
-        metrics={
-            "annual_volatility": vol_ann,
-            "VaR_95": var_95,
-            "P_up_60d": increase_proba,
-        }
-    )
\ No newline at end of file
+    async def compute():
+        try:
+            v = await valuate([(a.secid, a.shares) for a in assets])
+        except ValueError as e:
+            raise HTTPException(400, str(e))
+        pf = v.value
+        ret = pf.pct_change().dropna()
+        vol_ann = ret.std() * np.sqrt(252)
+
+        horizon = 60
+        t0 = time.perf_counter()
+        priority = Priority.TRAINING if req.model == "quality" else Priority.FAST
+        out, timings = await pipeline.run(_stages(pf, v.benchmark, req.model, horizon), priority, endpoint="forecast")
+        timings["total"] = time.perf_counter() - t0
+        risk, fan_q, _ = out["simulate"]
+        risk[f"P_up_{horizon}d_clf"] = out["clf"]
+        fc, lo_ci, hi_ci = out["tft" if req.model == "quality" else "predict"]
+
+        f_dates = calendar.trading_days_after(v.last_date, horizon)
+
+        # VaR/CVaR и P_up — по симуляциям AR-GARCH-t; вероятность классификатора — P_up_60d_clf
+        metrics = {"annual_volatility": vol_ann, **risk}
+        body = ForecastResponse(
+            history=list(zip(pf.index.date, pf.values)),
+            forecast=list(zip(f_dates, fc)),
+            lo95=list(zip(f_dates, lo_ci)),
+            hi95=list(zip(f_dates, hi_ci)),
+            fan={k: list(zip(f_dates, q)) for k, q in fan_q.items()},
+            metrics=metrics,
+        )
+        frame = pd.concat([
+            pd.DataFrame({"date": pf.index, "history": pf.values}),
+            pd.DataFrame({
+                "date": pd.to_datetime(f_dates), "forecast": fc, "lo95": lo_ci, "hi95": hi_ci, **fan_q,
+            }),
+        ], ignore_index=True)
+        # длительности — только в заголовке: тело хэшируется в ETag и кэшируется
+        return negotiate(
+            request, frame, json_body=body.model_dump(), meta=body.metrics,
+            headers={"Server-Timing": pipeline.server_timing(timings)},
+        )
+
+    # версия данных — последняя закрытая сессия: до следующей прогноз не изменится, и попадание
+    # в кэш (или 304) обходится без загрузки цен
+    payload = {"assets": sorted((a.secid, a.shares) for a in assets), "model": req.model}
+    return await result_cache.respond(request, "forecast", payload, calendar.last_session(), compute)
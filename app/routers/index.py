@@ -1,35 +1,74 @@
+import asyncio
+import re
 import pandas as pd
-from datetime import date
-from fastapi import APIRouter, Depends, HTTPException, Query
+from datetime import date, datetime, timedelta
+from typing import Literal
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
+from fastapi.responses import StreamingResponse
+from sqlalchemy import Float, Integer, func, literal, text, tuple_
 from sqlmodel import Session, select
-from schemas import IndexCreate, IndexOut, IndexValue, IndexInfo, IndexPoint
+from schemas import IndexCreate, IndexOut, IndexValue, IndexInfo, IndexPoint, IndexBar, IndexCompare
 from models import Index, IndexComponent
 from database import engine
-from services import moex, index_builder, benchmark
+from services import moex, index_builder, benchmark, backtest, calendar, intraday, live, result_cache
+from services.cpu_budget import budget, Priority
 from utils.stats import calc_stats
+from utils import paging
+from utils.downsample import downsample
+from utils.encoding import negotiate
+from utils.metrics import INFLIGHT
 
 router = APIRouter(prefix="/index", tags=["Custom Index"])
 
 
+def interval_param(
+    interval: int = Query(24, description="минут в баре: 1, 10, 60; 24 — дневные"),
+) -> int:
+    if interval not in (*intraday.INTERVALS, intraday.DAILY):
+        raise HTTPException(422, "interval must be one of 1, 10, 60, 24")
+    return interval
+
+
 def get_session():
     with Session(engine) as session:
         yield session
 
 
-@router.post("/", response_model=IndexOut)
-async def create_index(req: IndexCreate, session: Session = Depends(get_session)):
-    df_cap = await moex.cap_table_q(req.base_date.year, (req.base_date.month - 1) // 3 + 1)
+def _quarter(d: date) -> tuple[int, int]:
+    return d.year, (d.month - 1) // 3 + 1
+
+
+def _select_components(
+    df_cap: pd.DataFrame, ff_df: pd.DataFrame, dy_df: pd.DataFrame, req: IndexCreate
+) -> pd.DataFrame:
     df_sel = df_cap[df_cap.secid.isin([s.secid for s in req.securities])].copy()
     if df_sel.empty:
         raise HTTPException(400, "No securities found in selected quarter table")
-    ff_df = await moex.free_float()
-    dy_df = await moex.div_yield_df()
     df_sel = df_sel.merge(ff_df[["secid", "free_float"]], on="secid", how="left")
     df_sel = df_sel.merge(dy_df[["state_reg", "div_yield"]], on="state_reg", how="left")
-    df_sel = df_sel.loc[df_sel["secid"].isin([sec.secid for sec in req.securities])].copy()
-    df_sel = df_sel.set_index("secid")
+    return df_sel
+
+
+def _check_secids(df_cap: pd.DataFrame, req: IndexCreate):
+    """422, если в запросе есть бумаги не из квартальной таблицы капитализации."""
+    unknown = sorted({s.secid for s in req.securities} - set(df_cap.secid))
+    if unknown:
+        raise HTTPException(422, f"{req.name}: securities not in the quarter table: {', '.join(unknown)}")
+
+
+@router.post("/", response_model=IndexOut)
+async def create_index(req: IndexCreate, session: Session = Depends(get_session)):
+    df_cap, ff_df, dy_df = await asyncio.gather(
+        moex.cap_table_q(*_quarter(req.base_date)),
+        moex.free_float(),
+        moex.div_yield_df(),
+    )
+    df_sel = _select_components(df_cap, ff_df, dy_df, req).set_index("secid")
     custom = {s.secid: s.custom_weight for s in req.securities if s.custom_weight is not None}
-    weights = await index_builder.build_weights(df_sel, req.weighting, custom)
+    try:
+        weights = await index_builder.build_weights(df_sel, req.weighting, custom, as_of=req.base_date)
+    except ValueError as e:
+        raise HTTPException(400, str(e))
     base_value = await index_builder.compute_index_value(weights)
     index_row = Index(
         name=req.name,
@@ -38,15 +77,87 @@ async def create_index(req: IndexCreate, session: Session = Depends(get_session)
         base_value=base_value,
     )
     session.add(index_row)
-    session.commit()
-    session.refresh(index_row)
-    # components
-    for secid, w in weights.items():
-        session.add(IndexComponent(index_id=index_row.id, secid=secid, weight=w))
+    session.flush()
+    session.add_all([
+        IndexComponent(index_id=index_row.id, secid=secid, weight=w)
+        for secid, w in weights.items()
+    ])
     session.commit()
     return IndexOut(id=index_row.id, name=index_row.name, base_value=base_value, weights=weights)
 
 
+@router.post("/bulk", response_model=list[IndexOut])
+async def create_indices(reqs: list[IndexCreate], session: Session = Depends(get_session)):
+    """Создать пачку индексов: справочники грузятся один раз, запись — одной транзакцией."""
+    if not reqs:
+        raise HTTPException(400, "empty index list")
+    quarters = sorted({_quarter(r.base_date) for r in reqs})
+    *caps, ff_df, dy_df = await asyncio.gather(
+        *[moex.cap_table_q(y, q) for y, q in quarters],
+        moex.free_float(),
+        moex.div_yield_df(),
+    )
+    cap_by_q = dict(zip(quarters, caps))
+
+    async def solve(i: int, r: IndexCreate) -> pd.DataFrame:
+        df_sel = _select_components(cap_by_q[_quarter(r.base_date)], ff_df, dy_df, r).set_index("secid")
+        # по потоку бюджета CPU на решение: большая пачка не вытесняет прогнозы и отчёты
+        async with budget.acquire(Priority.INTERACTIVE, 1, endpoint="bulk"):
+            try:
+                w = await index_builder.build_weights(df_sel, r.weighting, as_of=r.base_date)
+            except ValueError as e:
+                raise HTTPException(400, f"{r.name}: {e}")
+        # решённые веса идут в общую нормировку как заданные вручную
+        return pd.DataFrame({"secid": list(w), "custom": list(w.values())}).assign(spec=i, weighting="custom")
+
+    parts, optimized = [], []
+    for i, r in enumerate(reqs):
+        if r.weighting == "custom":
+            if any(s.custom_weight is None for s in r.securities):
+                raise HTTPException(400, f"{r.name}: custom_weight required for every security")
+            _check_secids(cap_by_q[_quarter(r.base_date)], r)
+            part = pd.DataFrame({
+                "secid": [s.secid for s in r.securities],
+                "custom": [s.custom_weight for s in r.securities],
+            })
+        elif r.weighting in index_builder.OPTIMIZED:
+            optimized.append(solve(i, r))
+            continue
+        else:
+            part = _select_components(cap_by_q[_quarter(r.base_date)], ff_df, dy_df, r)
+        parts.append(part.assign(spec=i, weighting=r.weighting))
+    parts += await asyncio.gather(*optimized)
+    try:
+        df = index_builder.build_weights_bulk(pd.concat(parts, ignore_index=True))
+    except ValueError as e:
+        raise HTTPException(400, str(e))
+
+    prices = await moex.load_latest_prices(df.secid.unique().tolist())
+    base_values = (
+        (df.weight * df.secid.map(prices)).groupby(df.spec).sum()
+        .reindex(range(len(reqs)), fill_value=0.0)
+    )
+
+    rows = [
+        Index(name=r.name, base_date=r.base_date, weighting=r.weighting, base_value=float(base_values[i]))
+        for i, r in enumerate(reqs)
+    ]
+    session.add_all(rows)
+    session.flush()
+    ids = pd.Series([row.id for row in rows])
+    session.add_all([
+        IndexComponent(index_id=int(index_id), secid=secid, weight=float(w))
+        for index_id, secid, w in zip(ids[df.spec].values, df.secid, df.weight)
+    ])
+    session.commit()
+
+    weights = {spec: dict(zip(g.secid, g.weight)) for spec, g in df.groupby("spec")}
+    return [
+        IndexOut(id=row.id, name=row.name, base_value=row.base_value, weights=weights.get(i, {}))
+        for i, row in enumerate(rows)
+    ]
+
+
 @router.get("/{index_id}/value", response_model=IndexValue)
 async def get_value(index_id: int, session: Session = Depends(get_session)):
     index = session.get(Index, index_id)
@@ -58,39 +169,207 @@ async def get_value(index_id: int, session: Session = Depends(get_session)):
     return IndexValue(date=date.today(), value=current_val)
 
 
-@router.get("/{index_id}/series", response_model=list[IndexPoint])
+@router.get("/{index_id}/series", response_model=list[IndexPoint] | list[IndexBar])
+@INFLIGHT.tracked(endpoint="series")
 async def index_series(
     index_id: int,
+    request: Request,
     d_from: date = Query(..., alias="from"),
     d_till: date = Query(..., alias="till"),
-    session: Session = Depends(lambda: Session(engine)),
+    points: int | None = Query(None, ge=3, description="бюджет точек для прореживания"),
+    method: Literal["lttb", "minmax"] = "lttb",
+    cursor: datetime | None = Query(None, description="X-Next-Cursor: вернуть точки строго после этой даты/метки бара"),
+    limit: int | None = Query(None, ge=1),
+    interval: int = Depends(interval_param),
+    session: Session = Depends(get_session),
 ):
+    """Ряд индекса и IMOEX: дневной — точки IndexPoint (date), внутридневной — бары IndexBar (ts).
+
+    ``points`` прореживает ряд на сервере (LTTB или min/max по бакетам),
+    ``cursor``/``limit`` — постраничная выдача (следующий курсор в ``X-Next-Cursor``),
+    формат ответа по Accept: JSON, NDJSON (потоково), Arrow IPC или Parquet.
+    """
+    if cursor is not None and cursor.tzinfo is not None:
+        cursor = cursor.astimezone(calendar.MSK).replace(tzinfo=None)  # метки баров — московское время
+    key, fmt = ("date", paging.DAY_FMT) if interval == intraday.DAILY else ("ts", paging.BAR_FMT)
+
+    async def compute():
+        weights = {c.secid: c.weight for c in session.exec(
+            select(IndexComponent).where(IndexComponent.index_id == index_id)
+        )}
+        df_val = await index_builder.compute_series(weights, d_from, d_till, interval)
+        df_val = pd.DataFrame.from_dict(df_val)
+        df_bm = await benchmark.get_imoex_series(d_from, d_till, interval)
+        df_val["date"] = pd.to_datetime(df_val["date"])
+        df_bm["date"] = pd.to_datetime(df_bm["date"])
+        df = pd.merge(df_val, df_bm, on="date", how="left") \
+            .rename(columns={"date": key, "close": "imoex"})
+        df = df.dropna().reset_index(drop=True)
+
+        if points:
+            df = df.iloc[downsample(df["value"].to_numpy(), points, method)]
+        df, next_cursor = paging.keyset_page(df, key, cursor, limit, fmt)
+        headers = {"X-Next-Cursor": next_cursor} if next_cursor else {}
+
+        return negotiate(request, df[[key, "value", "imoex"]], headers=headers)
+
+    payload = {
+        "id": index_id, "from": d_from, "till": d_till, "points": points, "method": method,
+        "cursor": cursor, "limit": limit, "interval": interval,
+    }
+    version = result_cache.data_version(d_till, interval)
+    return await result_cache.respond(request, "series", payload, version, compute)
+
+
+@router.get("/{index_id}/backtest", response_model=list[IndexPoint])
+@INFLIGHT.tracked(endpoint="backtest")
+async def index_backtest(
+    index_id: int,
+    d_from: date = Query(..., alias="from"),
+    d_till: date = Query(..., alias="till"),
+    session: Session = Depends(get_session),
+):
+    """Ряд индекса с квартальной ребалансировкой весов по его схеме взвешивания."""
+    idx = session.get(Index, index_id)
+    if not idx:
+        raise HTTPException(404, "Index not found")
     weights = {c.secid: c.weight for c in session.exec(
         select(IndexComponent).where(IndexComponent.index_id == index_id)
     )}
-    df_val = await index_builder.compute_series(weights, d_from, d_till)
-    df_val = pd.DataFrame.from_dict(df_val)
+    try:
+        df_val, _ = await backtest.backtest(list(weights), idx.weighting, d_from, d_till, custom=weights)
+    except ValueError as e:
+        raise HTTPException(400, str(e))
     df_bm = await benchmark.get_imoex_series(d_from, d_till)
-    df_val["date"] = pd.to_datetime(df_val["date"])
     df_bm["date"] = pd.to_datetime(df_bm["date"])
-    df = pd.merge(df_val, df_bm, on="date", how="left") \
-        .rename(columns={"value": "value", "close": "imoex"})
-    df = df.dropna()
-    return df.to_dict(orient="records")
+    df = pd.merge(df_val, df_bm, on="date", how="left").rename(columns={"close": "imoex"})
+    return df.dropna().to_dict(orient="records")
+
+
+def _match(q: str) -> str | None:
+    """Строка поиска → запрос FTS5: каждое слово — префикс, все слова обязательны."""
+    words = re.findall(r"[^\W_]+", q)
+    return " ".join(f'"{w}"*' for w in words) or None
+
+
+def _parse_cursor(cursor: str, ranked: bool) -> tuple:
+    try:
+        if ranked:
+            score, _, last_id = cursor.partition(":")
+            return float(score), int(last_id)
+        return (int(cursor),)
+    except ValueError:
+        raise HTTPException(422, "malformed cursor")
 
 
 @router.get("/indices", response_model=list[IndexInfo])
-async def find_indices(q: str | None = None, db: Session = Depends(get_session)):
-    """
-    Вернуть список индексов.  q = "строка" → поиск по id или name (case‑insensitive).
+async def find_indices(
+    response: Response,
+    q: str | None = None,
+    cursor: str | None = Query(None, description="X-Next-Cursor предыдущей страницы"),
+    limit: int = Query(50, ge=1, le=500),
+    db: Session = Depends(get_session),
+):
+    """Список индексов.  q = "строка" → индекс по id или поиск по словам названия.
+
+    Слова ищутся по префиксу в полнотекстовом индексе index_fts, выдача — по
+    релевансу (bm25), без q — по id. Постранично: ``limit`` строк, следующий курсор
+    в ``X-Next-Cursor``; на первой странице ``X-Total-Count`` — сколько всего найдено.
     """
-    stmt = select(Index)
-    if q:
-        if q.isdigit():
-            stmt = stmt.where(Index.id == int(q))
-        else:
+    if q and q.strip().isdigit():
+        idx = db.get(Index, int(q))
+        response.headers["X-Total-Count"] = str(int(idx is not None))
+        return [idx] if idx else []
+
+    match = _match(q) if q else None
+    if q and match is None:
+        response.headers["X-Total-Count"] = "0"
+        return []
+
+    ranked = match is not None and engine.dialect.name == "sqlite"
+    if ranked:
+        hits = (
+            text("SELECT rowid AS id, bm25(index_fts) AS score FROM index_fts WHERE index_fts MATCH :match")
+            .bindparams(match=match)
+            .columns(id=Integer, score=Float)
+            .subquery("hits")
+        )
+        stmt = select(Index, hits.c.score).join(hits, Index.id == hits.c.id).order_by(hits.c.score, Index.id)
+        if cursor:
+            stmt = stmt.where(tuple_(hits.c.score, Index.id) > _parse_cursor(cursor, ranked))
+        total = select(func.count()).select_from(hits)
+    else:
+        stmt = select(Index, literal(0.0)).order_by(Index.id)
+        total = select(func.count()).select_from(Index)
+        if q:
+            # без FTS5 (не SQLite) — прежний поиск подстрокой
             stmt = stmt.where(Index.name.ilike(f"%{q}%"))
-    return db.exec(stmt).all()
+            total = total.where(Index.name.ilike(f"%{q}%"))
+        if cursor:
+            stmt = stmt.where(Index.id > _parse_cursor(cursor, ranked)[0])
+
+    rows = db.exec(stmt.limit(limit + 1)).all()
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last, score = rows[-1]
+        response.headers["X-Next-Cursor"] = f"{score!r}:{last.id}" if ranked else str(last.id)
+    if cursor is None:
+        # подсчёт — только на первой странице: дальше клиент уже знает итог
+        response.headers["X-Total-Count"] = str(db.exec(total).one())
+    return [idx for idx, _ in rows]
+
+
+@router.get("/compare", response_model=IndexCompare)
+@INFLIGHT.tracked(endpoint="compare")
+async def compare_indices(
+    ids: list[int] = Query(...),
+    d_from: date = Query(..., alias="from"),
+    d_till: date = Query(..., alias="till"),
+    session: Session = Depends(get_session),
+):
+    """Ряды нескольких индексов за одно умножение матрицы весов на общую матрицу цен."""
+    ids = list(dict.fromkeys(ids))
+    rows = session.exec(
+        select(IndexComponent.index_id, IndexComponent.secid, IndexComponent.weight)
+        .where(IndexComponent.index_id.in_(ids))
+    ).all()
+    missing = set(ids) - {r[0] for r in rows}
+    if missing:
+        raise HTTPException(404, f"Index not found: {sorted(missing)}")
+    secids = sorted({r[1] for r in rows})
+
+    closes = await index_builder.close_matrix(secids, d_from, d_till)
+    values = index_builder.series_matrix(index_builder.weight_matrix(rows, ids, secids), closes)
+
+    df_bm = await benchmark.get_imoex_series(d_from, d_till)
+    imoex = df_bm.set_index("date")["close"].reindex(pd.to_datetime(closes.index)) if not df_bm.empty \
+        else pd.Series(float("nan"), index=closes.index)
+    mask = imoex.notna().to_numpy()
+    return IndexCompare(
+        dates=list(closes.index[mask]),
+        imoex=imoex[mask].tolist(),
+        series={i: v.tolist() for i, v in zip(ids, values[:, mask])},
+    )
+
+
+@router.get("/live")
+async def live_values(ids: list[int] = Query(...)):
+    """Server-Sent Events: текущие значения индексов *ids* по мере обновления котировок.
+
+    Событие ``value`` с ``{"id", "date", "value"}``; значения считаются один раз
+    на тик для всех подписчиков (см. services/live.py).
+    """
+    ids = list(dict.fromkeys(ids))
+    # без Depends(get_session): сессия зависимости живёт до конца потока и держала бы соединение пула
+    with Session(engine) as session:
+        found = set(session.exec(select(Index.id).where(Index.id.in_(ids))).all())
+    if missing := set(ids) - found:
+        raise HTTPException(404, f"Index not found: {sorted(missing)}")
+    return StreamingResponse(
+        live.stream(ids),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
 
 
 @router.get("/{index_id}", response_model=IndexInfo)
@@ -102,10 +381,15 @@ async def get_index(index_id: int, db: Session = Depends(get_session)):
 
 
 @router.get("/{index_id}/stats")
+@INFLIGHT.tracked(endpoint="stats")
 async def stats(
     index_id: int,
+    request: Request,
+    interval: int = Depends(interval_param),
     session: Session = Depends(get_session)
 ):
+    """Статистика индекса с даты базы против IMOEX; внутридневная — за последние
+    INTRADAY_KEEP_1M_DAYS (interval=1) или INTRADAY_KEEP_10M_DAYS дней."""
     idx = session.get(Index, index_id)
     if not idx:
         raise HTTPException(404, "Index not found")
@@ -115,15 +399,24 @@ async def stats(
     weights = {c.secid: c.weight for c in comps}
 
     d0, d1 = idx.base_date, date.today()
+    if interval != intraday.DAILY:
+        # внутридневные бары всех бумаг с даты базы — годы минуток за один запрос; берётся последнее окно
+        d0 = max(d0, d1 - timedelta(days=intraday.window_days(interval)))
 
-    idx_raw = await index_builder.compute_series(weights, d0, d1)
-    idx_ser = pd.Series(
-        [p["value"] for p in idx_raw],
-        index=pd.to_datetime([p["date"] for p in idx_raw])
-    )
+    async def compute():
+        idx_raw = await index_builder.compute_series(weights, d0, d1, interval)
+        idx_ser = pd.Series(
+            [p["value"] for p in idx_raw],
+            index=pd.to_datetime([p["date"] for p in idx_raw])
+        )
+
+        bm_df = await benchmark.get_imoex_series(d0, d1, interval)
+        bm_ser = bm_df.set_index("date")["close"]
+        bm_ser.index = pd.to_datetime(bm_ser.index)
 
-    bm_df = await benchmark.get_imoex_series(d0, d1)
-    bm_ser = bm_df.set_index("date")["close"]
-    bm_ser.index = pd.to_datetime(bm_ser.index)
+        # годовой масштаб: 252 торговых дня × баров в дне
+        bars_per_day = idx_ser.groupby(idx_ser.index.date).size().median() if interval != 24 else 1
+        return calc_stats(idx_ser, bm_ser, periods=252 * bars_per_day)
 
-    return calc_stats(idx_ser, bm_ser)
+    version = result_cache.data_version(d1, interval)
+    return await result_cache.respond(request, "stats", {"id": index_id, "interval": interval}, version, compute)
@@ -0,0 +1,33 @@
+from fastapi import APIRouter, Header, HTTPException
+from fastapi.responses import FileResponse
+from utils import profiling
+
+
+router = APIRouter(prefix="/profiles", tags=["Profiling"])
+
+
+def _check(header: str | None):
+    if not profiling.authorized(header):
+        raise HTTPException(403, "profiling token required")
+
+
+@router.get("/")
+async def list_profiles(
+    x_profile: str | None = Header(None),
+):
+    _check(x_profile)
+    return profiling.list_profiles()
+
+
+@router.get("/{profile_id}", response_class=FileResponse)
+async def get_profile(
+    profile_id: str,
+    x_profile: str | None = Header(None),
+):
+    """Сохранённый профиль: speedscope-JSON (открывается на speedscope.app) или HTML."""
+    _check(x_profile)
+    path = profiling.profile_path(profile_id)
+    if path is None:
+        raise HTTPException(404, "Profile not found")
+    media = "text/html; charset=utf-8" if path.suffix == ".html" else "application/json"
+    return FileResponse(path, media_type=media, filename=path.name)
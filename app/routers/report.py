@@ -1,43 +1,46 @@
 import asyncio
 import tempfile
-import pandas as pd
-from fastapi import APIRouter, HTTPException
-from fastapi.responses import FileResponse
+from pathlib import Path
 
-from services.price_cache import get_series
-from services.benchmark import get_imoex_series
+from fastapi import APIRouter, HTTPException, Request
+from fastapi.responses import FileResponse, Response
+
+from services.valuation import valuate
+from services.cpu_budget import budget, Priority
+from services import calendar, result_cache
 from schemas import ReportRequest
-from utils.report import generate_report
+from utils import profiling
+from utils.metrics import INFLIGHT
 
 router = APIRouter(prefix="/report", tags=["Report"])
 
 
 @router.post("/", response_class=FileResponse)
-async def portfolio_report(req: ReportRequest):
+@INFLIGHT.tracked(endpoint="report")
+async def portfolio_report(req: ReportRequest, request: Request):
     if not req.assets:
         raise HTTPException(400, "assets empty")
 
-    dfs = await asyncio.gather(*[get_series(a.secid) for a in req.assets])
-    price_tbl = (
-        pd.concat(
-            [df.set_index("date")["close"].rename(a.secid) for a, df in zip(req.assets, dfs)],
-            axis=1,
+    async def compute():
+        try:
+            v = await valuate([(a.secid, a.shares) for a in req.assets])
+        except ValueError as e:
+            raise HTTPException(400, str(e))
+        from utils.report import generate_report  # quantstats грузится лениво
+
+        with tempfile.TemporaryDirectory() as tmp:
+            async with budget.acquire(Priority.INTERACTIVE, want=1, endpoint="report"):
+                path = await asyncio.to_thread(profiling.in_thread, generate_report, v.value, v.benchmark, Path(tmp) / "report.html")
+            html = path.read_bytes()
+
+        # тело целиком в памяти: его же кладёт кэш результатов
+        return Response(
+            html,
+            media_type="text/html; charset=utf-8",
+            headers={"Content-Disposition": 'attachment; filename="portfolio_report.html"'},
         )
-        .sort_index()
-        .ffill()
-        .dropna(how="any")
-    )
-    shares = pd.Series({a.secid: a.shares for a in req.assets})
-    pf_price = (price_tbl * shares).sum(axis=1)
-
-    bm_df = await get_imoex_series(pf_price.index.min(), pf_price.index.max())
-    bm_price = bm_df.rename({"close": "IMOEX"}, axis=1).set_index("date")["IMOEX"]
-
-    tmp = tempfile.NamedTemporaryFile(suffix=".html", delete=False)
-    pdf_path = generate_report(pf_price, bm_price, tmp.name)
-
-    return FileResponse(
-        pdf_path,
-        media_type="text/html; charset=utf-8",
-        filename="portfolio_report.html",
-    )
+
+    # версия данных — последняя закрытая сессия: до следующей отчёт не изменится, и попадание
+    # в кэш (или 304) обходится без загрузки цен
+    payload = {"assets": sorted((a.secid, a.shares) for a in req.assets)}
+    return await result_cache.respond(request, "report", payload, calendar.last_session(), compute)
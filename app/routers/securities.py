@@ -1,11 +1,15 @@
-from fastapi import APIRouter, Query
+import pandas as pd
+from fastapi import APIRouter, Query, Request
 from datetime import date
 from services import moex
+from utils.encoding import negotiate
 
 
 router = APIRouter(prefix="/securities", tags=["Securities"])
 
 
 @router.get("/")
-async def list_securities(year: int = Query(date.today().year), quarter: int = Query(1)):
-    return await moex.list_securities(year, quarter)
+async def list_securities(request: Request, year: int = Query(date.today().year), quarter: int = Query(1)):
+    pairs = await moex.list_securities(year, quarter)
+    df = pd.DataFrame(pairs, columns=["secid", "name"])
+    return negotiate(request, df, json_body=[list(p) for p in pairs])
@@ -1,9 +1,12 @@
-from datetime import date
+from datetime import date, datetime
 from typing import List, Literal, Dict
 from pydantic import BaseModel, Field
 
 
-Weighting = Literal["equal", "market_cap", "cap_freefloat", "cap_divyield", "custom"]
+Weighting = Literal[
+    "equal", "market_cap", "cap_freefloat", "cap_divyield", "custom",
+    "min_variance", "risk_parity", "max_diversification",
+]
 
 
 class SecurityIn(BaseModel):
@@ -50,6 +53,19 @@ class IndexPoint(BaseModel):
         from_attributes = True
 
 
+class IndexBar(BaseModel):
+    """Внутридневной бар ряда индекса: ts — начало бара, московское время."""
+    ts: datetime
+    value: float
+    imoex: float | None
+
+
+class IndexCompare(BaseModel):
+    dates: list[date]
+    imoex: list[float]
+    series: dict[int, list[float]]
+
+
 class SecurityWeight(BaseModel):
     secid: str
     shares: int
@@ -65,6 +81,7 @@ class ForecastResponse(BaseModel):
     forecast: list[tuple[date, float]]
     lo95: list[tuple[date, float]]
     hi95: list[tuple[date, float]]
+    fan: dict[str, list[tuple[date, float]]] = {}  # квантили цены по симуляциям GARCH: p5, p25, p50, p75, p95
     metrics: dict[str, float]
 
 
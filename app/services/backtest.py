@@ -0,0 +1,135 @@
+import asyncio
+import numpy as np
+import pandas as pd
+from datetime import date
+from services import moex
+from services.index_builder import build_weights
+from services.price_cache import get_series
+
+
+def rebalance_dates(d_from: date, d_till: date) -> list[date]:
+    """*d_from* плюс начала всех кварталов до *d_till* включительно."""
+    starts = pd.date_range(pd.Timestamp(d_from), pd.Timestamp(d_till), freq="QS").date
+    return [d_from] + [d for d in starts if d > d_from]
+
+
+async def _quarter_weights(
+    secids: list[str],
+    dates: list[date],
+    weighting: str,
+    custom: dict[str, float] | None,
+) -> np.ndarray:
+    """Матрица весов (ребалансировка × secid) по квартальным таблицам капитализации."""
+    if weighting == "custom":
+        w = await build_weights(pd.DataFrame(), weighting, custom)
+        return np.tile([w.get(s, 0.0) for s in secids], (len(dates), 1))
+
+    quarters = sorted({(d.year, (d.month - 1) // 3 + 1) for d in dates})
+
+    async def cap_or_none(y: int, q: int) -> pd.DataFrame | None:
+        # таблица квартала ещё не опубликована — держим прошлые веса; сбой ISS — ошибка бэктеста
+        try:
+            return await moex.cap_table_q(y, q)
+        except moex.QuarterNotPublished:
+            return None
+
+    *caps, ff_df, dy_df = await asyncio.gather(
+        *[cap_or_none(y, q) for y, q in quarters],
+        moex.free_float(),
+        moex.div_yield_df(),
+    )
+
+    by_q = {}
+    for yq, df_cap in zip(quarters, caps):
+        if df_cap is None:
+            continue
+        df_sel = df_cap[df_cap.secid.isin(secids)]
+        if df_sel.empty:
+            continue
+        df_sel = (
+            df_sel.merge(ff_df[["secid", "free_float"]], on="secid", how="left")
+            .merge(dy_df[["state_reg", "div_yield"]], on="state_reg", how="left")
+            .set_index("secid")
+        )
+        # оптимизационные схемы — по ковариации до начала квартала, без заглядывания вперёд
+        w = await build_weights(df_sel, weighting, as_of=date(yq[0], 3 * yq[1] - 2, 1))
+        by_q[yq] = [w.get(s, 0.0) for s in secids]
+
+    rows, last = [], None
+    for d in dates:
+        last = by_q.get((d.year, (d.month - 1) // 3 + 1), last)
+        if last is None:
+            raise ValueError(f"No capitalization data for {d}")
+        rows.append(last)
+    return np.nan_to_num(np.asarray(rows, dtype=float))
+
+
+async def price_matrix(secids: list[str], d_from: date, d_till: date) -> pd.DataFrame:
+    """date × secid закрытия из кэша цен, с протяжкой пропусков вперёд."""
+    dfs = await asyncio.gather(*[get_series(s) for s in secids])
+    tbl = pd.concat(
+        [df.set_index("date")["close"].rename(s) for s, df in zip(secids, dfs) if not df.empty],
+        axis=1,
+    ).reindex(columns=secids)
+    tbl.index = pd.to_datetime(tbl.index)
+    tbl = tbl.sort_index().ffill()
+    return tbl.loc[pd.Timestamp(d_from):pd.Timestamp(d_till)]
+
+
+def chain_link(prices: np.ndarray, rebal_rows: np.ndarray, weights: np.ndarray):
+    """Цепной индекс с пересчётом весов на строках *rebal_rows*.
+
+    prices — (даты × бумаги), weights — (ребалансировки × бумаги).
+    Внутри периода k: I_t = (u_k · P_t) / D_k, где u_k = w_k / P_{r_k} — число «единиц»
+    каждой бумаги, а делитель D_k подбирается так, чтобы ряд не разрывался на r_k.
+    Возвращает (значения по всем датам начиная с r_0, делители D_k).
+    """
+    base = prices[rebal_rows]
+    w = np.where(np.isnan(base), 0.0, weights)
+    w = w / w.sum(axis=1, keepdims=True)
+    units = np.nan_to_num(w / base)
+
+    t = np.arange(rebal_rows[0], len(prices))
+    period = np.searchsorted(rebal_rows, t, side="right") - 1
+    p = np.nan_to_num(prices[t])
+    growth = np.einsum("tn,tn->t", units[period], p)
+
+    # рост каждого периода до следующей ребалансировки, затем кумулятивно
+    ends = np.einsum("kn,kn->k", units[:-1], np.nan_to_num(prices[rebal_rows[1:]]))
+    level0 = w[0] @ np.nan_to_num(base[0])
+    levels = level0 * np.concatenate([[1.0], np.cumprod(ends)])
+    return levels[period] * growth, 1.0 / levels
+
+
+async def backtest(
+    secids: list[str],
+    weighting: str,
+    d_from: date,
+    d_till: date,
+    custom: dict[str, float] | None = None,
+) -> tuple[pd.DataFrame, pd.DataFrame]:
+    """Бэктест индекса с квартальной ребалансировкой.
+
+    Возвращает ряд (date, value) и таблицу ребалансировок (date, divisor, <secid>…).
+    Стартовое значение совпадает с ``compute_series`` — Σ w·P на первую дату.
+    """
+    prices = await price_matrix(secids, d_from, d_till)
+    prices = prices.dropna(how="all")
+    if prices.empty:
+        return pd.DataFrame(columns=["date", "value"]), pd.DataFrame()
+    dates = rebalance_dates(prices.index[0].date(), d_till)
+    weights = await _quarter_weights(secids, dates, weighting, custom)
+
+    idx = prices.index.values
+    rows = np.searchsorted(idx, pd.to_datetime(dates).values)
+    keep = rows < len(idx)
+    rows, weights = rows[keep], weights[keep]
+    rows, first = np.unique(rows, return_index=True)
+    weights = weights[first]
+
+    values, divisors = chain_link(prices.to_numpy(dtype=float), rows, weights)
+    series = pd.DataFrame({"date": idx[rows[0]:], "value": values})
+    rebal = pd.DataFrame(weights, columns=secids)
+    rebal.insert(0, "divisor", divisors)
+    rebal.insert(0, "date", idx[rows])
+    return series, rebal
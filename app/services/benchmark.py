@@ -1,13 +1,16 @@
-import aiohttp, pandas as pd
+import pandas as pd
 import aiomoex
 from datetime import date, timedelta
-from sqlmodel import Session, select
-from database import engine
-from models import ImoexPrice
+from sqlmodel import Session, select, func
+from database import engine, read_frame
+from services import upstream, intraday, calendar
+from utils.metrics import timed, cache_hit, ISS_FETCH_SECONDS
+from models import ImoexFetched, ImoexPrice
 
 
+@timed(ISS_FETCH_SECONDS, loader="imoex")
 async def _fetch_imoex_from_iss(d_from: date, d_till: date) -> pd.DataFrame:
-    async with aiohttp.ClientSession() as s:
+    async with upstream.session() as s:
         raw = await aiomoex.get_board_history(
             s,
             security="IMOEX",
@@ -24,46 +27,65 @@ async def _fetch_imoex_from_iss(d_from: date, d_till: date) -> pd.DataFrame:
     return pd.DataFrame()
 
 
-def _save_to_db(df: pd.DataFrame):
+def _save_to_db(df: pd.DataFrame, start: date, end: date):
+    """Сохранить ответ ISS за [start, end] и отметить отрезок полученным.
+
+    Отрезок, доходящий до сегодняшнего дня, отмечается только до последнего пришедшего
+    значения: сегодняшнее закрытие ISS может опубликовать с задержкой.
+    """
+    if end >= calendar.now().date():
+        end = df["date"].max() if not df.empty else start - timedelta(days=1)
     with Session(engine) as ses:
+        have = set(ses.exec(select(ImoexPrice.date).where(ImoexPrice.date.between(start, end))).all())
         for r in df.itertuples():
-            if not ses.get(ImoexPrice, r.date):
+            if r.date not in have:
                 ses.add(ImoexPrice(date=r.date, close=float(r.close)))
+        if start <= end:
+            ses.merge(ImoexFetched(start=start, end=end))
         ses.commit()
+    calendar.invalidate()
 
 
-async def get_imoex_series(d_from: date, d_till: date) -> pd.DataFrame:
+def _missing(d_from: date, d_till: date) -> list[tuple[date, date]]:
+    """Части [d_from, d_till], ещё не полученные из ISS."""
     with Session(engine) as ses:
-        rows = ses.exec(
-            select(ImoexPrice).where(ImoexPrice.date.between(d_from, d_till))
+        fetched = ses.exec(
+            select(ImoexFetched.start, ImoexFetched.end).where(ImoexFetched.end >= d_from, ImoexFetched.start <= d_till)
         ).all()
-    if rows:
-        d_min = min(r.date for r in rows)
-        d_max = max(r.date for r in rows)
-    else:
-        d_min = d_till + timedelta(days=1)
-        d_max = d_from - timedelta(days=1)
+    out, d = [], d_from
+    for start, end in calendar.merge_ranges([tuple(r) for r in fetched]):
+        if start > d:
+            out.append((d, start - timedelta(days=1)))
+        d = max(d, end + timedelta(days=1))
+    if d <= d_till:
+        out.append((d, d_till))
+    return out
 
-    fetch_ranges = []
-    if d_from < d_min:
-        fetch_ranges.append((d_from, d_min - timedelta(days=1)))
-    if d_till > d_max:
-        fetch_ranges.append((d_max + timedelta(days=1), d_till))
-    if len(fetch_ranges) > 1 and fetch_ranges[0] == fetch_ranges[1]:
-        fetch_ranges = [fetch_ranges[0]]
 
+async def get_imoex_series(d_from: date, d_till: date, interval: int = 24) -> pd.DataFrame:
+    if interval != intraday.DAILY:
+        bars = await intraday.bars(["IMOEX"], d_from, d_till, interval)
+        return bars.get("IMOEX", pd.DataFrame())
+    # докачиваем всё, что ещё не получено из ISS, до последней закрытой сессии; календарь
+    # здесь не решает — пропуск в кэше мог бы оказаться им же выведенным «праздником»
+    fetch_ranges = _missing(d_from, min(d_till, calendar.last_session()))
+
+    cache_hit("imoex", not fetch_ranges)
     for start, end in fetch_ranges:
-        if start <= end:
+        try:
             df_new = await _fetch_imoex_from_iss(start, end)
-            if not df_new.empty:
-                _save_to_db(df_new)
-                rows.extend(
-                    ImoexPrice(date=r.date, close=r.close) for r in df_new.itertuples()
-                )
+        except upstream.UpstreamUnavailable:
+            with Session(engine) as ses:
+                cached = ses.exec(select(func.count()).where(ImoexPrice.date.between(d_from, d_till))).one()
+            if not cached:
+                raise
+            upstream.mark_stale("imoex")
+            break
+        _save_to_db(df_new, start, end)
 
-    return (
-        pd.DataFrame([{"date": r.date, "close": r.close} for r in rows])
-        .drop_duplicates(subset="date")
-        .sort_values("date")
-        .reset_index(drop=True)
-    ) if rows else pd.DataFrame()
+    df = read_frame(
+        select(ImoexPrice.date, ImoexPrice.close)
+        .where(ImoexPrice.date.between(d_from, d_till))
+        .order_by(ImoexPrice.date)
+    )
+    return df.drop_duplicates(subset="date").reset_index(drop=True)
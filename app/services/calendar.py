@@ -0,0 +1,178 @@
+"""Торговый календарь MOEX и часы основной сессии (время московское).
+
+Торговые дни выводятся из истории IMOEX в кэше (ImoexPrice): индекс считается
+в каждый торговый день, так что будни без значения внутри отрезков, целиком
+полученных из ISS (ImoexFetched), — праздники, а субботы со значением — рабочие
+переносы. Дыры в кэше вне этих отрезков праздниками не считаются. За пределами
+известной истории (будущие даты, ещё не скачанные годы) работает правило «будни,
+кроме праздников, повторявшихся в последние годы». Календарь перечитывается раз в
+CALENDAR_REFRESH_H часов и после каждой докачки IMOEX (invalidate()).
+"""
+import time
+from collections import Counter
+from dataclasses import dataclass, field
+from datetime import date, datetime, timedelta
+from zoneinfo import ZoneInfo
+
+import numpy as np
+import pandas as pd
+from sqlmodel import Session, select
+
+from config import settings
+from database import engine
+from models import ImoexFetched, ImoexPrice
+
+MSK = ZoneInfo("Europe/Moscow")
+
+RECURRING_YEARS = 5   # праздник «повторяется», если выпадал на будни хотя бы дважды за эти годы
+
+
+@dataclass
+class _Calendar:
+    sessions: frozenset = frozenset()
+    holidays: frozenset = frozenset()       # будни без торгов внутри полученных из ISS отрезков
+    recurring: frozenset = frozenset()      # (месяц, день) праздников для дат вне истории
+    loaded_at: float = field(default=0.0)
+    # те же множества для trading_days
+    session_idx: pd.DatetimeIndex = field(default_factory=lambda: pd.DatetimeIndex([]))
+    holiday_idx: pd.DatetimeIndex = field(default_factory=lambda: pd.DatetimeIndex([]))
+    recurring_md: np.ndarray = field(default_factory=lambda: np.array([], dtype=int))  # месяц * 100 + день
+
+
+_cal = _Calendar()
+
+
+def merge_ranges(ranges: list[tuple[date, date]]) -> list[tuple[date, date]]:
+    """Объединить пересекающиеся и смежные отрезки [start, end]."""
+    out: list[tuple[date, date]] = []
+    for start, end in sorted(ranges):
+        if out and start <= out[-1][1] + timedelta(days=1):
+            out[-1] = (out[-1][0], max(out[-1][1], end))
+        else:
+            out.append((start, end))
+    return out
+
+
+def _build(days: list[date], fetched: list[tuple[date, date]]) -> _Calendar:
+    sessions = pd.DatetimeIndex(sorted(set(days)))
+    holidays = pd.DatetimeIndex([])
+    for start, end in merge_ranges(fetched):
+        inside = sessions[(sessions >= pd.Timestamp(start)) & (sessions <= pd.Timestamp(end))]
+        if len(inside):
+            # края отрезка — до первой и после последней сессии — могут быть ещё не опубликованы
+            holidays = holidays.union(pd.bdate_range(inside[0], inside[-1]).difference(inside))
+    if len(sessions):
+        recent = holidays[holidays.year > sessions[-1].year - RECURRING_YEARS]
+    else:
+        recent = holidays
+    counts = Counter(zip(recent.month.tolist(), recent.day.tolist()))
+    recurring = frozenset(md for md, n in counts.items() if n >= 2)
+    return _Calendar(
+        sessions=frozenset(sessions.date),
+        holidays=frozenset(holidays.date),
+        recurring=recurring,
+        loaded_at=time.monotonic(),
+        session_idx=sessions,
+        holiday_idx=holidays,
+        recurring_md=np.array([m * 100 + d for m, d in recurring], dtype=int),
+    )
+
+
+def _calendar() -> _Calendar:
+    global _cal
+    if time.monotonic() - _cal.loaded_at > settings.CALENDAR_REFRESH_H * 3600 or not _cal.loaded_at:
+        with Session(engine) as ss:
+            days = ss.exec(select(ImoexPrice.date)).all()
+            fetched = ss.exec(select(ImoexFetched.start, ImoexFetched.end)).all()
+        _cal = _build(days, [tuple(r) for r in fetched])
+    return _cal
+
+
+def invalidate():
+    """Перечитать календарь при следующем обращении (после докачки IMOEX)."""
+    _cal.loaded_at = 0.0
+
+
+def now() -> datetime:
+    return datetime.now(MSK)
+
+
+def is_trading_day(d: date) -> bool:
+    cal = _calendar()
+    if d in cal.sessions:
+        return True
+    if d in cal.holidays:
+        return False
+    return d.weekday() < 5 and (d.month, d.day) not in cal.recurring
+
+
+def next_trading_day(d: date) -> date:
+    d += timedelta(days=1)
+    while not is_trading_day(d):
+        d += timedelta(days=1)
+    return d
+
+
+def prev_trading_day(d: date) -> date:
+    d -= timedelta(days=1)
+    while not is_trading_day(d):
+        d -= timedelta(days=1)
+    return d
+
+
+def trading_days(start: date, end: date) -> list[date]:
+    """Торговые дни в [start, end]: то же, что is_trading_day по каждому дню, но одним проходом."""
+    cal = _calendar()
+    days = pd.bdate_range(start, end)
+    off = days.isin(cal.holiday_idx) | np.isin(days.month * 100 + days.day, cal.recurring_md)
+    days = days[days.isin(cal.session_idx) | ~off]
+    # рабочие субботы и воскресенья
+    weekend = cal.session_idx[(cal.session_idx >= pd.Timestamp(start)) & (cal.session_idx <= pd.Timestamp(end))]
+    return list(days.union(weekend[weekend.dayofweek >= 5]).date)
+
+
+def trading_days_after(d: date, n: int) -> list[date]:
+    """n торговых дней строго после d (даты прогноза)."""
+    out = []
+    for _ in range(n):
+        d = next_trading_day(d)
+        out.append(d)
+    return out
+
+
+def open_at(d: date) -> datetime:
+    return datetime.combine(d, settings.SESSION_OPEN, MSK)
+
+
+def close_at(d: date) -> datetime:
+    return datetime.combine(d, settings.SESSION_CLOSE, MSK)
+
+
+def last_session(ts: datetime | None = None) -> date:
+    """Последний торговый день, чья основная сессия уже закрылась: новее данных в ISS быть не может."""
+    ts = (ts or now()).astimezone(MSK)
+    d = ts.date()
+    if is_trading_day(d) and ts >= close_at(d):
+        return d
+    return prev_trading_day(d)
+
+
+def in_session(ts: datetime) -> bool:
+    ts = ts.astimezone(MSK)
+    return is_trading_day(ts.date()) and open_at(ts.date()) <= ts < close_at(ts.date())
+
+
+def next_open(ts: datetime) -> datetime:
+    ts = ts.astimezone(MSK)
+    d = ts.date()
+    if not is_trading_day(d) or ts >= open_at(d):
+        d = next_trading_day(d)
+    return open_at(d)
+
+
+def quote_fresh(fetched_at: datetime, ts: datetime | None = None) -> bool:
+    """Котировка, снятая вне сессии, не меняется до следующего открытия; в сессии живёт QUOTE_TTL."""
+    ts = ts or now()
+    if (ts - fetched_at).total_seconds() < settings.QUOTE_TTL:
+        return True
+    return not in_session(fetched_at) and ts < next_open(fetched_at)
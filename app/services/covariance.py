@@ -0,0 +1,164 @@
+"""Ковариация дневных доходностей бумаг квартальной вселенной (для оптимизационных весов).
+
+Вселенная — все бумаги квартальной таблицы капитализации (cap_table_q). Для каждого
+квартала держится окно цен закрытия из таблицы Price: от ~COV_WINDOW торговых дней
+до начала квартала по его конец. Окно дочитывается инкрементально (не чаще раза в
+REFRESH_S секунд): по каждой бумаге — только строки новее уже загруженных.
+
+Ковариация считается по последним COV_WINDOW доходностям до даты as_of с усадкой
+Ледуа — Вольфа к масштабированной единичной матрице и кэшируется по (квартал, as_of);
+запрос для подмножества бумаг — срез готовой матрицы, а не новый расчёт.
+
+Загрузки из ISS (таблица капитализации, история бумаг) идут вне замка: медленный
+ответ по одной бумаге не задерживает запросы по другим. Бумага, у которой и после
+докачки нет цен в окне, не докачивается повторно NO_DATA_S секунд.
+"""
+import asyncio
+import time
+from dataclasses import dataclass, field
+from datetime import date, timedelta
+
+import numpy as np
+import pandas as pd
+from sqlmodel import Session, select, func
+
+from config import settings
+from database import engine
+from models import Price
+from services import calendar, moex
+from services.price_cache import get_series
+from utils.metrics import cache_hit
+from utils.singleflight import SingleFlight
+
+REFRESH_S = 60     # как часто сверять окно с таблицей Price
+NO_DATA_S = 3600   # сколько не докачивать бумагу, у которой нет цен в окне
+
+
+@dataclass
+class _Universe:
+    secids: list[str]
+    start: date
+    end: date
+    closes: pd.DataFrame = field(default_factory=pd.DataFrame)  # date × secid
+    loaded: dict[str, date] = field(default_factory=dict)       # последняя загруженная дата по бумаге
+    checked_at: float = 0.0
+    cov: dict[date, tuple[list[str], np.ndarray]] = field(default_factory=dict)
+    no_data: dict[str, float] = field(default_factory=dict)     # бумага → когда докачка не дала цен
+
+    @property
+    def lo(self) -> date:
+        # календарных дней истории до начала квартала: с запасом на выходные и праздники
+        return self.start - timedelta(days=int(settings.COV_WINDOW * 7 / 5) + 30)
+
+
+_UNIVERSES: dict[tuple[int, int], _Universe] = {}
+_FLIGHT = SingleFlight()  # вселенные, чья таблица капитализации грузится
+_LOCK = asyncio.Lock()
+
+
+def ledoit_wolf(returns: np.ndarray) -> np.ndarray:
+    """Ковариация (T × N → N × N) с оптимальной усадкой к μI (Ledoit & Wolf, 2004)."""
+    t, n = returns.shape
+    x = returns - returns.mean(axis=0)
+    s = x.T @ x / t
+    mu = np.trace(s) / n
+    x2 = x * x
+    # π: дисперсия выборочных ковариаций, δ²: расстояние S до цели
+    pi = (x2.T @ x2).sum() / t - (s * s).sum()
+    delta = ((s - mu * np.eye(n)) ** 2).sum()
+    shrink = 0.0 if delta == 0 else min(1.0, max(0.0, pi / t / delta))
+    return (1 - shrink) * s + shrink * mu * np.eye(n)
+
+
+def _quarter_bounds(year: int, quarter: int) -> tuple[date, date]:
+    start = date(year, 3 * quarter - 2, 1)
+    end = date(year + (quarter == 4), 1 if quarter == 4 else 3 * quarter + 1, 1) - timedelta(days=1)
+    return start, end
+
+
+def _load(u: _Universe):
+    """Дочитать окно: по каждой бумаге — строки новее последней загруженной даты."""
+    window = (Price.secid.in_(u.secids), Price.trade_date.between(u.lo, u.end))
+    with Session(engine) as ss:
+        latest = dict(ss.exec(select(Price.secid, func.max(Price.trade_date)).where(*window).group_by(Price.secid)).all())
+        behind = [s for s, d in latest.items() if u.loaded.get(s) != d]
+        rows = []
+        if behind:
+            since = min(u.loaded.get(s, u.lo - timedelta(days=1)) for s in behind)
+            rows = ss.exec(
+                select(Price.trade_date, Price.secid, Price.close)
+                .where(*window, Price.secid.in_(behind), Price.trade_date > since)
+            ).all()
+    u.checked_at = time.monotonic()
+    if not rows:
+        return
+    new = pd.DataFrame(rows, columns=["date", "secid", "close"]).pivot(index="date", columns="secid", values="close")
+    u.closes = (new.combine_first(u.closes) if not u.closes.empty else new).sort_index()
+    u.loaded.update({s: latest[s] for s in behind})
+    u.cov.clear()
+
+
+def _universe_cov(u: _Universe, as_of: date) -> tuple[list[str], np.ndarray]:
+    """Ковариация всей вселенной по окну до as_of включительно; бумаги без истории в окне исключаются."""
+    hit = u.cov.get(as_of)
+    cache_hit("covariance", hit is not None)
+    if hit is not None:
+        return hit
+    closes = u.closes.loc[:as_of].ffill()
+    rets = closes.pct_change().iloc[1:].tail(settings.COV_WINDOW)
+    enough = rets.notna().sum() >= settings.COV_MIN_OBS
+    rets = rets.loc[:, enough]
+    cols = list(rets.columns)
+    # пропуски (бумага ещё не торговалась) — нулевая доходность
+    cov = ledoit_wolf(rets.fillna(0.0).to_numpy()) if cols else np.empty((0, 0))
+    if len(u.cov) >= 8:
+        u.cov.pop(next(iter(u.cov)))
+    u.cov[as_of] = (cols, cov)
+    return cols, cov
+
+
+async def _universe(year: int, quarter: int) -> _Universe:
+    """Вселенная квартала; таблицу капитализации грузит один запрос, остальные ждут его."""
+    key = (year, quarter)
+    if (u := _UNIVERSES.get(key)) is not None:
+        return u
+    return await _FLIGHT.do(key, lambda: _new_universe(year, quarter))
+
+
+async def _new_universe(year: int, quarter: int) -> _Universe:
+    df_cap = await moex.cap_table_q(year, quarter)
+    start, end = _quarter_bounds(year, quarter)
+    _UNIVERSES[(year, quarter)] = u = _Universe(secids=sorted(set(df_cap.secid)), start=start, end=end)
+    return u
+
+
+async def cov(secids: list[str], as_of: date) -> np.ndarray:
+    """Усаженная ковариация дневных доходностей *secids* (в их порядке) по окну до *as_of*.
+
+    ValueError, если у какой-то бумаги меньше COV_MIN_OBS доходностей в окне.
+    """
+    year, quarter = as_of.year, (as_of.month - 1) // 3 + 1
+    u = await _universe(year, quarter)
+    now = time.monotonic()
+    missing = [s for s in secids if s not in u.loaded and now - u.no_data.get(s, -NO_DATA_S) > NO_DATA_S]
+    if missing:
+        # бумаг подмножества нет в кэше цен — докачать их историю
+        await asyncio.gather(*[get_series(s) for s in missing])
+
+    async with _LOCK:
+        if extra := set(secids) - set(u.secids):
+            u.secids = sorted(set(u.secids) | extra)
+        if missing or time.monotonic() - u.checked_at > REFRESH_S:
+            _load(u)
+        for s in missing:
+            if s in u.loaded:
+                u.no_data.pop(s, None)
+            else:
+                u.no_data[s] = time.monotonic()
+        cols, full = _universe_cov(u, min(as_of, calendar.last_session()))
+
+    pos = {s: i for i, s in enumerate(cols)}
+    if short := [s for s in secids if s not in pos]:
+        raise ValueError(f"Not enough price history for {', '.join(short)}")
+    idx = [pos[s] for s in secids]
+    return full[np.ix_(idx, idx)]
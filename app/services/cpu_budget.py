@@ -0,0 +1,141 @@
+"""Бюджет CPU для тяжёлых расчётов (обучение моделей, отчёты) и допуск к ним.
+
+Каждая тяжёлая задача получает грант — число потоков, которое она вправе занять
+(thread_count CatBoost, потоки torch, воркеры DataLoader), — и сама ограничивает
+ими библиотеки. Сумма выданных потоков не превышает CPU_BUDGET, так что два
+«quality»-прогноза не делят между собой все ядра по нескольку раз.
+
+Задачи, которым не хватило потоков, ждут в очереди по приоритету (отчёты раньше
+прогнозов, прогнозы CatBoost раньше обучения TFT). Обучение не занимает последние
+CPU_INTERACTIVE_RESERVE потоков, чтобы лёгкие задачи проходили и под нагрузкой.
+Если очередь длиннее CPU_QUEUE_MAX или ожидание дольше CPU_QUEUE_TIMEOUT —
+Overloaded, обработчик в main.py отвечает 503 с Retry-After.
+
+    async with budget.acquire(Priority.FAST, want=4, endpoint="forecast") as grant:
+        await asyncio.to_thread(fit, thread_count=grant.threads)
+"""
+import asyncio
+import heapq
+import itertools
+import os
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from enum import IntEnum
+
+from config import settings
+from utils.metrics import ADMISSIONS, CPU_QUEUE, CPU_THREADS
+
+
+class Priority(IntEnum):
+    INTERACTIVE = 0  # отчёты и прочие короткие расчёты
+    FAST = 1         # прогноз CatBoost
+    TRAINING = 2     # обучение TFT
+
+
+class Overloaded(Exception):
+    """Бюджет CPU исчерпан, а очередь полна или ждать слишком долго."""
+
+    def __init__(self, retry_after: int):
+        super().__init__("CPU budget exhausted, retry later")
+        self.retry_after = retry_after
+
+
+@dataclass(frozen=True)
+class Grant:
+    threads: int
+
+
+def _cpu_count() -> int:
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:  # не Linux
+        return os.cpu_count() or 1
+
+
+class CpuBudget:
+    def __init__(self, capacity: int | None = None):
+        self.capacity = capacity or settings.CPU_BUDGET or _cpu_count()
+        self.free = self.capacity
+        # (приоритет, порядок, want, future) — min-куча; отменённые future пропускаются при раздаче
+        self._queue: list[tuple[int, int, int, asyncio.Future]] = []
+        self._seq = itertools.count()
+        self._holds: deque[float] = deque(maxlen=50)  # длительности недавних грантов для Retry-After
+
+    def _size(self, priority: Priority, want: int) -> int:
+        """Сколько потоков выдать сейчас: не больше want и свободного (обучению — за вычетом резерва)."""
+        limit = self.free
+        if priority >= Priority.TRAINING and self.capacity > settings.CPU_INTERACTIVE_RESERVE:
+            limit -= settings.CPU_INTERACTIVE_RESERVE
+        return max(0, min(want, limit))
+
+    def _waiting(self) -> int:
+        return sum(1 for *_, fut in self._queue if not fut.done())
+
+    def retry_after(self) -> int:
+        hold = sum(self._holds) / len(self._holds) if self._holds else settings.CPU_QUEUE_TIMEOUT
+        return max(1, round(hold * (self._waiting() + 1) / self.capacity))
+
+    def _dispatch(self):
+        while self._queue:
+            priority, _, want, fut = self._queue[0]
+            if fut.done():
+                heapq.heappop(self._queue)
+                continue
+            n = self._size(Priority(priority), want)
+            if n < 1:
+                break  # голову очереди не обгоняем: иначе обучение не дождётся ядер
+            heapq.heappop(self._queue)
+            self.free -= n
+            fut.set_result(n)
+        CPU_QUEUE.set(self._waiting())
+        CPU_THREADS.set(self.capacity - self.free)
+
+    def _release(self, n: int):
+        self.free += n
+        self._dispatch()
+
+    async def _admit(self, priority: Priority, want: int, endpoint: str) -> int:
+        want = max(1, min(want, self.capacity))
+        if not any(p <= priority and not f.done() for p, _, _, f in self._queue):
+            n = self._size(priority, want)
+            if n >= 1:
+                self.free -= n
+                self._dispatch()
+                ADMISSIONS.inc(endpoint=endpoint, result="admitted")
+                return n
+        if self._waiting() >= settings.CPU_QUEUE_MAX:
+            ADMISSIONS.inc(endpoint=endpoint, result="rejected")
+            raise Overloaded(self.retry_after())
+
+        fut = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._queue, (int(priority), next(self._seq), want, fut))
+        CPU_QUEUE.set(self._waiting())
+        ADMISSIONS.inc(endpoint=endpoint, result="queued")
+        try:
+            return await asyncio.wait_for(asyncio.shield(fut), settings.CPU_QUEUE_TIMEOUT)
+        except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+            if fut.done() and not fut.cancelled():
+                self._release(fut.result())  # грант выдан в момент отмены — вернуть
+            else:
+                fut.cancel()
+                self._dispatch()
+            if isinstance(e, asyncio.TimeoutError):
+                ADMISSIONS.inc(endpoint=endpoint, result="rejected")
+                raise Overloaded(self.retry_after()) from None
+            raise
+
+    @asynccontextmanager
+    async def acquire(self, priority: Priority, want: int | None = None, endpoint: str = ""):
+        """Дождаться гранта (или Overloaded); потоки возвращаются в бюджет на выходе."""
+        n = await self._admit(priority, want or self.capacity, endpoint)
+        t0 = time.monotonic()
+        try:
+            yield Grant(n)
+        finally:
+            self._holds.append(time.monotonic() - t0)
+            self._release(n)
+
+
+budget = CpuBudget()
@@ -1,15 +1,30 @@
+import numpy as np
 import pandas as pd
+from scipy import sparse
 from datetime import date
+from services import intraday, covariance
 from services.moex import load_latest_prices, candles_bulk
+from utils.weights import SOLVERS
+
+# схемы, веса которых решаются по ковариации доходностей, а не по таблице капитализации
+OPTIMIZED = tuple(SOLVERS)
+# схемы, которые build_weights_bulk считает по столбцам таблицы
+BULK_WEIGHTINGS = ("equal", "market_cap", "cap_freefloat", "cap_divyield", "custom")
 
 
 async def build_weights(
     df_cap: pd.DataFrame,
     weighting: str,
     custom: dict[str, float] | None = None,
+    as_of: date | None = None,
 ) -> dict[str, float]:
+    """Веса по схеме *weighting*; для оптимизационных схем ковариация берётся по окну до *as_of*."""
+    if weighting in OPTIMIZED:
+        secids = list(df_cap.index)
+        cov = await covariance.cov(secids, as_of or date.today())
+        return dict(zip(secids, SOLVERS[weighting](cov).tolist()))
     if weighting == "equal":
-        w = {s: 1 / len(df_cap) for s in df_cap.secid}
+        w = {s: 1 / len(df_cap) for s in df_cap.index}
     elif weighting == "market_cap":
         w = (df_cap.cap / df_cap.cap.sum()).to_dict()
     elif weighting == "cap_freefloat":
@@ -28,25 +43,71 @@ async def build_weights(
     return w
 
 
+def build_weights_bulk(df: pd.DataFrame) -> pd.DataFrame:
+    """Weights for many indices at once.
+
+    *df* is a long table (spec, secid, weighting, cap, free_float, div_yield, custom),
+    one row per component; returns it with a ``weight`` column normalised per spec.
+    """
+    if unknown := sorted(set(df.weighting) - set(BULK_WEIGHTINGS)):
+        raise ValueError(f"Unknown weighting: {', '.join(unknown)}")
+    df = df.copy()
+    for col in ("cap", "free_float", "div_yield", "custom"):
+        if col not in df:
+            df[col] = np.nan
+    w = df.weighting
+    df["weight"] = np.select(
+        [w == name for name in BULK_WEIGHTINGS],
+        [1.0, df.cap, df.cap * df.free_float / 100, df.cap * df.div_yield / 100, df.custom],
+        default=np.nan,
+    )
+    df["weight"] /= df.groupby("spec")["weight"].transform("sum")
+    return df
+
+
 async def compute_index_value(weights: dict[str, float]) -> float:
     prices = await load_latest_prices(list(weights))
     return sum(prices[s] * w for s, w in weights.items())
 
 
-async def compute_series(weights: dict[str, float], date_from: date, date_to: date):
-    """Return list[{date,value}] daily using fixed weights."""
-    bulk = await candles_bulk(list(weights), date_from, date_to)
-    # build common date index
-    all_dates = sorted({d for df in bulk.values() for d in df["date"].unique()})
-    series = []
-    for d in all_dates:
-        val = 0.0
-        for s, w in weights.items():
-            df = bulk.get(s)
-            if df is None:
-                continue
-            row = df[df["date"] == d]
-            if not row.empty:
-                val += row.iloc[0].close * w
-        series.append({"date": str(d), "value": val})
-    return series
+async def close_matrix(secids: list[str], date_from: date, date_to: date, interval: int = 24) -> pd.DataFrame:
+    """date × secid closes; NaN where a security did not trade.
+
+    Daily bars come from ISS candles; intraday ones (1/10/60 min) from the intraday
+    store, forward-filled so a bar without trades keeps the last price.
+    """
+    if interval == intraday.DAILY:
+        bulk = await candles_bulk(secids, date_from, date_to)
+    else:
+        bulk = await intraday.bars(secids, date_from, date_to, interval)
+    if not bulk:
+        return pd.DataFrame(columns=secids, dtype=float)
+    tbl = pd.concat(
+        [df.set_index("date")["close"].rename(s) for s, df in bulk.items()], axis=1
+    )
+    tbl = tbl[~tbl.index.duplicated(keep="first")].sort_index().reindex(columns=secids)
+    return tbl if interval == intraday.DAILY else tbl.ffill()
+
+
+def weight_matrix(rows: list[tuple[int, str, float]], keys: list[int], secids: list[str]):
+    """Sparse (index × secid) weight matrix from (index_id, secid, weight) triples."""
+    row_pos = {k: i for i, k in enumerate(keys)}
+    col_pos = {s: j for j, s in enumerate(secids)}
+    r, c, w = zip(*[(row_pos[k], col_pos[s], wt) for k, s, wt in rows]) if rows else ((), (), ())
+    return sparse.csr_matrix((w, (r, c)), shape=(len(keys), len(secids)))
+
+
+def series_matrix(weights, closes: pd.DataFrame) -> np.ndarray:
+    """Values of every index on every date: (index × secid) weights @ (secid × date) closes.
+
+    A security without a candle on a date contributes nothing, as in ``compute_series``.
+    """
+    return np.asarray(weights @ closes.fillna(0.0).to_numpy().T)
+
+
+async def compute_series(weights: dict[str, float], date_from: date, date_to: date, interval: int = 24):
+    """Return list[{date,value}] using fixed weights, daily or intraday (*interval* minutes)."""
+    secids = list(weights)
+    closes = await close_matrix(secids, date_from, date_to, interval)
+    values = series_matrix(np.array([[weights[s] for s in secids]]), closes)[0]
+    return [{"date": str(d), "value": v} for d, v in zip(closes.index, values.tolist())]
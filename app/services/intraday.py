@@ -0,0 +1,232 @@
+"""Внутридневные свечи (1, 10, 60 минут) в компактном хранилище.
+
+Бары одной бумаги за один день одного таймфрейма — одна строка IntradayBars:
+минуты от полуночи (uint16) и цены закрытия (float32), упакованные в BLOB.
+Минутный день ликвидной бумаги занимает ~3 КБ, чтение — np.frombuffer без разбора строк.
+
+Тиры: минутные бары старше INTRADAY_KEEP_1M_DAYS сворачиваются в 10-минутные,
+10-минутные старше INTRADAY_KEEP_10M_DAYS — в часовые (roll_up). Бары таймфрейма k
+собираются из любого хранимого тира, делящего k; дневные (k=24) — последняя
+цена каждого дня, отдельно не хранятся. Докачанный старый день сразу сохраняется
+в тире, в который его свернул бы roll_up.
+
+Из ISS качаются только непрерывные отрезки недостающих дней. Текущий день
+перекачивается, пока не будет снят целиком — после закрытия сессии.
+"""
+import asyncio
+from datetime import date, timedelta
+
+import aiomoex
+import numpy as np
+import pandas as pd
+from sqlmodel import Session, select
+
+from config import settings
+from database import engine
+from models import IntradayBars
+from services import calendar, upstream
+from utils.metrics import timed, cache_hit, ISS_FETCH_SECONDS
+
+INTERVALS = (1, 10, 60)
+DAILY = 24
+
+# (secid, день, тир) текущих дней, снятых после закрытия сессии, — больше не перекачиваются
+_FINAL: set[tuple[str, date, int]] = set()
+
+
+def pack(minutes: np.ndarray, closes: np.ndarray) -> tuple[bytes, bytes]:
+    return minutes.astype("<u2").tobytes(), closes.astype("<f4").tobytes()
+
+
+def unpack(row: IntradayBars) -> tuple[np.ndarray, np.ndarray]:
+    return np.frombuffer(row.minutes, "<u2"), np.frombuffer(row.close, "<f4")
+
+
+def resample(minutes: np.ndarray, closes: np.ndarray, interval: int) -> tuple[np.ndarray, np.ndarray]:
+    """Бары крупнее: последняя цена в каждом интервале (минуты — начало интервала); 24 — одна цена дня."""
+    if not len(minutes):
+        return minutes, closes
+    if interval == DAILY:
+        return minutes[-1:], closes[-1:]
+    bucket = minutes // interval * interval
+    last = np.flatnonzero(np.r_[bucket[1:] != bucket[:-1], True])
+    return bucket[last], closes[last]
+
+
+def window_days(interval: int) -> int:
+    """Самое длинное окно внутридневного ряда для /stats, в календарных днях.
+
+    Минутные — пока хранятся минутными (старшие дни пришлось бы снова качать из ISS),
+    10- и 60-минутные — не дальше срока хранения 10-минутного тира.
+    """
+    return settings.INTRADAY_KEEP_1M_DAYS if interval == 1 else settings.INTRADAY_KEEP_10M_DAYS
+
+
+def storage_tier(d: date, today: date) -> int:
+    """Тир, в котором день d хранится после roll_up."""
+    if d >= today - timedelta(days=settings.INTRADAY_KEEP_1M_DAYS):
+        return 1
+    if d >= today - timedelta(days=settings.INTRADAY_KEEP_10M_DAYS):
+        return 10
+    return 60
+
+
+def _runs(days: list[date], missing: list[date]) -> list[tuple[date, date]]:
+    """Непрерывные по торговым дням (days) отрезки недостающих дней: [(первый, последний), …]."""
+    pos = {d: i for i, d in enumerate(days)}
+    runs: list[tuple[date, date]] = []
+    for d in missing:
+        if runs and pos[d] == pos[runs[-1][1]] + 1:
+            runs[-1] = (runs[-1][0], d)
+        else:
+            runs.append((d, d))
+    return runs
+
+
+def _tiers(interval: int) -> list[int]:
+    """Тиры, из которых собирается таймфрейм, от крупного к мелкому."""
+    return sorted((t for t in INTERVALS if interval == DAILY or interval % t == 0), reverse=True)
+
+
+def _stored(secids: list[str], d_from: date, d_till: date, interval: int) -> dict[tuple[str, date], IntradayBars]:
+    tiers = _tiers(interval)
+    with Session(engine) as ss:
+        rows = ss.exec(
+            select(IntradayBars).where(
+                IntradayBars.secid.in_(secids),
+                IntradayBars.day.between(d_from, d_till),
+                IntradayBars.interval.in_(tiers),
+            )
+        ).all()
+    out: dict[tuple[str, date], IntradayBars] = {}
+    for r in sorted(rows, key=lambda r: tiers.index(r.interval), reverse=True):
+        out[(r.secid, r.day)] = r  # крупный тир перезаписывает мелкий: меньше баров на чтение
+    return out
+
+
+@timed(ISS_FETCH_SECONDS, loader="intraday")
+async def _fetch(jobs: list[tuple[str, date, date]], interval: int) -> list:
+    async with upstream.session() as session:
+        return await asyncio.gather(*[
+            aiomoex.get_market_candles(
+                session,
+                security=s,
+                interval=interval,
+                start=str(start),
+                end=str(end),
+                market="index" if s == "IMOEX" else "shares",
+            )
+            for s, start, end in jobs
+        ], return_exceptions=True)
+
+
+def _split_days(candles: list[dict]) -> dict[date, tuple[np.ndarray, np.ndarray]]:
+    if not candles:
+        return {}
+    df = pd.DataFrame(candles)[["begin", "close"]]
+    ts = pd.to_datetime(df["begin"])
+    df = df.assign(day=ts.dt.date, minute=ts.dt.hour * 60 + ts.dt.minute).sort_values(["day", "minute"])
+    return {
+        d: (g["minute"].to_numpy(), g["close"].to_numpy())
+        for d, g in df.groupby("day", sort=False)
+    }
+
+
+def _save(secid: str, interval: int, days: list[date], fetched: dict, today: date):
+    empty = np.array([]), np.array([])
+    with Session(engine) as ss:
+        for d in days:
+            if d not in fetched and d >= today:
+                continue  # пустой текущий день ещё может наполниться
+            tier = max(interval, storage_tier(d, today))  # старый день — сразу в тир после roll_up
+            minutes, close = pack(*resample(*fetched.get(d, empty), tier))
+            ss.merge(IntradayBars(secid=secid, day=d, interval=tier, minutes=minutes, close=close))
+        ss.commit()
+
+
+async def bars(secids: list[str], d_from: date, d_till: date, interval: int) -> dict[str, pd.DataFrame]:
+    """secid → DataFrame(date, close) баров таймфрейма interval (1, 10, 60 или 24 — дневные).
+
+    Недостающие дни докачиваются из ISS (для дневных — часовыми барами) отрезками
+    подряд идущих торговых дней; текущий день — пока не снят после закрытия сессии.
+    Если ISS недоступен — отдаётся сохранённое.
+    """
+    if interval not in INTERVALS + (DAILY,):
+        raise ValueError(f"unsupported interval {interval}")
+    fetch_interval = interval if interval in INTERVALS else INTERVALS[-1]
+    now = calendar.now()
+    today = now.date()
+    closed = now >= calendar.close_at(today)
+    stored = _stored(secids, d_from, d_till, interval)
+    days = calendar.trading_days(d_from, min(d_till, today))
+    missing = {
+        s: [
+            d for d in days
+            if (s, d) not in stored or (d == today and (s, d, fetch_interval) not in _FINAL)
+        ]
+        for s in secids
+    }
+    missing = {s: ds for s, ds in missing.items() if ds}
+    cache_hit("intraday", not missing)
+
+    if missing:
+        jobs = [(s, start, end) for s, ds in missing.items() for start, end in _runs(days, ds)]
+        raw = await _fetch(jobs, fetch_interval)
+        for (s, start, end), r in zip(jobs, raw):
+            if isinstance(r, upstream.UpstreamUnavailable):
+                upstream.mark_stale("intraday")
+                continue
+            if isinstance(r, BaseException):
+                raise r
+            fetched = _split_days(r)
+            _save(s, fetch_interval, [d for d in missing[s] if start <= d <= end], fetched, today)
+            if closed and end == today:
+                _FINAL.difference_update([k for k in _FINAL if k[1] < today])
+                _FINAL.add((s, today, fetch_interval))
+            for d, (minutes, close) in fetched.items():
+                m, c = pack(minutes, close)
+                stored[(s, d)] = IntradayBars(secid=s, day=d, interval=fetch_interval, minutes=m, close=c)
+
+    out = {}
+    for s in secids:
+        parts = []
+        for d in days:
+            row = stored.get((s, d))
+            if row is None:
+                continue
+            minutes, close = resample(*unpack(row), interval)
+            if len(minutes):
+                ts = np.datetime64(d, "m") + minutes.astype("timedelta64[m]")
+                parts.append(pd.DataFrame({"date": ts, "close": close.astype(float)}))
+        if parts:
+            df = pd.concat(parts, ignore_index=True)
+            if interval == DAILY:
+                df["date"] = df["date"].dt.normalize()
+            out[s] = df
+    return out
+
+
+def roll_up(today: date | None = None, batch: int = 2000) -> dict[int, int]:
+    """Свернуть старые дни в более крупный тир; вернуть {исходный тир: число свёрнутых дней}."""
+    today = today or date.today()
+    done = {}
+    for src, dst, keep in ((1, 10, settings.INTRADAY_KEEP_1M_DAYS), (10, 60, settings.INTRADAY_KEEP_10M_DAYS)):
+        cutoff = today - timedelta(days=keep)
+        done[src] = 0
+        while True:
+            with Session(engine) as ss:
+                rows = ss.exec(
+                    select(IntradayBars)
+                    .where(IntradayBars.interval == src, IntradayBars.day < cutoff)
+                    .limit(batch)
+                ).all()
+                if not rows:
+                    break
+                for r in rows:
+                    if ss.get(IntradayBars, (r.secid, r.day, dst)) is None:
+                        minutes, close = pack(*resample(*unpack(r), dst))
+                        ss.add(IntradayBars(secid=r.secid, day=r.day, interval=dst, minutes=minutes, close=close))
+                    ss.delete(r)
+                ss.commit()
+            done[src] += len(rows)
+    return done
@@ -0,0 +1,136 @@
+"""Общая раздача текущих значений индексов подписчикам (SSE).
+
+Один фоновый тикер на процесс: раз в QUOTE_TTL (пока идут торги; вне сессии —
+раз в LIVE_IDLE_TICK) он берёт котировки всех бумаг из подписанных индексов
+одним вызовом load_latest_prices, считает значения и раздаёт их подписчикам.
+Тысяча зрителей одного индекса стоят ISS столько же, сколько один.
+
+Медленный клиент не копит очередь: у подписчика хранится только последнее
+значение по каждому индексу, промежуточные перезаписываются.
+"""
+import asyncio
+import contextvars
+import logging
+from collections import defaultdict
+from datetime import date
+
+import orjson
+from sqlmodel import Session, select
+
+from config import settings
+from database import engine
+from models import IndexComponent
+from services import calendar, moex
+from utils.metrics import INFLIGHT
+
+log = logging.getLogger(__name__)
+
+HEARTBEAT = 15.0  # сек между комментариями-пингами, чтобы прокси не рвали соединение
+
+
+class Subscriber:
+    def __init__(self, ids: list[int]):
+        self.ids = ids
+        self.pending: dict[int, dict] = {}
+        self.ready = asyncio.Event()
+
+    def offer(self, payload: dict):
+        self.pending[payload["id"]] = payload  # перезапись: отдаём только свежее
+        self.ready.set()
+
+    def drain(self) -> list[dict]:
+        out, self.pending = list(self.pending.values()), {}
+        self.ready.clear()
+        return out
+
+
+class LiveHub:
+    def __init__(self):
+        self._subs: dict[int, set[Subscriber]] = defaultdict(set)
+        self._last: dict[int, dict] = {}
+        self._task: asyncio.Task | None = None
+        self._wake: asyncio.Event | None = None
+
+    @property
+    def subscribers(self) -> int:
+        return len({s for subs in self._subs.values() for s in subs})
+
+    def subscribe(self, ids: list[int]) -> Subscriber:
+        sub = Subscriber(ids)
+        for i in ids:
+            self._subs[i].add(sub)
+            if i in self._last:
+                sub.offer(self._last[i])
+        if self._task is None or self._task.done():
+            self._wake = asyncio.Event()
+            # свой контекст: тикер не должен наследовать контекст (X-Data-Stale и пр.) первого запроса
+            self._task = asyncio.create_task(self._run(), context=contextvars.Context())
+        if any(i not in self._last for i in ids):
+            self._wake.set()
+        return sub
+
+    def unsubscribe(self, sub: Subscriber):
+        for i in sub.ids:
+            self._subs[i].discard(sub)
+            if not self._subs[i]:
+                del self._subs[i]
+                self._last.pop(i, None)
+
+    async def _run(self):
+        while self._subs:
+            try:
+                await self.tick()
+            except Exception:
+                log.exception("live tick failed")
+            period = settings.QUOTE_TTL if calendar.in_session(calendar.now()) else settings.LIVE_IDLE_TICK
+            try:
+                await asyncio.wait_for(self._wake.wait(), period)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+
+    async def tick(self):
+        """Пересчитать все подписанные индексы и раздать изменившиеся значения."""
+        ids = list(self._subs)
+        if not ids:
+            return
+        with Session(engine) as ss:
+            rows = ss.exec(
+                select(IndexComponent.index_id, IndexComponent.secid, IndexComponent.weight)
+                .where(IndexComponent.index_id.in_(ids))
+            ).all()
+        prices = await moex.load_latest_prices(sorted({r[1] for r in rows}))
+        values: dict[int, float] = defaultdict(float)
+        for index_id, secid, weight in rows:
+            values[index_id] += prices.get(secid, 0.0) * weight
+        today = str(date.today())
+        for i in ids:
+            payload = {"id": i, "date": today, "value": values.get(i, 0.0)}
+            if self._last.get(i) == payload:
+                continue
+            self._last[i] = payload
+            for sub in self._subs.get(i, ()):
+                sub.offer(payload)
+
+
+hub = LiveHub()
+
+
+async def stream(ids: list[int]):
+    """Тело text/event-stream: событие ``value`` на каждое новое значение, пинги между ними.
+
+    Отключение клиента StreamingResponse замечает сам и отменяет генератор.
+    """
+    sub = hub.subscribe(ids)
+    try:
+        with INFLIGHT.track(endpoint="live"):
+            while True:
+                try:
+                    await asyncio.wait_for(sub.ready.wait(), HEARTBEAT)
+                except asyncio.TimeoutError:
+                    yield b": ping\n\n"
+                    continue
+                for payload in sub.drain():
+                    yield b"event: value\ndata: " + orjson.dumps(payload) + b"\n\n"
+    finally:
+        hub.unsubscribe(sub)
@@ -1,10 +1,12 @@
-import asyncio, aiomoex, aiohttp, io, datetime, pandas as pd
+import asyncio, aiomoex, io, datetime, pandas as pd
 from bs4 import BeautifulSoup
 from datetime import date
 from urllib.parse import urljoin
-from sqlmodel import Session, select
-from database import engine
-from models import Capitalization, FreeFloat, DividendYield
+from sqlmodel import Session, select, func, or_, and_
+from database import engine, read_frame
+from services import upstream, calendar
+from utils.metrics import timed, cache_hit, ISS_FETCH_SECONDS
+from models import Capitalization, FreeFloat, DividendYield, Price
 
 
 BASE_URL = "https://www.moex.com"
@@ -16,42 +18,109 @@ PROF_URL = (
 DIV_URL = "https://web.moex.com/moex-web-icdb-api/api/v1/export/site-dividend-yields/xlsx"
 
 
-def _df_from_cap(rows):
-    return pd.DataFrame([r.dict() for r in rows])[
-        ["secid", "name", "state_reg", "shares_out", "price", "cap"]
-    ]
+class QuarterNotPublished(ValueError):
+    """Таблицы капитализации за квартал на странице s26 ещё нет."""
+
+
+_CAP_COLS = (
+    Capitalization.secid, Capitalization.name, Capitalization.state_reg,
+    Capitalization.shares_out, Capitalization.price, Capitalization.cap,
+)
 
 
 def _df_from_ff(rows):
     return pd.DataFrame([r.dict() for r in rows])[["SECID", "FREEFLOAT"]]
 
 
-async def load_latest_prices(secids: list[str]) -> dict[str, float]:
-    async with aiohttp.ClientSession() as session:
+def _partition(secids: list[str], raw: list):
+    """Результаты gather(..., return_exceptions=True): {secid: ответ} и бумаги, по которым ISS недоступен."""
+    ok, failed = {}, []
+    for s, r in zip(secids, raw):
+        if isinstance(r, upstream.UpstreamUnavailable):
+            failed.append(s)
+        elif isinstance(r, BaseException):
+            raise r
+        else:
+            ok[s] = r
+    return ok, failed
+
+
+def _cached_last_close(secids: list[str]) -> dict[str, float]:
+    with Session(engine) as ss:
+        # SQLite: «голый» столбец при max() берётся из строки с максимумом
+        rows = ss.exec(
+            select(Price.secid, Price.close, func.max(Price.trade_date))
+            .where(Price.secid.in_(secids))
+            .group_by(Price.secid)
+        ).all()
+    return {s: c for s, c, _ in rows if c is not None}
+
+
+def _cached_candles(secids: list[str], date_from: date, date_to: date) -> dict[str, pd.DataFrame]:
+    with Session(engine) as ss:
+        rows = ss.exec(
+            select(Price.secid, Price.trade_date, Price.close)
+            .where(Price.secid.in_(secids), Price.trade_date.between(date_from, date_to))
+            .order_by(Price.secid, Price.trade_date)
+        ).all()
+    df = pd.DataFrame(rows, columns=["secid", "date", "close"])
+    return {s: g[["date", "close"]].reset_index(drop=True) for s, g in df.groupby("secid")}
+
+
+# secid → (цена, когда снята); свежесть решает calendar.quote_fresh
+_QUOTES: dict[str, tuple[float, datetime.datetime]] = {}
+
+
+@timed(ISS_FETCH_SECONDS, loader="quotes")
+async def _fetch_quotes(secids: list[str]) -> tuple[dict[str, float], list[str]]:
+    """Цены последних свечей за сегодня и бумаги, по которым ISS недоступен."""
+    today = calendar.now().date().strftime("%Y-%m-%d")
+    async with upstream.session() as session:
         tasks = [
             aiomoex.get_market_candles(
                 session,
                 security=s,
                 interval=24,
-                start=date.today().strftime("%Y-%m-%d"),
-                end=date.today().strftime("%Y-%m-%d"),
+                start=today,
+                end=today,
             )
             for s in secids
         ]
-        raw = await asyncio.gather(*tasks)
-    return {s: candles[-1]["close"] if candles else 0.0 for s, candles in zip(secids, raw)}
+        raw = await asyncio.gather(*tasks, return_exceptions=True)
+    ok, failed = _partition(secids, raw)
+    return {s: candles[-1]["close"] for s, candles in ok.items() if candles}, failed
 
 
+async def load_latest_prices(secids: list[str]) -> dict[str, float]:
+    ts = calendar.now()
+    missing = [s for s in secids if s not in _QUOTES or not calendar.quote_fresh(_QUOTES[s][1], ts)]
+    cache_hit("quotes", not missing)
+    fallback = {}
+    if missing:
+        fresh, failed = await _fetch_quotes(missing)
+        # свечи за сегодня нет (до открытия, выходной) — последнее закрытие из кэша цен
+        no_candle = [s for s in missing if s not in fresh and s not in failed]
+        if no_candle:
+            fresh.update(_cached_last_close(no_candle))
+        _QUOTES.update({s: (c, ts) for s, c in fresh.items()})
+        if failed:
+            upstream.mark_stale("quotes")
+            unknown = [s for s in failed if s not in _QUOTES]
+            fallback = _cached_last_close(unknown) if unknown else {}
+    return {s: _QUOTES[s][0] if s in _QUOTES else fallback.get(s, 0.0) for s in secids}
+
+
+@timed(ISS_FETCH_SECONDS, loader="cap_table")
 async def _scrape_cap(year: int, quarter: int) -> pd.DataFrame:
     """Download capitalization table for *year*, *quarter* (1‑4)."""
-    async with aiohttp.ClientSession() as s, s.get(f"{BASE_URL}/s26") as r:
+    async with upstream.session() as s, s.get(f"{BASE_URL}/s26") as r:
         soup = BeautifulSoup(await r.text(), "lxml")
         scroller = soup.select_one("table.table1")
         if not scroller:
             raise RuntimeError("table-scroller not found on s26 page")
         header_cells = [th.text.strip() for th in scroller.find("tr").find_all("th")]
         if str(year) not in header_cells:
-            raise ValueError(f"Year {year} not available on s26 page")
+            raise QuarterNotPublished(f"Year {year} not available on s26 page")
         y_idx = header_cells.index(str(year))
         href = None
         for tr in scroller.find_all("tr")[1:]:
@@ -65,8 +134,8 @@ async def _scrape_cap(year: int, quarter: int) -> pd.DataFrame:
                     href = urljoin(BASE_URL, a["href"])
                 break
         if not href:
-            raise ValueError(f"Link for {quarter}‑q {year} not found")
-    async with aiohttp.ClientSession() as s, s.get(href) as r:
+            raise QuarterNotPublished(f"Link for {quarter}‑q {year} not found")
+    async with upstream.session() as s, s.get(href) as r:
         soup = BeautifulSoup(await r.text(), "lxml")
         table = soup.select_one("div.table-scroller table.table1, table.table1")
         if table is None:
@@ -100,13 +169,18 @@ async def _scrape_cap(year: int, quarter: int) -> pd.DataFrame:
 
 async def cap_table_q(year: int, quarter: int):
     """Return DataFrame (secid … cap) for given quarter; uses DB cache."""
-    with Session(engine) as ss:
-        rows = ss.exec(
-            select(Capitalization).where(Capitalization.year == year, Capitalization.quarter == quarter)
-        ).all()
-        if rows:
-            return _df_from_cap(rows)
-    df = await _scrape_cap(year, quarter)
+    df = read_frame(select(*_CAP_COLS).where(Capitalization.year == year, Capitalization.quarter == quarter))
+    cache_hit("cap_table", not df.empty)
+    if not df.empty:
+        return df
+    try:
+        df = await _scrape_cap(year, quarter)
+    except upstream.UpstreamUnavailable:
+        df = _cached_cap_before(year, quarter)
+        if df is None:
+            raise
+        upstream.mark_stale("cap_table")
+        return df
     with Session(engine) as ss:
         for row in df.itertuples(index=False):
             ss.add(
@@ -125,19 +199,47 @@ async def cap_table_q(year: int, quarter: int):
     return df
 
 
+def _cached_cap_before(year: int, quarter: int) -> pd.DataFrame | None:
+    """Последняя закэшированная таблица капитализации до (year, quarter)."""
+    with Session(engine) as ss:
+        prev = ss.exec(
+            select(Capitalization.year, Capitalization.quarter)
+            .where(or_(
+                Capitalization.year < year,
+                and_(Capitalization.year == year, Capitalization.quarter < quarter),
+            ))
+            .order_by(Capitalization.year.desc(), Capitalization.quarter.desc())
+            .limit(1)
+        ).first()
+    if prev is None:
+        return None
+    return read_frame(select(*_CAP_COLS).where(Capitalization.year == prev[0], Capitalization.quarter == prev[1]))
+
+
 async def _load_xlsx(url: str) -> pd.DataFrame:
-    async with aiohttp.ClientSession() as s, s.get(url) as r:
-        buf = await r.read()
+    with timed(ISS_FETCH_SECONDS, loader="xlsx"):
+        async with upstream.session() as s, s.get(url) as r:
+            buf = await r.read()
     return pd.read_excel(io.BytesIO(buf))
 
 
 async def free_float() -> pd.DataFrame:
-    target = date.today() - datetime.timedelta(days=1)
-    with Session(engine) as ss:
-        rows = ss.exec(select(FreeFloat).where(FreeFloat.date == target or FreeFloat.date == date.today())).all()
-        if rows:
-            return pd.DataFrame([r.dict() for r in rows])[["secid", "free_float"]]
-    df = await _load_xlsx(FF_URL)
+    # снимок, сделанный сегодня или после последней закрытой сессии, ещё актуален
+    cols = select(FreeFloat.secid, FreeFloat.free_float)
+    df = read_frame(cols.where(FreeFloat.date.in_([calendar.last_session(), calendar.now().date()])))
+    cache_hit("free_float", not df.empty)
+    if not df.empty:
+        return df
+    try:
+        df = await _load_xlsx(FF_URL)
+    except upstream.UpstreamUnavailable:
+        with Session(engine) as ss:
+            last = ss.exec(select(func.max(FreeFloat.date))).first()
+        df = read_frame(cols.where(FreeFloat.date == last)) if last else pd.DataFrame()
+        if df.empty:
+            raise
+        upstream.mark_stale("free_float")
+        return df
     if len(df.columns) >= 7:
         df.columns = [
             "secid",
@@ -150,18 +252,19 @@ async def free_float() -> pd.DataFrame:
         ] + list(df.columns[7:])
     df = df.loc[df["free_float"] != "не рассчитан"].copy()
     df["free_float"] = df["free_float"].astype(float)
+    today = calendar.now().date()
     with Session(engine) as ss:
         for row in df.itertuples(index=False):
-            ss.merge(FreeFloat(date=date.today(), secid=row.secid, free_float=row.free_float))
+            ss.merge(FreeFloat(date=today, secid=row.secid, free_float=row.free_float))
         ss.commit()
     return df[["secid", "free_float"]]
 
 
 async def div_yield_df(year: int = 2020) -> pd.DataFrame:
-    with Session(engine) as ses:
-        rows = ses.exec(select(DividendYield).where(DividendYield.year == year)).all()
-        if rows:
-            return pd.DataFrame([r.dict(exclude={"id", "year", "loaded_at"}) for r in rows])
+    df = read_frame(select(DividendYield.state_reg, DividendYield.div_yield).where(DividendYield.year == year))
+    cache_hit("div_yield", not df.empty)
+    if not df.empty:
+        return df
 
     df = await _load_xlsx(DIV_URL)
 
@@ -203,15 +306,17 @@ async def list_securities(year: int, quarter: int) -> list[tuple[str, str]]:
         select(Capitalization.secid, Capitalization.name).where(
             Capitalization.year == year, Capitalization.quarter == quarter
         )).all()]
+    cache_hit("securities", bool(rows))
     if rows:
         return rows
     df = await cap_table_q(year, quarter)
     return list(zip(df.secid, df.name))
 
 
+@timed(ISS_FETCH_SECONDS, loader="candles")
 async def candles_bulk(secids: list[str], date_from: date, date_to: date):
     """Return dict secid→DataFrame(date, close) daily candles."""
-    async with aiohttp.ClientSession() as session:
+    async with upstream.session() as session:
         tasks = [
             aiomoex.get_market_candles(
                 session,
@@ -222,12 +327,19 @@ async def candles_bulk(secids: list[str], date_from: date, date_to: date):
             )
             for s in secids
         ]
-        raw = await asyncio.gather(*tasks)
+        raw = await asyncio.gather(*tasks, return_exceptions=True)
+    ok, failed = _partition(secids, raw)
     out = {}
-    for s, candles in zip(secids, raw):
+    for s, candles in ok.items():
         if not candles:
             continue
         df = pd.DataFrame(candles)[["begin", "close"]]
         df["date"] = pd.to_datetime(df["begin"]).dt.date
         out[s] = df[["date", "close"]]
+    if failed:
+        cached = _cached_candles(failed, date_from, date_to)
+        if not ok and not cached:
+            raise upstream.UpstreamUnavailable("iss.moex.com", "no cached candles")
+        upstream.mark_stale("candles")
+        out.update(cached)
     return out
@@ -0,0 +1,110 @@
+"""Граф стадий одного запроса: независимые стадии идут параллельно в пределах одного гранта CPU.
+
+    stages = [
+        Stage("dataset", make_dataset, threads=1),          # sync, в потоке
+        Stage("simulate", simulate, deps=("dataset",), threads=1),
+        Stage("clf", fit_clf, deps=("dataset",), threads=4),
+        Stage("reg", fit_reg, deps=("dataset",), threads=4),
+        Stage("predict", predict, deps=("dataset", "reg", "simulate"), threads=1),
+    ]
+    results, timings = await pipeline.run(stages, Priority.FAST, endpoint="forecast")
+
+— граф прогноза fast из routers/forecast.py.
+
+Запрос проходит допуск бюджета CPU (services/cpu_budget.py) один раз: грант — сумма
+потоков стадий, не больше бюджета. Синхронные стадии (threads > 0) делят потоки
+гранта между собой, выполняются в потоке и получают взятое число аргументом
+``threads=``; стадия, которой не хватило потоков, ждёт соседей без таймаута.
+Стадия с threads=0 — корутина, она выполняется в цикле событий без потоков гранта.
+Результаты зависимостей приходят позиционно, в порядке deps. Время стадии — от
+получения потоков до результата; латентность запроса ≈ критический путь.
+"""
+import asyncio
+import time
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from typing import Any, Callable
+
+from services.cpu_budget import budget, Priority
+from utils import profiling
+
+
+@dataclass
+class Stage:
+    name: str
+    fn: Callable[..., Any]
+    deps: tuple[str, ...] = ()
+    threads: int = 0  # сколько потоков гранта занять; 0 — async-стадия в цикле событий
+
+
+class _Threads:
+    """Потоки гранта запроса, которые делят между собой его стадии."""
+
+    def __init__(self, n: int):
+        self.total = self.free = n
+        self._cond = asyncio.Condition()
+
+    @asynccontextmanager
+    async def take(self, want: int):
+        want = min(want, self.total)
+        async with self._cond:
+            await self._cond.wait_for(lambda: self.free >= want)
+            self.free -= want
+        try:
+            yield want
+        finally:
+            async with self._cond:
+                self.free += want
+                self._cond.notify_all()
+
+
+async def _in_thread(fn, *args, **kwargs):
+    """to_thread, который при отмене дожидается потока: грант не возвращается, пока поток считает."""
+    task = asyncio.ensure_future(asyncio.to_thread(profiling.in_thread, fn, *args, **kwargs))
+    try:
+        return await asyncio.shield(task)
+    except asyncio.CancelledError:
+        await asyncio.wait([task])
+        raise
+
+
+async def run(
+    stages: list[Stage], priority: Priority, endpoint: str = ""
+) -> tuple[dict[str, Any], dict[str, float]]:
+    """Выполнить стадии (перечислены в топологическом порядке); вернуть результаты и длительности, сек."""
+    seen: set[str] = set()
+    for st in stages:
+        if unknown := set(st.deps) - seen:
+            raise ValueError(f"stage {st.name}: unknown or later dependencies {sorted(unknown)}")
+        seen.add(st.name)
+
+    tasks: dict[str, asyncio.Task] = {}
+    timings: dict[str, float] = {}
+
+    async def run_stage(st: Stage, pool: _Threads):
+        args = [await tasks[d] for d in st.deps]
+        if not st.threads:
+            t0 = time.perf_counter()
+            out = await st.fn(*args)
+        else:
+            async with pool.take(st.threads) as threads:
+                t0 = time.perf_counter()
+                out = await _in_thread(st.fn, *args, threads=threads)
+        timings[st.name] = time.perf_counter() - t0
+        return out
+
+    async with budget.acquire(priority, sum(st.threads for st in stages), endpoint) as grant:
+        pool = _Threads(grant.threads)
+        try:
+            # ошибка любой стадии отменяет остальные
+            async with asyncio.TaskGroup() as tg:
+                for st in stages:
+                    tasks[st.name] = tg.create_task(run_stage(st, pool))
+        except ExceptionGroup as eg:
+            raise eg.exceptions[0] from None  # наружу — сама ошибка стадии, как при последовательном расчёте
+    return {name: t.result() for name, t in tasks.items()}, timings
+
+
+def server_timing(timings: dict[str, float]) -> str:
+    """Заголовок Server-Timing: «stage;dur=мс, …»."""
+    return ", ".join(f"{name};dur={sec * 1000:.1f}" for name, sec in timings.items())
@@ -0,0 +1,128 @@
+"""Прогрев кэшей после закрытия торгов.
+
+Бумаги из состава индексов (IndexComponent) и недавних прогнозов/отчётов
+(RecentSecurity) докачиваются в Price, вместе с ними — IMOEX, котировки и
+справочники (капитализация, free-float, дивдоходность); старые внутридневные
+бары сворачиваются в крупные тиры. Утренние запросы после этого читают только
+локальные данные.
+
+    python -m services.prefetch        # разовый прогон (из каталога app)
+"""
+import asyncio
+import logging
+import time
+from datetime import date, datetime, timedelta
+
+from sqlmodel import Session, select
+
+from config import settings
+from database import engine
+from models import IndexComponent, RecentSecurity
+from services import calendar, moex, intraday, valuation
+from services.benchmark import get_imoex_series
+from services.price_cache import get_series
+
+log = logging.getLogger(__name__)
+
+HISTORY_START = date(2000, 1, 1)
+
+
+def _save_requested(requested: dict[str, date]):
+    with Session(engine) as ss:
+        for s, d in requested.items():
+            ss.merge(RecentSecurity(secid=s, last_requested=d))
+        ss.commit()
+
+
+async def flush_requested():
+    """Перенести бумаги из недавних прогнозов/отчётов (valuation.REQUESTED) в RecentSecurity."""
+    if not valuation.REQUESTED:
+        return
+    requested = dict(valuation.REQUESTED)
+    valuation.REQUESTED.clear()
+    await asyncio.to_thread(_save_requested, requested)
+
+
+def active_secids() -> list[str]:
+    since = calendar.now().date() - timedelta(days=settings.PREFETCH_RECENT_DAYS)
+    with Session(engine) as ss:
+        components = ss.exec(select(IndexComponent.secid).distinct()).all()
+        recent = ss.exec(select(RecentSecurity.secid).where(RecentSecurity.last_requested >= since)).all()
+    return sorted(set(components) | set(recent))
+
+
+async def prefetch(secids: list[str] | None = None) -> dict:
+    """Обновить кэши для secids (по умолчанию — active_secids()); вернуть сводку покрытия."""
+    await flush_requested()
+    secids = await asyncio.to_thread(active_secids) if secids is None else secids
+    t0 = time.perf_counter()
+    today = calendar.now().date()
+    sem = asyncio.Semaphore(settings.PREFETCH_CONCURRENCY)
+
+    async def bounded(coro):
+        async with sem:
+            return await coro
+
+    ref_names = ("cap_table", "free_float", "div_yield", "imoex")
+    ref = await asyncio.gather(
+        moex.cap_table_q(today.year, (today.month - 1) // 3 + 1),
+        moex.free_float(),
+        moex.div_yield_df(),
+        get_imoex_series(HISTORY_START, today),
+        return_exceptions=True,
+    )
+    prices = await asyncio.gather(*[bounded(get_series(s)) for s in secids], return_exceptions=True)
+    quotes: dict[str, float] = {}
+    for i in range(0, len(secids), settings.PREFETCH_CONCURRENCY):
+        quotes.update(await moex.load_latest_prices(secids[i:i + settings.PREFETCH_CONCURRENCY]))
+
+    # синхронные SQLAlchemy и numpy по всем старым барам — вне цикла событий, чтобы не держать запросы
+    rolled = await asyncio.to_thread(intraday.roll_up)
+
+    failed = [s for s, r in zip(secids, prices) if isinstance(r, BaseException)]
+    summary = {
+        "secids": len(secids),
+        "prices_ok": len(secids) - len(failed),
+        "prices_failed": failed,
+        "quotes_ok": sum(1 for v in quotes.values() if v),
+        "reference_failed": [n for n, r in zip(ref_names, ref) if isinstance(r, BaseException)],
+        "intraday_rolled_up": rolled,
+        "seconds": round(time.perf_counter() - t0, 2),
+    }
+    log.info(
+        "prefetch: %d/%d price series, %d quotes, reference failed: %s, %.1fs",
+        summary["prices_ok"], summary["secids"], summary["quotes_ok"],
+        summary["reference_failed"] or "none", summary["seconds"],
+    )
+    if failed:
+        log.warning("prefetch: price refresh failed for %s", ", ".join(failed))
+    return summary
+
+
+def next_run(ts: datetime) -> datetime:
+    """Ближайший момент «закрытие основной сессии + PREFETCH_DELAY_MIN» после ts."""
+    delay = timedelta(minutes=settings.PREFETCH_DELAY_MIN)
+    d = ts.astimezone(calendar.MSK).date()
+    if not calendar.is_trading_day(d) or calendar.close_at(d) + delay <= ts:
+        d = calendar.next_trading_day(d)
+    return calendar.close_at(d) + delay
+
+
+async def run_scheduler():
+    """Фоновая задача воркера (см. lifespan в main.py): прогрев после каждой торговой сессии."""
+    while True:
+        at = next_run(calendar.now())
+        log.info("prefetch scheduled at %s", at.isoformat(timespec="minutes"))
+        await asyncio.sleep(max(0.0, (at - calendar.now()).total_seconds()))
+        try:
+            await prefetch()
+        except Exception:
+            log.exception("prefetch failed")
+
+
+if __name__ == "__main__":
+    from database import create_db_and_tables
+
+    logging.basicConfig(level=logging.INFO)
+    create_db_and_tables()
+    asyncio.run(prefetch())
@@ -1,13 +1,22 @@
-import aiohttp, pandas as pd
+import asyncio
+from collections import defaultdict
+
+import pandas as pd
 import aiomoex
 from datetime import date, timedelta
-from sqlmodel import Session, select
-from database import engine
+from sqlmodel import Session, select, func
+from database import engine, read_frame
+from services import upstream, calendar
+from utils.metrics import timed, cache_hit, ISS_FETCH_SECONDS
 from models import Price
 
+# одна докачка на бумагу: параллельные запросы ждут её, а не вставляют те же строки повторно
+_LOCKS: dict[str, asyncio.Lock] = defaultdict(asyncio.Lock)
+
 
+@timed(ISS_FETCH_SECONDS, loader="board_history")
 async def _fetch_iss(secid: str, start="2000-01-01", end: str = str(date.today())) -> pd.DataFrame:
-    async with aiohttp.ClientSession() as sess:
+    async with upstream.session() as sess:
         raw = await aiomoex.get_board_history(
             sess, security=secid, start=start, end=end, board="TQBR",
             columns=("TRADEDATE", "CLOSE")
@@ -20,45 +29,42 @@ async def _fetch_iss(secid: str, start="2000-01-01", end: str = str(date.today()
 
 
 async def get_series(secid: str) -> pd.DataFrame:
-    """Вернёт полный ряд CLOSE; докачает отсутствующие даты."""
-    with Session(engine) as ses:
-        rows = ses.exec(select(Price).where(Price.secid == secid)).all()
-    if rows:
-        have_min = min(r.trade_date for r in rows)
-        have_max = max(r.trade_date for r in rows)
-    else:
-        have_min = date.today()
-        have_max = date(1900,1,1)
-
-    need_start = "2000-01-01"
-    need_end = str(date.today())
+    """Вернёт полный ряд CLOSE (date: datetime64); докачает даты после последней закрытой сессии.
 
-    if have_min > date.fromisoformat(need_start):
-        df_left = await _fetch_iss(secid, need_start, str(have_min - timedelta(days=1)))
-    else:
-        df_left = pd.DataFrame()
+    Первая загрузка берёт всю историю с 2000 года, так что раньше первой
+    сохранённой даты данных нет; новые даты ищутся, только если по календарю
+    с тех пор закрылась хотя бы одна сессия (не в выходные, праздники и до закрытия).
+    """
+    async with _LOCKS[secid]:
+        with Session(engine) as ses:
+            have_max = ses.exec(select(func.max(Price.trade_date)).where(Price.secid == secid)).first()
+        need_start = "2000-01-01"
+        last = calendar.last_session()
 
-    if have_max < date.today():
-        df_right = await _fetch_iss(secid, str(have_max + timedelta(days=1)), need_end)
-    else:
-        df_right = pd.DataFrame()
+        ranges = []
+        if have_max is None:
+            ranges.append((need_start, str(last)))
+        elif have_max < last:
+            ranges.append((str(have_max + timedelta(days=1)), str(last)))
 
-    for df in (df_left, df_right):
-        if not df.empty:
-            with Session(engine) as ses:
-                ses.add_all([
-                    Price(secid=secid, date=r.date, close=float(r.close))
-                    for r in df.itertuples()
-                    if r.close is not None
-                ])
-                ses.commit()
-        if df_left.equals(df_right):
-            break
+        cache_hit("price", not ranges)
+        for start, end in ranges:
+            try:
+                df = await _fetch_iss(secid, start, end)
+            except upstream.UpstreamUnavailable:
+                if have_max is None:
+                    raise
+                upstream.mark_stale("price")
+                break
+            if not df.empty:
+                with Session(engine) as ses:
+                    ses.add_all([
+                        Price(secid=secid, date=r.date, close=float(r.close))
+                        for r in df.itertuples()
+                        if r.close is not None
+                    ])
+                    ses.commit()
 
-    with Session(engine) as ses:
-        full = ses.exec(select(Price).where(Price.secid == secid)).all()
-    return (
-        pd.DataFrame([{"date": r.trade_date, "close": r.close} for r in full])
-        .sort_values("date")
-        .reset_index(drop=True)
+    return read_frame(
+        select(Price.trade_date.label("date"), Price.close).where(Price.secid == secid).order_by(Price.trade_date)
     )
@@ -0,0 +1,177 @@
+"""Кэш готовых ответов аналитических эндпоинтов с ETag/304.
+
+Ответы /forecast, /report, /index/{id}/series и /stats зависят только от параметров
+запроса и от того, по какую дату есть цены. Ключ кэша — нормализованные параметры,
+версия данных (дата последней цены входов) и формат ответа из Accept; значение —
+тело ответа целиком. Кэш ограничен RESULT_CACHE_MB и вытесняет давно не читанное.
+
+ETag сильный — хэш тела. Клиент с совпавшим If-None-Match получает 304 без тела,
+а если запись в кэше есть — и без пересчёта. Ответы, собранные из устаревших данных
+(X-Data-Stale), и ответы с ошибкой не кэшируются.
+
+Потоковые ответы (NDJSON) и при промахе уходят клиенту по частям: части копируются
+по ходу отдачи, и запись с ETag появляется в кэше, когда поток дочитан до конца
+(у самого первого ответа ETag нет). Из кэша такой ответ тоже отдаётся потоком.
+
+    return await result_cache.respond(request, "stats", {"id": index_id}, version, compute)
+"""
+import hashlib
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from datetime import date, datetime
+from typing import Awaitable, Callable
+
+import orjson
+from fastapi import Request
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import ORJSONResponse, Response, StreamingResponse
+
+from config import settings
+from services import calendar, intraday, upstream
+from utils.encoding import preferred
+from utils.metrics import cache_hit
+
+# заголовки, которые пересчитываются при отдаче из кэша; Server-Timing есть только у самого расчёта
+_SKIP_HEADERS = {"content-length", "content-type", "etag", "cache-control", "vary", "x-data-stale", "server-timing"}
+_CHUNK = 64 * 1024
+
+
+@dataclass
+class _Entry:
+    body: bytes
+    media_type: str | None
+    etag: str
+    headers: dict[str, str] = field(default_factory=dict)
+    streamed: bool = False  # отдавать из кэша потоком, частями по _CHUNK
+
+
+class ResultCache:
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self._entries: OrderedDict[str, _Entry] = OrderedDict()
+
+    def get(self, key: str) -> _Entry | None:
+        entry = self._entries.get(key)
+        if entry is not None:
+            self._entries.move_to_end(key)
+        return entry
+
+    def put(self, key: str, entry: _Entry):
+        if len(entry.body) > self.max_bytes // 8:
+            return  # один огромный ответ не вытесняет весь кэш
+        old = self._entries.pop(key, None)
+        if old is not None:
+            self.size -= len(old.body)
+        self._entries[key] = entry
+        self.size += len(entry.body)
+        while self.size > self.max_bytes:
+            _, evicted = self._entries.popitem(last=False)
+            self.size -= len(evicted.body)
+
+    def clear(self):
+        self._entries.clear()
+        self.size = 0
+
+
+cache = ResultCache(int(settings.RESULT_CACHE_MB * 2**20))
+
+
+def data_version(d_till: date, interval: int = intraday.DAILY) -> str:
+    """Версия данных ряда по d_till: последняя закрытая сессия, в торги — ещё и номер окна QUOTE_TTL."""
+    version = str(min(d_till, calendar.last_session()))
+    now = calendar.now()
+    if d_till >= now.date() and calendar.in_session(now):
+        # текущий день ещё наполняется: дневная свеча и внутридневные бары меняются
+        version += f"/{int(now.timestamp() // settings.QUOTE_TTL)}"
+    return version
+
+
+def make_key(endpoint: str, payload: dict, version: str, media: str) -> str:
+    raw = orjson.dumps(
+        {"endpoint": endpoint, "payload": payload, "version": version, "media": media},
+        option=orjson.OPT_SORT_KEYS | orjson.OPT_NON_STR_KEYS,
+        default=str,
+    )
+    return hashlib.sha256(raw).hexdigest()
+
+
+def _matches(request: Request, etag: str) -> bool:
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    # для If-None-Match сравнение слабое: W/"x" совпадает с "x"
+    tags = {t.strip().removeprefix("W/") for t in header.split(",")}
+    return "*" in tags or etag in tags
+
+
+def _etag(body: bytes) -> str:
+    return f'"{hashlib.sha256(body).hexdigest()[:32]}"'
+
+
+def _kept_headers(resp: Response) -> dict[str, str]:
+    return {k: v for k, v in resp.headers.items() if k.lower() not in _SKIP_HEADERS}
+
+
+def _reply(request: Request, entry: _Entry) -> Response:
+    headers = {"ETag": entry.etag, "Cache-Control": "no-cache", "Vary": "Accept"}
+    if _matches(request, entry.etag):
+        return Response(status_code=304, headers=headers)
+    if entry.streamed:
+        body = entry.body
+        chunks = (body[i:i + _CHUNK] for i in range(0, len(body), _CHUNK))
+        return StreamingResponse(chunks, media_type=entry.media_type, headers={**entry.headers, **headers})
+    return Response(entry.body, media_type=entry.media_type, headers={**entry.headers, **headers})
+
+
+def _stream_through(key: str, resp: StreamingResponse, cacheable: bool) -> StreamingResponse:
+    """Отдать поток как есть, копируя части; дочитанный до конца поток положить в кэш."""
+    parts: list[bytes] = []
+    headers = _kept_headers(resp)
+
+    async def body():
+        async for chunk in resp.body_iterator:
+            chunk = chunk if isinstance(chunk, bytes) else chunk.encode()
+            parts.append(chunk)
+            yield chunk
+        if cacheable:
+            data = b"".join(parts)
+            cache.put(key, _Entry(data, resp.media_type, _etag(data), headers, streamed=True))
+
+    reply_headers = {**headers, "Cache-Control": "no-cache" if cacheable else "no-store", "Vary": "Accept"}
+    if "server-timing" in resp.headers:
+        reply_headers["Server-Timing"] = resp.headers["server-timing"]
+    return StreamingResponse(body(), media_type=resp.media_type, headers=reply_headers)
+
+
+async def respond(
+    request: Request,
+    endpoint: str,
+    payload: dict,
+    version: str | date | datetime,
+    compute: Callable[[], Awaitable],
+) -> Response:
+    """Ответ из кэша или compute(); compute возвращает Response или JSON-совместимый объект."""
+    key = make_key(endpoint, payload, str(version), preferred(request))
+    entry = cache.get(key)
+    cache_hit("result", entry is not None)
+    if entry is not None:
+        return _reply(request, entry)
+
+    resp = await compute()
+    if not isinstance(resp, Response):
+        resp = ORJSONResponse(jsonable_encoder(resp))
+    if resp.status_code != 200:
+        return resp
+    if isinstance(resp, StreamingResponse):
+        # тело ещё не собрано — первый байт уходит клиенту сразу, без буферизации всего ряда
+        return _stream_through(key, resp, cacheable=not upstream.is_stale())
+    entry = _Entry(body=resp.body, media_type=resp.media_type, etag=_etag(resp.body), headers=_kept_headers(resp))
+    if not upstream.is_stale():
+        cache.put(key, entry)
+    reply = _reply(request, entry)
+    if "server-timing" in resp.headers:
+        reply.headers["Server-Timing"] = resp.headers["server-timing"]
+    if upstream.is_stale():
+        reply.headers["Cache-Control"] = "no-store"
+    return reply
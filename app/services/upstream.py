@@ -0,0 +1,255 @@
+"""Обращения к MOEX: единая точка с дедлайнами, ретраями, хеджированием и circuit breaker.
+
+Каждый GET выполняется так:
+
+* попытка ограничена UPSTREAM_TIMEOUT, весь вызов с ретраями — UPSTREAM_DEADLINE;
+* 5xx/429, обрывы и таймауты повторяются до UPSTREAM_RETRIES раз с экспоненциальной
+  задержкой и полным джиттером;
+* если ответ не пришёл за UPSTREAM_HEDGE_PCTL-перцентиль недавних задержек хоста,
+  отправляется дубль запроса, побеждает первый ответ;
+* после UPSTREAM_BREAKER_FAILURES неудач подряд хост «размыкается» на
+  UPSTREAM_BREAKER_COOLDOWN секунд — вызовы сразу получают UpstreamUnavailable.
+
+Загрузчики ловят UpstreamUnavailable, отдают последние данные из кэша и вызывают
+mark_stale(); StaleDataMiddleware выставляет ответу заголовок ``X-Data-Stale``.
+"""
+import asyncio
+import random
+import time
+from collections import deque
+from contextvars import ContextVar
+
+import aiohttp
+from yarl import URL
+from config import settings
+from utils.metrics import UPSTREAM_EVENTS, CACHE_REQUESTS
+
+
+# Хосты MOEX, к которым ходят загрузчики (ISS, сайт, выгрузки XLSX)
+UPSTREAM_HOSTS = ("iss.moex.com", "www.moex.com", "web.moex.com")
+
+HEDGE_MIN_SAMPLES = 20   # до стольких замеров по хосту дубли не отправляются
+HEDGE_MIN_DELAY = 0.05
+
+
+class UpstreamUnavailable(aiohttp.ClientError):
+    """MOEX не ответил в отведённое время (или хост разомкнут circuit breaker'ом)."""
+
+    def __init__(self, host: str, reason: str = ""):
+        super().__init__(f"upstream {host} unavailable{': ' + reason if reason else ''}")
+        self.host = host
+
+
+class _HostHealth:
+    """Скользящее окно задержек и состояние circuit breaker для одного хоста."""
+
+    def __init__(self):
+        self.latencies: deque[float] = deque(maxlen=200)
+        self.failures = 0
+        self.opened_at: float | None = None
+
+    def hedge_delay(self) -> float | None:
+        if not settings.UPSTREAM_HEDGE_PCTL or len(self.latencies) < HEDGE_MIN_SAMPLES:
+            return None
+        xs = sorted(self.latencies)
+        q = xs[min(len(xs) - 1, int(settings.UPSTREAM_HEDGE_PCTL * len(xs)))]
+        return max(q, HEDGE_MIN_DELAY)
+
+    def allow(self) -> bool:
+        # по истечении паузы пропускаем пробные запросы (half-open); неудача снова размыкает
+        return self.opened_at is None or time.monotonic() - self.opened_at >= settings.UPSTREAM_BREAKER_COOLDOWN
+
+    @property
+    def is_open(self) -> bool:
+        return not self.allow()
+
+    def success(self):
+        self.failures, self.opened_at = 0, None
+
+    def failure(self):
+        self.failures += 1
+        if self.failures >= settings.UPSTREAM_BREAKER_FAILURES:
+            self.opened_at = time.monotonic()
+
+
+_HEALTH: dict[str, _HostHealth] = {}
+
+
+def _health(host: str) -> _HostHealth:
+    return _HEALTH.setdefault(host, _HostHealth())
+
+
+def retry_after(host: str | None = None) -> int:
+    """Сколько секунд до пробного запроса к хосту (для Retry-After)."""
+    h = _HEALTH.get(host) if host else None
+    if h is None or h.opened_at is None:
+        return int(settings.UPSTREAM_BREAKER_COOLDOWN)
+    return max(1, int(settings.UPSTREAM_BREAKER_COOLDOWN - (time.monotonic() - h.opened_at)) + 1)
+
+
+# --- флаг устаревших данных в рамках запроса ---
+
+_stale: ContextVar[set | None] = ContextVar("upstream_stale", default=None)
+
+
+def mark_stale(source: str):
+    """Ответ собран из кэша вместо свежих данных MOEX (источник попадёт в X-Data-Stale)."""
+    CACHE_REQUESTS.inc(cache=source, result="stale")
+    sources = _stale.get()
+    if sources is not None:
+        sources.add(source)
+
+
+def is_stale() -> bool:
+    """В текущем запросе уже были откаты на кэш."""
+    return bool(_stale.get())
+
+
+class StaleDataMiddleware:
+    """ASGI-middleware: заводит множество устаревших источников на запрос и отдаёт его в заголовке."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        sources: set[str] = set()
+        token = _stale.set(sources)
+
+        async def send_with_flag(message):
+            if message["type"] == "http.response.start" and sources:
+                message["headers"] = list(message.get("headers", [])) + [
+                    (b"x-data-stale", ",".join(sorted(sources)).encode())
+                ]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_flag)
+        finally:
+            _stale.reset(token)
+
+
+# --- HTTP ---
+
+class _RebasedRequest(aiohttp.ClientRequest):
+    """https://iss.moex.com/iss/... → {UPSTREAM_URL}/iss.moex.com/iss/... (локальный стенд)."""
+
+    def __init__(self, method: str, url: URL, *args, **kwargs):
+        if url.host in UPSTREAM_HOSTS:
+            base = URL(settings.UPSTREAM_URL)
+            url = URL.build(
+                scheme=base.scheme,
+                host=base.host,
+                port=base.port,
+                path=f"{base.path.rstrip('/')}/{url.host}{url.path}",
+                query=url.query,
+            )
+        super().__init__(method, url, *args, **kwargs)
+
+
+class _Call:
+    """``async with session.get(...) as r`` — ответ уже прочитан целиком, тело доступно через r.read/json/text."""
+
+    def __init__(self, coro):
+        self._coro = coro
+        self._resp: aiohttp.ClientResponse | None = None
+
+    async def __aenter__(self) -> aiohttp.ClientResponse:
+        self._resp = await self._coro
+        return self._resp
+
+    async def __aexit__(self, *exc):
+        self._resp.release()
+        return False
+
+
+class ResilientSession:
+    """Обёртка над aiohttp.ClientSession с тем же интерфейсом ``get`` (его использует aiomoex)."""
+
+    def __init__(self, session: aiohttp.ClientSession):
+        self._session = session
+
+    async def __aenter__(self):
+        await self._session.__aenter__()
+        return self
+
+    async def __aexit__(self, *exc):
+        return await self._session.__aexit__(*exc)
+
+    def __getattr__(self, name):
+        return getattr(self._session, name)
+
+    def get(self, url, **kwargs) -> _Call:
+        return _Call(self._fetch(str(url), kwargs))
+
+    async def _once(self, url: str, kwargs: dict, health: _HostHealth) -> aiohttp.ClientResponse:
+        t0 = time.perf_counter()
+        # без «async with»: явный release() запретил бы повторный r.read() у вызывающего
+        r = await self._session.get(url, **kwargs)
+        try:
+            await r.read()
+        except BaseException:
+            r.close()
+            raise
+        if r.status >= 500 or r.status == 429:
+            r.raise_for_status()
+        health.latencies.append(time.perf_counter() - t0)
+        return r
+
+    async def _hedged(self, url: str, kwargs: dict, host: str, health: _HostHealth) -> aiohttp.ClientResponse:
+        delay = health.hedge_delay()
+        pending = {asyncio.ensure_future(self._once(url, kwargs, health))}
+        error: BaseException | None = None
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, timeout=delay, return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    # первый запрос дольше перцентиля — шлём дубль, ждём любой из двух
+                    UPSTREAM_EVENTS.inc(host=host, event="hedge")
+                    pending.add(asyncio.ensure_future(self._once(url, kwargs, health)))
+                    delay = None
+                    continue
+                for t in done:
+                    if t.exception() is None:
+                        return t.result()
+                    error = t.exception()
+            raise error
+        finally:
+            for t in pending:
+                t.cancel()
+
+    async def _fetch(self, url: str, kwargs: dict) -> aiohttp.ClientResponse:
+        host = URL(url).host or ""
+        health = _health(host)
+        if not health.allow():
+            UPSTREAM_EVENTS.inc(host=host, event="short_circuit")
+            raise UpstreamUnavailable(host, "circuit open")
+
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + settings.UPSTREAM_DEADLINE
+        error: BaseException | None = None
+        for attempt in range(settings.UPSTREAM_RETRIES + 1):
+            budget = min(settings.UPSTREAM_TIMEOUT, deadline - loop.time())
+            try:
+                r = await asyncio.wait_for(self._hedged(url, kwargs, host, health), budget)
+            except (aiohttp.ClientResponseError, aiohttp.ClientConnectionError, asyncio.TimeoutError) as e:
+                error = e
+                health.failure()
+                UPSTREAM_EVENTS.inc(host=host, event="timeout" if isinstance(e, asyncio.TimeoutError) else "error")
+            else:
+                health.success()
+                return r
+            backoff = random.uniform(0, settings.UPSTREAM_BACKOFF * 2 ** attempt)
+            if attempt == settings.UPSTREAM_RETRIES or health.is_open or loop.time() + backoff >= deadline:
+                break
+            UPSTREAM_EVENTS.inc(host=host, event="retry")
+            await asyncio.sleep(backoff)
+        raise UpstreamUnavailable(host, repr(error)) from error
+
+
+def session(**kwargs) -> ResilientSession:
+    """HTTP-сессия для обращений к MOEX; все загрузчики открывают сессии только через неё."""
+    if settings.UPSTREAM_URL:
+        kwargs.setdefault("request_class", _RebasedRequest)
+    return ResilientSession(aiohttp.ClientSession(**kwargs))
@@ -0,0 +1,133 @@
+"""Стоимость портфеля и бенчмарк на общих датах — для /forecast и /report.
+
+Цены бумаг портфеля сводятся в матрицу (дни × бумаги) на объединении их торговых
+дней: пропуск заполняется последней ценой, дни до начала торгов самой молодой
+бумаги отбрасываются. Даты — numpy datetime64[D], в pandas — DatetimeIndex "date";
+IMOEX приводится к тем же дням.
+
+Матрица зависит только от набора бумаг и последней закрытой сессии, поэтому
+кэшируется по (набор бумаг, сессия) на VALUATION_CACHE наборов; количество акций
+применяется поверх неё. Одновременные запросы одного набора ждут одну загрузку.
+
+    v = await valuation.valuate([(a.secid, a.shares) for a in req.assets])
+    v.value, v.benchmark, v.last_date
+"""
+import asyncio
+import dataclasses
+import functools
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import date
+from typing import Iterable
+
+import numpy as np
+import pandas as pd
+
+from config import settings
+from services import calendar, upstream
+from services.benchmark import get_imoex_series
+from services.price_cache import get_series
+from utils.metrics import cache_hit
+from utils.singleflight import SingleFlight
+
+
+@dataclass(frozen=True)
+class Valuation:
+    secids: tuple[str, ...]  # по алфавиту
+    dates: np.ndarray        # datetime64[D]
+    prices: np.ndarray       # (дни × бумаги)
+    imoex: np.ndarray        # (дни,), NaN до начала истории индекса
+    shares: np.ndarray       # (бумаги,)
+
+    @functools.cached_property
+    def index(self) -> pd.DatetimeIndex:
+        return pd.DatetimeIndex(self.dates, name="date")
+
+    @functools.cached_property
+    def value(self) -> pd.Series:
+        """Стоимость портфеля по дням."""
+        return pd.Series(self.prices @ self.shares, index=self.index)
+
+    @functools.cached_property
+    def benchmark(self) -> pd.Series:
+        """IMOEX на днях портфеля, с первой известной цены индекса."""
+        return pd.Series(self.imoex, index=self.index, name="IMOEX").dropna()
+
+    @property
+    def last_date(self) -> date:
+        return self.dates[-1].astype(date)
+
+
+_CACHE: OrderedDict[tuple, Valuation] = OrderedDict()
+_FLIGHT = SingleFlight()
+# secid → дата последнего запроса; в RecentSecurity переносит prefetch.flush_requested
+REQUESTED: dict[str, date] = {}
+
+
+def _ffill(a: np.ndarray) -> np.ndarray:
+    """Протянуть последнее не-NaN значение вниз по каждому столбцу."""
+    rows = np.where(np.isnan(a), 0, np.arange(len(a))[:, None])
+    np.maximum.accumulate(rows, axis=0, out=rows)
+    return a[rows, np.arange(a.shape[1])]
+
+
+def align(series: dict[str, pd.DataFrame]) -> tuple[np.ndarray, np.ndarray]:
+    """{secid: DataFrame(date, close)} → (даты datetime64[D], цены дни × бумаги) в порядке ключей."""
+    cols = [
+        (np.asarray(df["date"], dtype="datetime64[D]"), df["close"].to_numpy(dtype=float))
+        for df in series.values()
+    ]
+    dates = np.unique(np.concatenate([d for d, _ in cols]))
+    prices = np.full((len(dates), len(cols)), np.nan)
+    for j, (d, close) in enumerate(cols):
+        prices[np.searchsorted(dates, d), j] = close
+    prices = _ffill(prices)
+    keep = ~np.isnan(prices).any(axis=1)
+    return dates[keep], prices[keep]
+
+
+async def _load(secids: tuple[str, ...]) -> Valuation:
+    dfs = await asyncio.gather(*[get_series(s) for s in secids])
+    if empty := [s for s, df in zip(secids, dfs) if df.empty]:
+        raise ValueError(f"No price history for {', '.join(empty)}")
+    dates, prices = align(dict(zip(secids, dfs)))
+    if not len(dates):
+        raise ValueError("Assets have no common price history")
+
+    imoex = np.full(len(dates), np.nan)
+    bm = await get_imoex_series(dates[0].astype(date), dates[-1].astype(date))
+    if not bm.empty:
+        bm_dates = np.asarray(bm["date"], dtype="datetime64[D]")
+        pos = np.searchsorted(bm_dates, dates, side="right") - 1
+        imoex = np.where(pos >= 0, bm["close"].to_numpy(dtype=float)[pos], np.nan)
+    return Valuation(secids, dates, prices, imoex, np.ones(len(secids)))
+
+
+async def _load_cached(key: tuple) -> Valuation:
+    base = await _load(key[0])
+    # собранное на устаревших данных не запоминается: следующий запрос попробует MOEX снова
+    if not upstream.is_stale():
+        _CACHE[key] = base
+        while len(_CACHE) > settings.VALUATION_CACHE:
+            _CACHE.popitem(last=False)
+    return base
+
+
+async def valuate(assets: Iterable[tuple[str, float]]) -> Valuation:
+    """Стоимость портфеля из пар (secid, shares) и IMOEX на тех же датах; ValueError, если общей истории нет."""
+    held: dict[str, float] = {}
+    for secid, shares in assets:
+        held[secid] = held.get(secid, 0) + shares
+    today = calendar.now().date()
+    REQUESTED.update(dict.fromkeys(held, today))
+    secids = tuple(sorted(held))
+    key = (secids, calendar.last_session())
+
+    base = _CACHE.get(key)
+    cache_hit("valuation", base is not None)
+    if base is not None:
+        _CACHE.move_to_end(key)
+    else:
+        base = await _FLIGHT.do(key, lambda: _load_cached(key))
+
+    return dataclasses.replace(base, shares=np.array([held[s] for s in secids], dtype=float))
@@ -1,7 +1,8 @@
 import pandas as pd, numpy as np
 from catboost import CatBoostClassifier, CatBoostRegressor, Pool
 from utils.dataset import make_next_row
-from utils.garch import forecast_prices
+from utils.garch import forecast_prices, simulate_returns, fan
+from utils.metrics import timed, STAGE_SECONDS
 
 
 default_params_reg = {
@@ -32,7 +33,8 @@ default_params_clf = {
 }
 
 
-def fit_catboost(df: pd.DataFrame, params: dict | None = None):
+@timed(STAGE_SECONDS, stage="catboost_fit")
+def fit_catboost(df: pd.DataFrame, params: dict | None = None, thread_count: int = -1):
     if params is None:
         params = default_params_reg
 
@@ -40,34 +42,44 @@ def fit_catboost(df: pd.DataFrame, params: dict | None = None):
     target = "resid_next"
 
     ds = Pool(df[features], df[target])
-    model = CatBoostRegressor(**params)
+    model = CatBoostRegressor(**{**params, "thread_count": thread_count})
     model.fit(ds)
     return model, features
 
 
+@timed(STAGE_SECONDS, stage="catboost_predict")
 def forecast_catboost(
     df: pd.DataFrame,
     garch_fit,
     cb_model: CatBoostRegressor,
     cb_features: list[str],
-    horizon: int = 60
+    horizon: int = 60,
+    thread_count: int = -1,
+    paths: np.ndarray | None = None,
 ):
+    """Прогноз GARCH + поправка CatBoost.
+
+    95%-полоса — разброс симулированных траекторий *paths* (simulate_returns) вокруг точечного прогноза.
+    """
     last_price = df.iloc[-1]["stat_pred"]
     preds, lo, hi = [], [], []
 
-    garch_prices, vol = forecast_prices(last_price, garch_fit, horizon)
+    garch_prices, _ = forecast_prices(last_price, garch_fit, horizon)
+    if paths is None:
+        paths = simulate_returns(garch_fit, horizon)
+    q_lo, q_mid, q_hi = fan(paths, df.iloc[-1]["close"], (0.025, 0.5, 0.975))
 
     for k in range(horizon):
         last_price = df.iloc[-1]["close"]
         feats = df.iloc[-1][cb_features]
 
         stat_pred = garch_prices[k]
-        resid_hat = cb_model.predict(feats)
+        resid_hat = cb_model.predict(feats, thread_count=thread_count)
         price_next = stat_pred + resid_hat
 
         preds.append(price_next)
-        lo.append(price_next - 1.96 * vol[k] * last_price)
-        hi.append(price_next + 1.96 * vol[k] * last_price)
+        lo.append(price_next + q_lo[k] - q_mid[k])
+        hi.append(price_next + q_hi[k] - q_mid[k])
 
         df = pd.concat([df, make_next_row(df)])
         df.at[df.index[-1], "close"] = price_next
@@ -77,7 +89,8 @@ def forecast_catboost(
     return np.array(preds), np.array(lo), np.array(hi)
 
 
-def fit_predict_catboost_clf(df: pd.DataFrame, params: dict | None = None):
+@timed(STAGE_SECONDS, stage="catboost_clf")
+def fit_predict_catboost_clf(df: pd.DataFrame, params: dict | None = None, thread_count: int = -1):
     if params is None:
         params = default_params_clf
 
@@ -93,7 +106,7 @@ def fit_predict_catboost_clf(df: pd.DataFrame, params: dict | None = None):
 
     X, y = df[features], df[target]
     ds = Pool(X, y)
-    model = CatBoostClassifier(**params)
+    model = CatBoostClassifier(**{**params, "thread_count": thread_count})
     model.fit(ds)
 
     pred = model.predict(last_row[features])
@@ -3,8 +3,10 @@ from ta.momentum import RSIIndicator
 from ta.trend import MACD
 from ta.volatility import BollingerBands
 from utils.garch import fit_garch, get_garch_prices_train
+from utils.metrics import timed, STAGE_SECONDS
 
 
+@timed(STAGE_SECONDS, stage="features")
 def make_dataset(prices: pd.Series, imoex: pd.Series | None = None):
     df = prices.to_frame("close")
     if imoex is not None:
@@ -0,0 +1,57 @@
+import numpy as np
+
+
+def lttb(y: np.ndarray, n_out: int, x: np.ndarray | None = None) -> np.ndarray:
+    """Largest-Triangle-Three-Buckets: индексы *n_out* точек, сохраняющих форму ряда."""
+    n = len(y)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+    x = np.arange(n, dtype=float) if x is None else np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+
+    edges = np.linspace(1, n - 1, n_out - 1).astype(int)
+    out = np.empty(n_out, dtype=int)
+    out[0], out[-1] = 0, n - 1
+    a = 0
+    for i in range(n_out - 2):
+        lo, hi = edges[i], edges[i + 1]
+        nxt_lo, nxt_hi = edges[i + 1], edges[i + 2] if i + 2 < len(edges) else n
+        cx, cy = x[nxt_lo:nxt_hi].mean(), y[nxt_lo:nxt_hi].mean()
+        area = np.abs(
+            (x[a] - cx) * (y[lo:hi] - y[a]) - (x[a] - x[lo:hi]) * (cy - y[a])
+        )
+        a = lo + int(area.argmax())
+        out[i + 1] = a
+    return out
+
+
+def minmax(y: np.ndarray, n_out: int) -> np.ndarray:
+    """Минимум и максимум в каждом из (n_out − 2)/2 бакетов — сохраняет экстремумы (просадки, пики).
+
+    Первая и последняя точки остаются всегда, как в lttb: ряд покрывает тот же период.
+    """
+    n = len(y)
+    if n_out >= n:
+        return np.arange(n)
+    if n_out < 4:
+        return np.array([0, n - 1])  # на бакет с минимумом и максимумом бюджета нет
+    y = np.asarray(y, dtype=float)
+    n_buckets = (n_out - 2) // 2
+    edges = np.linspace(0, n, n_buckets + 1).astype(int)
+    starts = edges[:-1]
+    # argmin/argmax по бакетам разной длины: reduceat по значениям + поиск позиции
+    mins = np.minimum.reduceat(y, starts)
+    maxs = np.maximum.reduceat(y, starts)
+    bucket = np.repeat(np.arange(n_buckets), np.diff(edges))
+    is_min = y == mins[bucket]
+    is_max = y == maxs[bucket]
+    first_min = np.unique(bucket[is_min], return_index=True)[1]
+    first_max = np.unique(bucket[is_max], return_index=True)[1]
+    idx = np.concatenate([[0, n - 1], np.flatnonzero(is_min)[first_min], np.flatnonzero(is_max)[first_max]])
+    return np.unique(idx)
+
+
+def downsample(y: np.ndarray, n_out: int, method: str = "lttb") -> np.ndarray:
+    if method == "minmax":
+        return minmax(y, n_out)
+    return lttb(y, n_out)
@@ -0,0 +1,98 @@
+import io
+import orjson
+import pandas as pd
+from fastapi import Request
+from fastapi.responses import ORJSONResponse, Response, StreamingResponse
+
+JSON = "application/json"
+NDJSON = "application/x-ndjson"
+ARROW = "application/vnd.apache.arrow.stream"
+PARQUET = "application/vnd.apache.parquet"
+
+OFFERED = (JSON, ARROW, PARQUET, NDJSON)
+
+
+def preferred(request: Request, offered: tuple[str, ...] = OFFERED) -> str:
+    """Лучший из *offered* по заголовку Accept (с учётом q); по умолчанию — JSON."""
+    best, best_q = offered[0], 0.0
+    for part in request.headers.get("accept", "").split(","):
+        media, *params = [p.strip() for p in part.split(";")]
+        q = 1.0
+        for p in params:
+            if p.startswith("q="):
+                try:
+                    q = float(p[2:])
+                except ValueError:
+                    q = 0.0
+        if media in offered and q > best_q:
+            best, best_q = media, q
+    return best
+
+
+def _plain(df: pd.DataFrame) -> pd.DataFrame:
+    """datetime64-колонки без времени → date, чтобы JSON совпадал с Pydantic-схемами ("YYYY-MM-DD").
+
+    Внутридневные метки — ISO-строки "YYYY-MM-DDTHH:MM:SS".
+    """
+    cols = {}
+    for c in df.columns:
+        if pd.api.types.is_datetime64_any_dtype(df[c]):
+            intraday = (df[c] != df[c].dt.normalize()).any()
+            cols[c] = df[c].dt.strftime("%Y-%m-%dT%H:%M:%S") if intraday else df[c].dt.date
+    return df.assign(**cols) if cols else df
+
+
+def _ndjson(df: pd.DataFrame, chunk: int = 2000):
+    df = _plain(df)
+    for start in range(0, len(df), chunk):
+        records = df.iloc[start:start + chunk].to_dict(orient="records")
+        yield b"".join(orjson.dumps(r, option=orjson.OPT_SERIALIZE_NUMPY) + b"\n" for r in records)
+
+
+def to_arrow(df: pd.DataFrame, meta: dict | None = None) -> bytes:
+    import pyarrow as pa
+
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    if meta:
+        table = table.replace_schema_metadata({**(table.schema.metadata or {}), b"meta": orjson.dumps(meta)})
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue().to_pybytes()
+
+
+def to_parquet(df: pd.DataFrame, meta: dict | None = None) -> bytes:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    if meta:
+        table = table.replace_schema_metadata({**(table.schema.metadata or {}), b"meta": orjson.dumps(meta)})
+    buf = io.BytesIO()
+    pq.write_table(table, buf)
+    return buf.getvalue()
+
+
+def negotiate(
+    request: Request,
+    df: pd.DataFrame,
+    json_body=None,
+    meta: dict | None = None,
+    headers: dict | None = None,
+) -> Response:
+    """Отдать табличный результат в формате из Accept.
+
+    *df* — колоночное представление для Arrow IPC / Parquet / NDJSON,
+    *json_body* — тело JSON-ответа (по умолчанию записи *df*); *meta* кладётся
+    в метаданные схемы Arrow/Parquet под ключом ``meta``.
+    """
+    media = preferred(request)
+    if media == ARROW:
+        return Response(to_arrow(df, meta), media_type=ARROW, headers=headers)
+    if media == PARQUET:
+        return Response(to_parquet(df, meta), media_type=PARQUET, headers=headers)
+    if media == NDJSON:
+        return StreamingResponse(_ndjson(df), media_type=NDJSON, headers=headers)
+    if json_body is None:
+        json_body = _plain(df).to_dict(orient="records")
+    return ORJSONResponse(json_body, headers=headers)
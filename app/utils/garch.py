@@ -1,7 +1,9 @@
 import pandas as pd, numpy as np
 from arch import arch_model
+from utils.metrics import timed, STAGE_SECONDS
 
 
+@timed(STAGE_SECONDS, stage="garch_fit")
 def fit_garch(train: pd.Series):
     model = arch_model(train * 100, p=1, q=1, mean="AR", lags=1, dist="t")
     model = model.fit(disp="off")
@@ -15,9 +17,57 @@ def get_garch_prices_train(train: pd.Series, last_price: float, garch_fitted: ar
     return prices
 
 
+@timed(STAGE_SECONDS, stage="garch_predict")
 def forecast_prices(last_price: float, garch_fitted: arch_model, horizon: int):
     fc = garch_fitted.forecast(horizon=horizon)
     mu = fc.mean.iloc[-1].values / 100
     prices = last_price * (1 + mu).cumprod()
     vol = np.sqrt(fc.variance.iloc[-1].values) / 100
     return prices, vol
+
+
+FAN_QUANTILES = (0.05, 0.25, 0.5, 0.75, 0.95)
+
+
+@timed(STAGE_SECONDS, stage="garch_simulate")
+def simulate_returns(garch_fitted, horizon: int, n_paths: int = 50_000, seed: int | None = 0) -> np.ndarray:
+    """Дневные доходности (доли) n_paths траекторий AR(1)-GARCH(1,1)-t на horizon дней, shape (n_paths, horizon).
+
+    Цикл только по дням: каждый шаг — векторная операция над всеми траекториями сразу.
+    Старт — последние наблюдённые доходность, остаток и условная дисперсия модели.
+    """
+    const, phi, omega, alpha, beta, nu = garch_fitted.params.to_numpy()
+    rng = np.random.default_rng(seed)
+    # стандартизованное t: единичная дисперсия, как в dist="t" у arch
+    z = rng.standard_t(nu, size=(horizon, n_paths)) * np.sqrt((nu - 2) / nu)
+
+    y = np.full(n_paths, garch_fitted.model.y.iloc[-1])
+    eps = np.full(n_paths, garch_fitted.resid.iloc[-1])
+    var = np.full(n_paths, garch_fitted.conditional_volatility.iloc[-1] ** 2)
+    out = np.empty((horizon, n_paths))
+    for t in range(horizon):
+        var = omega + alpha * eps * eps + beta * var
+        eps = np.sqrt(var) * z[t]
+        y = const + phi * y + eps
+        out[t] = y
+    return out.T / 100  # модель обучена на процентах
+
+
+def fan(returns: np.ndarray, last_price: float, quantiles=FAN_QUANTILES) -> np.ndarray:
+    """Квантили цены по дням, shape (len(quantiles), horizon)."""
+    prices = last_price * np.cumprod(1 + returns, axis=1)
+    return np.quantile(prices, quantiles, axis=0)
+
+
+def risk_metrics(returns: np.ndarray, level: float = 0.95) -> dict[str, float]:
+    """VaR/CVaR за день и за весь горизонт (доходности, отрицательные — потери) и P(рост за горизонт)."""
+    horizon = returns.shape[1]
+    tag = f"{level * 100:g}"
+    cum = np.expm1(np.log1p(returns).sum(axis=1))
+    out = {}
+    for suffix, r in (("", returns[:, 0]), (f"_{horizon}d", cum)):
+        var = np.quantile(r, 1 - level)
+        out[f"VaR_{tag}{suffix}"] = float(var)
+        out[f"CVaR_{tag}{suffix}"] = float(r[r <= var].mean())
+    out[f"P_up_{horizon}d"] = float((cum > 0).mean())
+    return out
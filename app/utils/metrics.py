@@ -0,0 +1,179 @@
+"""Лёгкие метрики процесса в текстовом формате Prometheus (без внешних зависимостей).
+
+    @timed(STAGE_SECONDS, stage="garch_fit")          # декоратор, sync и async
+    def fit_garch(...): ...
+
+    with timed(ISS_FETCH_SECONDS, loader="candles"):   # контекстный менеджер
+        ...
+
+    cache_hit("cap_table", hit=True)
+    with INFLIGHT.track(endpoint="forecast"): ...    # или @INFLIGHT.tracked(endpoint="forecast")
+"""
+import functools
+import inspect
+import threading
+import time
+from contextlib import contextmanager
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+_REGISTRY: list["_Metric"] = []
+
+
+def _escape(v) -> str:
+    return str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _fmt_labels(names: tuple[str, ...], values: tuple, extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, doc: str, labels: tuple[str, ...] = ()):
+        self.name, self.doc, self.labels = name, doc, labels
+        self._lock = threading.Lock()
+        self._values: dict[tuple, object] = {}
+        _REGISTRY.append(self)
+
+    def _key(self, labels: dict) -> tuple:
+        return tuple(labels.get(n, "") for n in self.labels)
+
+    def render(self) -> list[str]:
+        return [f"# HELP {self.name} {self.doc}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def render(self) -> list[str]:
+        with self._lock:
+            items = list(self._values.items())
+        return super().render() + [f"{self.name}{_fmt_labels(self.labels, k)} {v}" for k, v in items]
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def dec(self, amount: float = 1.0, **labels):
+        self.inc(-amount, **labels)
+
+    def set(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = float(value)
+
+    @contextmanager
+    def track(self, **labels):
+        self.inc(**labels)
+        try:
+            yield
+        finally:
+            self.dec(**labels)
+
+    def tracked(self, **labels):
+        """Декоратор async-обработчика: число одновременно выполняющихся вызовов."""
+        def deco(fn):
+            @functools.wraps(fn)
+            async def wrapper(*args, **kwargs):
+                with self.track(**labels):
+                    return await fn(*args, **kwargs)
+            return wrapper
+        return deco
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, doc: str, labels: tuple[str, ...] = (), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, doc, labels)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            counts, total = self._values.get(key, ([0] * (len(self.buckets) + 1), 0.0))
+            for i, b in enumerate(self.buckets):
+                if value <= b:
+                    counts[i] += 1
+                    break
+            else:
+                counts[-1] += 1
+            self._values[key] = (counts, total + value)
+
+    def render(self) -> list[str]:
+        with self._lock:
+            items = [(k, (list(c), s)) for k, (c, s) in self._values.items()]
+        out = super().render()
+        for key, (counts, total) in items:
+            acc = 0
+            for b, c in zip(self.buckets + (float("inf"),), counts):
+                acc += c
+                le = 'le="+Inf"' if b == float("inf") else f'le="{b}"'
+                out.append(f"{self.name}_bucket{_fmt_labels(self.labels, key, le)} {acc}")
+            out.append(f"{self.name}_sum{_fmt_labels(self.labels, key)} {total}")
+            out.append(f"{self.name}_count{_fmt_labels(self.labels, key)} {acc}")
+        return out
+
+
+class timed:
+    """Замер длительности в гистограмму: контекстный менеджер или декоратор (sync/async)."""
+
+    def __init__(self, hist: Histogram, **labels):
+        self.hist, self.labels = hist, labels
+
+    def __enter__(self):
+        self._t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.hist.observe(time.perf_counter() - self._t0, **self.labels)
+        return False
+
+    def __call__(self, fn):
+        hist, labels = self.hist, self.labels
+        if inspect.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def wrapper(*args, **kwargs):
+                with timed(hist, **labels):
+                    return await fn(*args, **kwargs)
+        else:
+            @functools.wraps(fn)
+            def wrapper(*args, **kwargs):
+                with timed(hist, **labels):
+                    return fn(*args, **kwargs)
+        return wrapper
+
+
+def render() -> str:
+    return "\n".join(line for m in _REGISTRY for line in m.render()) + "\n"
+
+
+ISS_FETCH_SECONDS = Histogram("iss_fetch_seconds", "Длительность загрузки из ISS/moex.com", ("loader",))
+DB_QUERY_SECONDS = Histogram(
+    "db_query_seconds", "Длительность SQL-запросов к SQLite", ("op",),
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 5.0),
+)
+STAGE_SECONDS = Histogram("stage_seconds", "Длительность стадий расчёта (признаки, обучение, прогноз, отчёт)", ("stage",))
+CACHE_REQUESTS = Counter("cache_requests_total", "Обращения к слоям кэша", ("cache", "result"))
+UPSTREAM_EVENTS = Counter(
+    "upstream_events_total", "Ретраи, дубли, таймауты, размыкания и откаты на кэш при обращениях к MOEX",
+    ("host", "event"),
+)
+INFLIGHT = Gauge("inflight_requests", "Запросы к тяжёлым эндпоинтам в обработке", ("endpoint",))
+CPU_THREADS = Gauge("cpu_threads_granted", "Потоки, выданные тяжёлым расчётам из бюджета CPU")
+CPU_QUEUE = Gauge("cpu_queue_length", "Расчёты, ожидающие потоков из бюджета CPU")
+ADMISSIONS = Counter("admissions_total", "Допуск тяжёлых расчётов: сразу, после очереди, отказ", ("endpoint", "result"))
+
+
+def cache_hit(cache: str, hit: bool):
+    CACHE_REQUESTS.inc(cache=cache, result="hit" if hit else "miss")
@@ -0,0 +1,24 @@
+"""Постраничная выдача рядов по ключу — метке времени точки.
+
+Курсор — метка последней отданной точки; следующая страница начинается строго
+после неё. Дневные ряды — по дате ("YYYY-MM-DD"), внутридневные — по полной
+метке бара ("YYYY-MM-DDTHH:MM:SS"): в одном дне их может быть больше limit.
+"""
+from datetime import datetime
+
+import pandas as pd
+
+DAY_FMT = "%Y-%m-%d"
+BAR_FMT = "%Y-%m-%dT%H:%M:%S"
+
+
+def keyset_page(
+    df: pd.DataFrame, column: str, cursor: datetime | None, limit: int | None, fmt: str = DAY_FMT,
+) -> tuple[pd.DataFrame, str | None]:
+    """Строки df (по возрастанию column) строго после cursor, не больше limit; и курсор следующей страницы."""
+    if cursor is not None:
+        df = df[df[column] > pd.Timestamp(cursor)]
+    if limit and len(df) > limit:
+        df = df.iloc[:limit]
+        return df, df[column].iloc[-1].strftime(fmt)
+    return df, None
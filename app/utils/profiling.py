@@ -0,0 +1,130 @@
+"""Профилирование отдельных запросов сэмплирующим профайлером (pyinstrument).
+
+Запрос профилируется, только если несёт токен в заголовке ``X-Profile`` (в строке
+запроса токен не принимается — он попал бы в access-логи). Результат сохраняется
+в PROFILE_DIR как speedscope-JSON (или HTML при ``X-Profile-Format: html``), id
+возвращается в ``X-Profile-Id``.
+
+Профайлер middleware видит только поток цикла событий: расчёт, вынесенный в
+asyncio.to_thread, там выглядит как ожидание. Поэтому синхронная работа запроса
+запускается через ``profiling.in_thread(fn, ...)`` — в профилируемом запросе
+поток снимается своим профайлером, и его сэмплы добавляются в тот же отчёт
+(сводное дерево вызовов; как временная шкала такой отчёт не читается).
+"""
+import hmac
+import time
+import uuid
+from contextvars import ContextVar
+from pathlib import Path
+
+from config import settings
+
+FORMATS = {"speedscope": ".speedscope.json", "html": ".html"}
+
+# сессии pyinstrument рабочих потоков профилируемого запроса; None — запрос не профилируется
+_THREAD_SESSIONS: ContextVar[list | None] = ContextVar("profile_thread_sessions", default=None)
+
+
+def authorized(token: str | None) -> bool:
+    return bool(settings.PROFILE_TOKEN and token) and hmac.compare_digest(token, settings.PROFILE_TOKEN)
+
+
+def in_thread(fn, *args, **kwargs):
+    """Вызвать fn в рабочем потоке (через asyncio.to_thread); в профилируемом запросе — под профайлером."""
+    sessions = _THREAD_SESSIONS.get()
+    if sessions is None:
+        return fn(*args, **kwargs)
+
+    from pyinstrument import Profiler
+
+    profiler = Profiler(interval=settings.PROFILE_INTERVAL, async_mode="disabled")
+    profiler.start()
+    try:
+        return fn(*args, **kwargs)
+    finally:
+        profiler.stop()
+        sessions.append(profiler.last_session)
+
+
+def profile_path(profile_id: str) -> Path | None:
+    if not profile_id.isalnum():
+        return None
+    for ext in FORMATS.values():
+        p = settings.PROFILE_DIR / f"{profile_id}{ext}"
+        if p.exists():
+            return p
+    return None
+
+
+def list_profiles() -> list[dict]:
+    files = sorted(settings.PROFILE_DIR.glob("*.*"), key=lambda p: p.stat().st_mtime, reverse=True)
+    return [
+        {"id": p.name.split(".")[0], "file": p.name, "size": p.stat().st_size,
+         "created": time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(p.stat().st_mtime))}
+        for p in files
+    ]
+
+
+def prune():
+    """Удалить профили старше PROFILE_MAX_AGE_H и сверх PROFILE_KEEP последних."""
+    files = sorted(settings.PROFILE_DIR.glob("*.*"), key=lambda p: p.stat().st_mtime, reverse=True)
+    cutoff = time.time() - settings.PROFILE_MAX_AGE_H * 3600
+    for i, p in enumerate(files):
+        if i >= settings.PROFILE_KEEP or p.stat().st_mtime < cutoff:
+            p.unlink(missing_ok=True)
+
+
+class ProfilingMiddleware:
+    """ASGI-middleware; подключается в main.py только при заданном PROFILE_TOKEN."""
+
+    def __init__(self, app):
+        self.app = app
+
+    @staticmethod
+    def _request_token(scope) -> tuple[str | None, str]:
+        headers = {k.decode("latin-1").lower(): v.decode("latin-1") for k, v in scope.get("headers", [])}
+        token = headers.get("x-profile")
+        fmt = headers.get("x-profile-format", "speedscope")
+        return token, fmt if fmt in FORMATS else "speedscope"
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        token, fmt = self._request_token(scope)
+        if not authorized(token):
+            return await self.app(scope, receive, send)
+
+        from pyinstrument import Profiler
+
+        profile_id = uuid.uuid4().hex
+
+        async def send_with_id(message):
+            if message["type"] == "http.response.start":
+                message.setdefault("headers", [])
+                message["headers"] = list(message["headers"]) + [(b"x-profile-id", profile_id.encode())]
+            await send(message)
+
+        profiler = Profiler(interval=settings.PROFILE_INTERVAL, async_mode="enabled")
+        sessions = []
+        reset = _THREAD_SESSIONS.set(sessions)
+        profiler.start()
+        try:
+            await self.app(scope, receive, send_with_id)
+        finally:
+            profiler.stop()
+            _THREAD_SESSIONS.reset(reset)
+            self._save(profiler.last_session, sessions, profile_id, fmt)
+
+    @staticmethod
+    def _save(session, thread_sessions: list, profile_id: str, fmt: str):
+        from pyinstrument.renderers import HTMLRenderer, SpeedscopeRenderer
+        from pyinstrument.session import Session
+
+        for s in thread_sessions:
+            session = Session.combine(session, s)
+        settings.PROFILE_DIR.mkdir(parents=True, exist_ok=True)
+        renderer = SpeedscopeRenderer() if fmt == "speedscope" else HTMLRenderer()
+        (settings.PROFILE_DIR / f"{profile_id}{FORMATS[fmt]}").write_text(
+            renderer.render(session), encoding="utf-8"
+        )
+        prune()
@@ -3,10 +3,12 @@ from typing import Optional
 
 import pandas as pd
 import quantstats as qs
+from utils.metrics import timed, STAGE_SECONDS
 
 qs.extend_pandas()
 
 
+@timed(STAGE_SECONDS, stage="report_render")
 def generate_report(
     prices: pd.Series,
     benchmark: Optional[pd.Series] = None,
@@ -0,0 +1,42 @@
+"""Одна загрузка на ключ: одновременные вызовы с тем же ключом ждут первый.
+
+Результат не запоминается — после завершения следующий вызов загружает заново;
+кэшировать готовое должна сама fn. Ошибка первого вызова достаётся и ожидающим,
+его отмена отменяет ожидание у всех.
+
+    _FLIGHT = SingleFlight()
+    u = await _FLIGHT.do((year, quarter), lambda: _build(year, quarter))
+"""
+import asyncio
+from typing import Awaitable, Callable, Hashable, TypeVar
+
+T = TypeVar("T")
+
+
+class SingleFlight:
+    def __init__(self):
+        self._pending: dict[Hashable, asyncio.Future] = {}
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._pending
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[T]]) -> T:
+        """Результат fn() — своего вызова или уже идущего с тем же key."""
+        if key in self._pending:
+            # отмена ожидающего не отменяет загрузку у остальных
+            return await asyncio.shield(self._pending[key])
+        fut = self._pending[key] = asyncio.get_running_loop().create_future()
+        try:
+            result = await fn()
+        except asyncio.CancelledError:
+            fut.cancel()
+            raise
+        except BaseException as e:
+            fut.set_exception(e)
+            fut.exception()  # ошибку заберут ожидающие; без них — не «never retrieved»
+            raise
+        else:
+            fut.set_result(result)
+        finally:
+            del self._pending[key]
+        return result
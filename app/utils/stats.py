@@ -3,7 +3,8 @@ from typing import Dict
 
 def calc_stats(
     index_ser: pd.Series,
-    imoex_ser: pd.Series
+    imoex_ser: pd.Series,
+    periods: float = 252,  # баров в году: 252 для дневных, больше для внутридневных
 ) -> Dict:
     df = pd.DataFrame({"idx": index_ser, "imoex": imoex_ser}).ffill().dropna()
     idx, bm = df["idx"], df["imoex"]
@@ -12,8 +13,8 @@ def calc_stats(
     ret_b = bm.pct_change().dropna()
     ret_i, ret_b = ret_i.align(ret_b, join="inner")
 
-    ann_vol = ret_i.std()*np.sqrt(252)
-    ann_ret = ret_i.mean()*252
+    ann_vol = ret_i.std()*np.sqrt(periods)
+    ann_ret = ret_i.mean()*periods
     sharpe = ann_ret/ann_vol if ann_vol else np.nan
     var95 = np.quantile(ret_i, 0.05)
 
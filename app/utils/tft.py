@@ -1,9 +1,11 @@
 import numpy as np
 import pandas as pd
 import lightning.pytorch as pl
+import torch
 from pytorch_forecasting import TimeSeriesDataSet, TemporalFusionTransformer
 from pytorch_forecasting.data import GroupNormalizer
 from pytorch_forecasting.metrics import QuantileLoss
+from utils.metrics import timed, STAGE_SECONDS
 
 
 default_params = {
@@ -44,17 +46,22 @@ def _append_future(
     return pd.concat([df_long, *extra], ignore_index=True)
 
 
+@timed(STAGE_SECONDS, stage="tft_fit")
 def fit_tft(
     portfolio: pd.Series,
     imoex: pd.Series,
     encoder_len: int = 60,
     pred_len: int = 60,
     quantiles: list[float] | None = None,
-    params: dict | None = None
+    params: dict | None = None,
+    threads: int | None = None,
 ):
     """
     Обучает Temporal Fusion Transformer на объединённом ряде Фонда и IMOEX.
     Возвращает model и DataFrame последнего encoder-окна.
+
+    threads — грант бюджета CPU: столько intra-op потоков torch (настройка
+    процессная) и до threads-1 воркеров DataLoader; None — умолчания torch и 4 воркера.
     """
     if quantiles is None:
         quantiles = [0.025, 0.5, 0.975]
@@ -81,7 +88,12 @@ def fit_tft(
         allow_missing_timesteps=True
     )
 
-    train_loader = dataset.to_dataloader(train=True, batch_size=64, num_workers=4, persistent_workers=True)
+    workers = 4 if threads is None else min(4, threads - 1)
+    if threads is not None:
+        torch.set_num_threads(threads)
+    train_loader = dataset.to_dataloader(
+        train=True, batch_size=64, num_workers=workers, persistent_workers=workers > 0
+    )
 
     tft = TemporalFusionTransformer.from_dataset(
         dataset,
@@ -103,6 +115,7 @@ def fit_tft(
     return tft, dataset, last_encoder
 
 
+@timed(STAGE_SECONDS, stage="tft_predict")
 def forecast_tft(
     model: TemporalFusionTransformer,
     train_ds: TimeSeriesDataSet,
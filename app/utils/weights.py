@@ -0,0 +1,112 @@
+"""Веса индекса по ковариации доходностей: минимальная дисперсия, паритет риска, максимальная диверсификация.
+
+Все схемы long-only и нормированы на 1; на вход — ковариационная матрица (N × N),
+на выход — вектор весов в том же порядке бумаг. Для N ≈ 100 решение занимает
+единицы миллисекунд: несколько решений линейных систем N × N, без общего оптимизатора.
+"""
+import numpy as np
+
+MAX_ITER = 50
+FALLBACK_ITER = 10_000  # шагов проекционного спуска, запасного для min_variance
+
+
+def min_variance(cov: np.ndarray) -> np.ndarray:
+    """argmin wᵀΣw при Σw = 1, w ≥ 0.
+
+    Аналитическое решение Σ⁻¹1 на активном множестве: бумага с отрицательным весом
+    выбывает, нарушившая условие оптимальности — возвращается, система решается заново.
+    Если активное множество не сошлось за 2N шагов или подматрица вырождена —
+    проекционный градиентный спуск (_projected_min_variance).
+    """
+    n = len(cov)
+    active = np.ones(n, dtype=bool)
+    try:
+        for _ in range(2 * n):
+            x = np.linalg.solve(cov[np.ix_(active, active)], np.ones(active.sum()))
+            if (x < 0).any():
+                # выбывает самый отрицательный: по одной, чтобы не выкинуть лишнее
+                active[np.flatnonzero(active)[np.argmin(x)]] = False
+                continue
+            w = np.zeros(n)
+            w[active] = x / x.sum()
+            # условие оптимальности для выбывших: (Σw)_i ≥ wᵀΣw, иначе бумага возвращается
+            g = cov @ w
+            back = ~active & (g < w @ g - 1e-12)
+            if not back.any():
+                break
+            active[np.flatnonzero(back)[np.argmin(g[back])]] = True
+        else:
+            w = _projected_min_variance(cov)
+    except np.linalg.LinAlgError:
+        w = _projected_min_variance(cov)
+    assert abs(w.sum() - 1) < 1e-9, "min_variance weights must sum to 1"
+    return w
+
+
+def _project_simplex(v: np.ndarray) -> np.ndarray:
+    """Евклидова проекция на {w ≥ 0, Σw = 1} (сортировкой, Duchi et al., 2008)."""
+    u = np.sort(v)[::-1]
+    css = np.cumsum(u) - 1
+    k = np.flatnonzero(u - css / np.arange(1, len(v) + 1) > 0)[-1]
+    return np.maximum(v - css[k] / (k + 1), 0)
+
+
+def _projected_min_variance(cov: np.ndarray, tol: float = 1e-12) -> np.ndarray:
+    """min wᵀΣw на симплексе ускоренным проекционным градиентом (FISTA), шаг 1/λmax(Σ)."""
+    n = len(cov)
+    lam = np.linalg.eigvalsh(cov)[-1]
+    if lam <= 0:
+        return np.full(n, 1 / n)  # нулевая ковариация: все портфели равноценны
+    w = y = np.full(n, 1 / n)
+    t = 1.0
+    for _ in range(FALLBACK_ITER):
+        w_next = _project_simplex(y - cov @ y / lam)
+        t_next = (1 + np.sqrt(1 + 4 * t * t)) / 2
+        y = w_next + (t - 1) / t_next * (w_next - w)
+        done = np.abs(w_next - w).max() < tol
+        w, t = w_next, t_next
+        if done:
+            break
+    return w / w.sum()
+
+
+def risk_parity(cov: np.ndarray, budget: np.ndarray | None = None, tol: float = 1e-10) -> np.ndarray:
+    """Равные (или заданные *budget*) вклады в риск: w_i (Σw)_i ∝ b_i.
+
+    Метод Ньютона для выпуклой задачи min ½yᵀΣy − Σ b_i ln y_i (Spinu, 2013);
+    её минимум y* после нормировки — веса паритета риска.
+    """
+    n = len(cov)
+    b = np.full(n, 1 / n) if budget is None else budget / budget.sum()
+    y = b / np.sqrt(np.diag(cov))
+    y /= np.sqrt(y @ cov @ y)
+    for _ in range(MAX_ITER):
+        grad = cov @ y - b / y
+        hess = cov + np.diag(b / (y * y))
+        step = np.linalg.solve(hess, grad)
+        # шаг урезается, чтобы y остался положительным
+        t = 1.0
+        while (y - t * step <= 0).any():
+            t /= 2
+        y = y - t * step
+        if np.abs(grad).max() < tol:
+            break
+    return y / y.sum()
+
+
+def max_diversification(cov: np.ndarray) -> np.ndarray:
+    """argmax (wᵀσ) / √(wᵀΣw), w ≥ 0: минимальная дисперсия на корреляционной матрице, делённая на σ."""
+    sigma = np.sqrt(np.diag(cov))
+    if (sigma <= 0).any():
+        # бумага без колебаний цены: коэффициент диверсификации не определён
+        raise ValueError("max_diversification needs non-zero volatility for every security")
+    corr = cov / np.outer(sigma, sigma)
+    w = min_variance(corr) / sigma
+    return w / w.sum()
+
+
+SOLVERS = {
+    "min_variance": min_variance,
+    "risk_parity": risk_parity,
+    "max_diversification": max_diversification,
+}
@@ -0,0 +1,24 @@
+import importlib
+import logging
+import time
+
+log = logging.getLogger(__name__)
+
+# Модули с тяжёлыми зависимостями: torch/lightning/pytorch_forecasting, catboost, arch, ta, quantstats.
+# Роутеры импортируют их лениво, при первом запросе; warm_up() делает это заранее.
+HEAVY_MODULES = ("utils.garch", "utils.dataset", "utils.catboost", "utils.tft", "utils.report")
+
+
+def warm_up(modules: tuple[str, ...] = HEAVY_MODULES) -> dict[str, float]:
+    """Импортировать тяжёлые модули; вернуть время импорта каждого, сек."""
+    timings = {}
+    for name in modules:
+        t0 = time.perf_counter()
+        try:
+            importlib.import_module(name)
+        except ImportError as e:
+            log.warning("warm-up: %s not importable: %s", name, e)
+            continue
+        timings[name] = time.perf_counter() - t0
+    log.info("warm-up done: %s", {k: round(v, 2) for k, v in timings.items()})
+    return timings
@@ -0,0 +1,259 @@
+"""Локальный стенд MOEX ISS / moex.com для нагрузочного тестирования без обращений к бирже.
+
+    python benchmarks/fake_iss.py --port 8900 --secs 100 --years 10 --latency-ms 40 --error-rate 0.01
+    UPSTREAM_URL=http://127.0.0.1:8900 uvicorn main:app      # в каталоге app/
+
+Отдаёт те же ответы, что разбирают загрузчики приложения: свечи и историю торгов
+(extended JSON с постраничной выдачей), страницу s26 и квартальные таблицы
+капитализации, XLSX-выгрузки free-float и дивидендной доходности. Данные —
+синтетический рынок (benchmarks/synthetic.py) или записанные фикстуры
+(--fixtures DIR с prices.csv: secid,date,close и необязательным imoex.csv: date,close).
+Умеет добавлять задержку, медленные «хвосты», ошибки 5xx и 429 по лимиту запросов.
+"""
+import argparse
+import asyncio
+import io
+import random
+import sys
+import time
+import zlib
+from datetime import date, datetime, timedelta
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+from aiohttp import web
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+from synthetic import SyntheticMarket, make_market, state_reg  # noqa: E402
+
+FF_PATH = "/moex-web-icdb-api/api/v1/export/site-free-floats/xlsx"
+DIV_PATH = "/moex-web-icdb-api/api/v1/export/site-dividend-yields/xlsx"
+PROF_PATH = "/moex-web-icdb-api/api/v2/export/ru_profitability"
+DIV_COL = "Дивидендная доходность за {year} год, (D/Mp)%"
+
+
+def load_fixtures(path: Path, seed: int) -> SyntheticMarket:
+    prices = pd.read_csv(path / "prices.csv", parse_dates=["date"])
+    tbl = prices.pivot_table(index="date", columns="secid", values="close").sort_index().ffill().bfill()
+    rng = np.random.default_rng(seed)
+    n = tbl.shape[1]
+    shares = rng.integers(10**7, 10**10, n)
+    if (path / "imoex.csv").exists():
+        imoex = pd.read_csv(path / "imoex.csv", parse_dates=["date"]).set_index("date")["close"]
+        imoex = imoex.reindex(tbl.index).ffill().bfill().to_numpy()
+    else:
+        caps = tbl.to_numpy() * shares
+        imoex = 3000 * caps.sum(axis=1) / caps[0].sum()
+    return SyntheticMarket(
+        secids=list(tbl.columns),
+        dates=np.asarray(tbl.index.date),
+        closes=tbl.to_numpy(),
+        shares_out=shares,
+        free_float=np.round(rng.uniform(5, 90, n), 1),
+        div_yield=np.round(rng.uniform(0, 15, n), 2),
+        imoex=imoex,
+    )
+
+
+class FakeISS:
+    def __init__(self, market: SyntheticMarket, args):
+        self.m = market
+        self.args = args
+        self.col = {s: j for j, s in enumerate(market.secids)}
+        self.date_ix = pd.DatetimeIndex(pd.to_datetime(market.dates))
+        self._tokens, self._refill = float(args.rps_limit or 0), time.monotonic()
+        self.stats = {"requests": 0, "errors": 0, "throttled": 0}
+
+    # --- инфраструктура: задержка, ошибки, лимит запросов ---
+
+    @web.middleware
+    async def chaos(self, request: web.Request, handler):
+        a = self.args
+        self.stats["requests"] += 1
+        if a.rps_limit:
+            now = time.monotonic()
+            self._tokens = min(a.rps_limit, self._tokens + (now - self._refill) * a.rps_limit)
+            self._refill = now
+            if self._tokens < 1:
+                self.stats["throttled"] += 1
+                return web.Response(status=429, headers={"Retry-After": "1"}, text="rate limited")
+            self._tokens -= 1
+        delay = a.latency_ms + random.uniform(0, a.jitter_ms)
+        if random.random() < a.slow_rate:
+            delay += a.slow_ms
+        if delay:
+            await asyncio.sleep(delay / 1000)
+        if random.random() < a.error_rate:
+            self.stats["errors"] += 1
+            return web.Response(status=random.choice((500, 502, 503)), text="injected failure")
+        return await handler(request)
+
+    # --- ISS ---
+
+    def _closes(self, secid: str, d_from: str | None, d_till: str | None) -> pd.Series:
+        if secid == "IMOEX":
+            ser = pd.Series(self.m.imoex, index=self.date_ix)
+        elif secid in self.col:
+            ser = pd.Series(self.m.closes[:, self.col[secid]], index=self.date_ix)
+        else:
+            return pd.Series(dtype=float)
+        return ser.loc[d_from or None:d_till or None]
+
+    @staticmethod
+    def _extended(tables: dict) -> web.Response:
+        return web.json_response([{"charsetinfo": {"name": "utf-8"}}, tables])
+
+    def _intraday(self, secid: str, ser: pd.Series, interval: int) -> list[dict]:
+        """Детерминированные внутридневные бары: броуновский мост от закрытия к закрытию."""
+        rows = []
+        # предыдущее закрытие — по всей истории, иначе первый день запрошенного окна без опоры
+        full = self._closes(secid, None, None)
+        prev = full.shift(1).bfill().reindex(ser.index)
+        n = 520 // interval
+        for d, close in ser.items():
+            rng = np.random.default_rng(zlib.crc32(f"{secid}{d.date()}".encode()))
+            steps = rng.normal(0, 0.002, n).cumsum()
+            path = prev[d] + (close - prev[d]) * np.linspace(1 / n, 1, n) + (steps - steps[-1] * np.linspace(1 / n, 1, n)) * close
+            t0 = datetime.combine(d.date(), datetime.min.time()) + timedelta(hours=10)
+            for k, p in enumerate(path):
+                b = t0 + timedelta(minutes=k * interval)
+                rows.append({
+                    "open": float(path[k - 1] if k else prev[d]), "close": float(p),
+                    "high": float(max(p, path[k - 1] if k else prev[d])),
+                    "low": float(min(p, path[k - 1] if k else prev[d])),
+                    "value": 0.0, "volume": int(rng.integers(1, 10**4)),
+                    "begin": b.strftime("%Y-%m-%d %H:%M:%S"),
+                    "end": (b + timedelta(minutes=interval, seconds=-1)).strftime("%Y-%m-%d %H:%M:%S"),
+                })
+        return rows
+
+    async def candles(self, request: web.Request) -> web.Response:
+        q = request.query
+        secid, interval = request.match_info["secid"], int(q.get("interval", 24))
+        ser = self._closes(secid, q.get("from"), (q.get("till") or "")[:10] or None)
+        if interval == 24:
+            rows = [
+                {"open": c, "close": c, "high": c, "low": c, "value": 0.0, "volume": 0,
+                 "begin": f"{d.date()} 00:00:00", "end": f"{d.date()} 23:59:59"}
+                for d, c in zip(ser.index, ser.to_numpy().tolist())
+            ]
+        else:
+            rows = self._intraday(secid, ser, interval)
+        start = int(q.get("start", 0))
+        return self._extended({"candles": rows[start:start + self.args.page_size]})
+
+    async def history(self, request: web.Request) -> web.Response:
+        q = request.query
+        ser = self._closes(request.match_info["secid"], q.get("from"), q.get("till"))
+        start, page = int(q.get("start", 0)), self.args.history_page_size
+        block = ser.iloc[start:start + page]
+        cols = (q.get("history.columns") or "TRADEDATE,CLOSE").split(",")
+        rows = [
+            {k: v for k, v in {"TRADEDATE": str(d.date()), "CLOSE": c, "BOARDID": "TQBR"}.items() if k in cols}
+            for d, c in zip(block.index, block.to_numpy().tolist())
+        ]
+        cursor = [{"INDEX": start, "TOTAL": len(ser), "PAGESIZE": page}]
+        return self._extended({"history": rows, "history.cursor": cursor})
+
+    # --- moex.com: s26 и квартальные таблицы ---
+
+    async def s26(self, request: web.Request) -> web.Response:
+        years = sorted({y for y, _ in self.m.quarters()}, reverse=True)
+        head = "".join(f"<th>{y}</th>" for y in years)
+        body = "".join(
+            "<tr>" + "".join(
+                f'<td><a href="/a{y}{q}">{q} квартал {y}</a></td>' if (y, q) in self.m.quarters() else "<td></td>"
+                for y in years
+            ) + "</tr>"
+            for q in (1, 2, 3, 4)
+        )
+        return web.Response(text=f'<table class="table1"><tr>{head}</tr>{body}</table>', content_type="text/html")
+
+    async def quarter(self, request: web.Request) -> web.Response:
+        y, q = int(request.match_info["y"]), int(request.match_info["q"])
+        df = self.m.cap_table(y, q)
+        def num(x) -> str:  # формат сайта: пробел — разделитель тысяч, запятая — десятичный
+            return f"{x:,}".replace(",", " ").replace(".", ",")
+
+        rows = "".join(
+            f"<tr><td>{r.secid}</td><td>{r.name}</td><td>обыкновенная</td><td>{r.state_reg}</td>"
+            f"<td>{num(int(r.shares_out))}</td><td>{num(round(r.price, 4))}</td><td>{num(round(r.cap))}</td></tr>"
+            for r in df.itertuples()
+        )
+        head = "<tr><th>Код</th><th>Эмитент</th><th>Тип</th><th>Рег. номер</th><th>Кол-во</th><th>Цена</th><th>Капитализация</th></tr>"
+        html = f'<div class="table-scroller"><table class="table1">{head}{rows}</table></div>'
+        return web.Response(text=html, content_type="text/html")
+
+    # --- XLSX-выгрузки ---
+
+    @staticmethod
+    def _xlsx(df: pd.DataFrame) -> web.Response:
+        buf = io.BytesIO()
+        df.to_excel(buf, index=False)
+        return web.Response(
+            body=buf.getvalue(),
+            content_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+        )
+
+    async def free_floats(self, request: web.Request) -> web.Response:
+        m = self.m
+        return self._xlsx(pd.DataFrame({
+            "Код": m.secids, "Эмитент": m.secids, "ИНН": "", "Тип": "акция обыкновенная",
+            "Рег. номер": [state_reg(s) for s in m.secids], "Уровень листинга": 1,
+            "Free-float, %": m.free_float,
+        }))
+
+    async def div_yields(self, request: web.Request) -> web.Response:
+        m = self.m
+        df = pd.DataFrame({"Регистрационный номер выпуска/ ISIN": [state_reg(s) for s in m.secids]})
+        for y in range(2015, date.today().year + 1):
+            df[DIV_COL.format(year=y)] = [str(v).replace(".", ",") for v in m.div_yield]
+        return self._xlsx(df)
+
+    async def health(self, request: web.Request) -> web.Response:
+        return web.json_response({**self.stats, "secids": len(self.m.secids), "days": len(self.m.dates)})
+
+    def app(self) -> web.Application:
+        app = web.Application(middlewares=[self.chaos])
+        iss = "/iss.moex.com/iss"
+        app.add_routes([
+            web.get(iss + r"/engines/{engine}/markets/{market}/securities/{secid}/candles.json", self.candles),
+            web.get(iss + r"/history/engines/{engine}/markets/{market}/boards/{board}/securities/{secid}.json",
+                    self.history),
+            web.get(iss + r"/history/engines/{engine}/markets/{market}/securities/{secid}.json", self.history),
+            web.get("/www.moex.com/s26", self.s26),
+            web.get(r"/www.moex.com/a{y:\d{4}}{q:\d}", self.quarter),
+            web.get("/web.moex.com" + FF_PATH, self.free_floats),
+            web.get("/web.moex.com" + DIV_PATH, self.div_yields),
+            web.get("/_health", self.health),
+        ])
+        return app
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=8900)
+    ap.add_argument("--secs", type=int, default=100)
+    ap.add_argument("--years", type=float, default=10)
+    ap.add_argument("--seed", type=int, default=42)
+    ap.add_argument("--fixtures", type=Path, help="каталог с prices.csv (+ imoex.csv) вместо синтетики")
+    ap.add_argument("--latency-ms", type=float, default=0)
+    ap.add_argument("--jitter-ms", type=float, default=0)
+    ap.add_argument("--slow-rate", type=float, default=0, help="доля запросов с дополнительной задержкой")
+    ap.add_argument("--slow-ms", type=float, default=2000)
+    ap.add_argument("--error-rate", type=float, default=0, help="доля ответов 5xx")
+    ap.add_argument("--rps-limit", type=float, default=0, help="лимит запросов/с, сверх — 429")
+    ap.add_argument("--page-size", type=int, default=500, help="свечей на страницу (как в ISS)")
+    ap.add_argument("--history-page-size", type=int, default=100)
+    args = ap.parse_args()
+
+    random.seed(args.seed)
+    market = load_fixtures(args.fixtures, args.seed) if args.fixtures else make_market(args.secs, args.years, args.seed)
+    print(f"fake ISS: {len(market.secids)} secs × {len(market.dates)} days on http://{args.host}:{args.port}")
+    web.run_app(FakeISS(market, args).app(), host=args.host, port=args.port, print=None)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,158 @@
+"""Нагрузочный прогон API смесью реалистичных запросов; печатает пропускную способность и перцентили.
+
+    # 1) стенд ISS, 2) API поверх стенда, 3) нагрузка
+    python benchmarks/fake_iss.py --port 8900 --latency-ms 40
+    (cd app && UPSTREAM_URL=http://127.0.0.1:8900 uvicorn main:app --port 8000 --workers 2)
+    python benchmarks/load.py --duration 60 --concurrency 32 --mix series=40,stats=20,value=20,create=5,forecast=10,report=5
+
+Перед прогоном создаются --indices индексов из бумаг текущего квартала (POST /index/bulk).
+"""
+import argparse
+import asyncio
+import json
+import random
+import statistics
+import time
+from collections import defaultdict
+from datetime import date, timedelta
+from pathlib import Path
+
+import aiohttp
+
+DEFAULT_MIX = "series=40,stats=20,value=20,create=5,forecast=10,report=5"
+
+
+class Driver:
+    def __init__(self, args):
+        self.args = args
+        self.base = args.base.rstrip("/")
+        self.rng = random.Random(args.seed)
+        self.secids: list[str] = []
+        self.index_ids: list[int] = []
+        self.lat = defaultdict(list)
+        self.errors = defaultdict(int)
+
+    # --- подготовка ---
+
+    async def setup(self, s: aiohttp.ClientSession):
+        today = date.today()
+        year, quarter = today.year, (today.month - 1) // 3 + 1
+        async with s.get(f"{self.base}/securities/", params={"year": year, "quarter": quarter}) as r:
+            r.raise_for_status()
+            self.secids = [p[0] for p in await r.json()]
+        if not self.secids:
+            raise SystemExit("no securities returned by /securities")
+        specs = [self._index_spec(i) for i in range(self.args.indices)]
+        async with s.post(f"{self.base}/index/bulk", json=specs) as r:
+            r.raise_for_status()
+            self.index_ids = [x["id"] for x in await r.json()]
+        print(f"setup: {len(self.secids)} securities, {len(self.index_ids)} indices")
+
+    def _index_spec(self, i: int) -> dict:
+        k = min(len(self.secids), self.rng.randint(5, 30))
+        return {
+            "name": f"load_{int(time.time())}_{i}",
+            "base_date": str(date.today().replace(day=1) - timedelta(days=365)),
+            "weighting": self.rng.choice(["equal", "market_cap", "cap_freefloat"]),
+            "securities": [{"secid": s} for s in self.rng.sample(self.secids, k)],
+        }
+
+    def _assets(self) -> list[dict]:
+        k = min(len(self.secids), self.rng.randint(2, 6))
+        return [{"secid": s, "shares": self.rng.randint(1, 100)} for s in self.rng.sample(self.secids, k)]
+
+    # --- сценарии ---
+
+    def request(self, kind: str) -> tuple[str, str, dict]:
+        idx = self.rng.choice(self.index_ids)
+        if kind == "series":
+            days = self.rng.choice([30, 365, 5 * 365])
+            params = {"from": str(date.today() - timedelta(days=days)), "till": str(date.today())}
+            return "GET", f"/index/{idx}/series", {"params": params}
+        if kind == "stats":
+            return "GET", f"/index/{idx}/stats", {}
+        if kind == "value":
+            return "GET", f"/index/{idx}/value", {}
+        if kind == "create":
+            return "POST", "/index/", {"json": self._index_spec(self.rng.randint(0, 10**6))}
+        if kind == "forecast":
+            return "POST", "/forecast/", {"json": {"assets": self._assets(), "model": "fast"}}
+        if kind == "report":
+            return "POST", "/report/", {"json": {"assets": self._assets()}}
+        raise ValueError(kind)
+
+    async def worker(self, s: aiohttp.ClientSession, kinds: list[str], weights: list[float], deadline: float):
+        while time.monotonic() < deadline:
+            kind = self.rng.choices(kinds, weights)[0]
+            method, path, kw = self.request(kind)
+            t0 = time.perf_counter()
+            try:
+                async with s.request(method, self.base + path, **kw) as r:
+                    await r.read()
+                    ok = r.status < 400
+            except (aiohttp.ClientError, asyncio.TimeoutError):
+                ok = False
+            self.lat[kind].append(time.perf_counter() - t0)
+            if not ok:
+                self.errors[kind] += 1
+
+    async def run(self) -> dict:
+        mix = dict(
+            (k, float(v)) for k, v in (p.split("=") for p in self.args.mix.split(","))
+        )
+        timeout = aiohttp.ClientTimeout(total=self.args.timeout)
+        conn = aiohttp.TCPConnector(limit=self.args.concurrency)
+        async with aiohttp.ClientSession(timeout=timeout, connector=conn) as s:
+            await self.setup(s)
+            t0 = time.monotonic()
+            deadline = t0 + self.args.duration
+            await asyncio.gather(*[
+                self.worker(s, list(mix), list(mix.values()), deadline)
+                for _ in range(self.args.concurrency)
+            ])
+            elapsed = time.monotonic() - t0
+        return self.report(elapsed)
+
+    def report(self, elapsed: float) -> dict:
+        def pct(xs: list[float], p: float) -> float:
+            xs = sorted(xs)
+            return xs[min(len(xs) - 1, int(p / 100 * len(xs)))]
+
+        out = {"elapsed_s": elapsed, "endpoints": {}}
+        every = [x for xs in self.lat.values() for x in xs]
+        rows = list(self.lat.items()) + [("TOTAL", every)]
+        print(f"{'endpoint':10s} {'n':>6s} {'err':>5s} {'rps':>7s} {'p50':>8s} {'p90':>8s} {'p99':>8s} {'max':>8s}")
+        for kind, xs in rows:
+            if not xs:
+                continue
+            err = sum(self.errors.values()) if kind == "TOTAL" else self.errors[kind]
+            stats = {
+                "n": len(xs), "errors": err, "rps": len(xs) / elapsed,
+                "p50_s": pct(xs, 50), "p90_s": pct(xs, 90), "p99_s": pct(xs, 99),
+                "max_s": max(xs), "mean_s": statistics.fmean(xs),
+            }
+            out["endpoints"][kind] = stats
+            print(f"{kind:10s} {stats['n']:6d} {err:5d} {stats['rps']:7.2f} "
+                  f"{stats['p50_s']:8.3f} {stats['p90_s']:8.3f} {stats['p99_s']:8.3f} {stats['max_s']:8.3f}")
+        return out
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--base", default="http://127.0.0.1:8000/api")
+    ap.add_argument("--duration", type=float, default=30, help="секунд нагрузки")
+    ap.add_argument("--concurrency", type=int, default=16)
+    ap.add_argument("--mix", default=DEFAULT_MIX, help="вид=вес через запятую")
+    ap.add_argument("--indices", type=int, default=20, help="индексов создать перед прогоном")
+    ap.add_argument("--timeout", type=float, default=120)
+    ap.add_argument("--seed", type=int, default=1)
+    ap.add_argument("--out", type=Path, help="записать результат в JSON")
+    args = ap.parse_args()
+
+    res = asyncio.run(Driver(args).run())
+    if args.out:
+        args.out.write_text(json.dumps({"args": vars(args) | {"out": str(args.out)}, **res}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,225 @@
+"""Микробенчмарки горячих путей на синтетическом рынке и локальной SQLite.
+
+    python benchmarks/run.py --secs 50 --years 5            # замер + сравнение с baseline.json
+    python benchmarks/run.py --update-baseline              # записать baseline.json
+    python benchmarks/run.py --only compute_series get_series
+
+Сеть не используется: загрузчики ISS подменяются чтением из засеянной базы
+(или пустым ответом — как если бы ISS не вернул новых дат).
+Код выхода 1, если медиана какого-то замера выросла больше чем на --tolerance.
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+from datetime import date
+from pathlib import Path
+
+HERE = Path(__file__).resolve().parent
+APP = HERE.parent / "app"
+BASELINE = HERE / "baseline.json"
+
+QUICK_REG = {"iterations": 100, "depth": 6, "verbose": 0}
+QUICK_CLF = {"iterations": 100, "depth": 6, "verbose": 0, "loss_function": "CrossEntropy"}
+
+
+def _setup(tmp: str, args):
+    """Засеять базу и импортировать приложение (DB_URL должен быть задан до импорта)."""
+    os.environ["DB_URL"] = f"sqlite:///{tmp}/bench.sqlite3"
+    sys.path[:0] = [str(APP), str(HERE)]
+    from synthetic import make_market, seed_db
+    from database import engine
+
+    market = make_market(args.secs, args.years, args.seed)
+    t0 = time.perf_counter()
+    seed_db(market, engine)
+    print(f"seeded {len(market.secids)} secs × {len(market.dates)} days in {time.perf_counter() - t0:.2f}s")
+    _offline(market)
+    return market
+
+
+def _offline(market):
+    import pandas as pd
+    from services import price_cache, benchmark, moex, index_builder
+
+    async def no_new_rows(*args, **kwargs):
+        return pd.DataFrame()
+
+    async def candles_bulk(secids, date_from, date_to):
+        out = {}
+        for s in secids:
+            df = market.series(s)
+            df = df[(df.date >= date_from) & (df.date <= date_to)]
+            if not df.empty:
+                out[s] = df
+        return out
+
+    async def load_latest_prices(secids):
+        last = dict(zip(market.secids, market.closes[-1]))
+        return {s: float(last.get(s, 0.0)) for s in secids}
+
+    price_cache._fetch_iss = no_new_rows
+    benchmark._fetch_imoex_from_iss = no_new_rows
+    moex.candles_bulk = index_builder.candles_bulk = candles_bulk
+    moex.load_latest_prices = index_builder.load_latest_prices = load_latest_prices
+
+
+def _time(fn, repeat: int) -> dict:
+    runs = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        runs.append(time.perf_counter() - t0)
+    return {"median_s": statistics.median(runs), "min_s": min(runs), "runs": repeat}
+
+
+def benches(market, args) -> dict:
+    """name → (callable, repeat). Подготовка (данные, обученные модели) делается здесь же, вне замера."""
+    import numpy as np
+    import pandas as pd
+    from services import index_builder, price_cache, moex
+
+    run = asyncio.run
+    secids = market.secids[: args.index_size]
+    weights = {s: 1 / len(secids) for s in secids}
+    d0, d1 = market.dates[0], market.dates[-1]
+    year, quarter = d1.year, (d1.month - 1) // 3 + 1
+
+    async def cap_frame():
+        df_cap, ff, dy = await asyncio.gather(
+            moex.cap_table_q(year, quarter), moex.free_float(), moex.div_yield_df()
+        )
+        return (
+            df_cap[df_cap.secid.isin(secids)]
+            .merge(ff[["secid", "free_float"]], on="secid", how="left")
+            .merge(dy[["state_reg", "div_yield"]], on="state_reg", how="left")
+            .set_index("secid")
+        )
+
+    df_sel = run(cap_frame())
+    pf = pd.Series(
+        market.closes[:, : args.portfolio_size].sum(axis=1), index=pd.to_datetime(market.dates)
+    )
+    imoex = pd.Series(market.imoex, index=pd.to_datetime(market.dates))
+    idx_ser = pd.Series(
+        [p["value"] for p in run(index_builder.compute_series(weights, d0, d1))],
+        index=pd.to_datetime(market.dates),
+    )
+
+    out = {
+        "compute_series": (lambda: run(index_builder.compute_series(weights, d0, d1)), args.repeat),
+        "build_weights": (lambda: run(index_builder.build_weights(df_sel, "cap_freefloat")), args.repeat),
+        "cap_table_q": (lambda: run(moex.cap_table_q(year, quarter)), args.repeat),
+        "get_series": (lambda: run(price_cache.get_series(market.secids[0])), args.repeat),
+    }
+
+    from utils.stats import calc_stats
+    out["calc_stats"] = (lambda: calc_stats(idx_ser, imoex), args.repeat)
+
+    try:
+        from utils.dataset import make_dataset
+        from utils.catboost import fit_catboost, forecast_catboost
+    except ImportError as e:
+        print(f"skip make_dataset/forecast_catboost: {e}")
+    else:
+        reg = QUICK_REG if args.quick else None
+        df, garch_fit = make_dataset(pf, imoex)
+        cb, feats = fit_catboost(df, reg)
+        out["make_dataset"] = (lambda: make_dataset(pf, imoex), args.repeat_slow)
+        out["fit_catboost"] = (lambda: fit_catboost(df, reg), args.repeat_slow)
+        out["forecast_catboost"] = (
+            lambda: forecast_catboost(df, garch_fit, cb, feats, args.horizon), args.repeat_slow
+        )
+
+        from utils.garch import simulate_returns, risk_metrics, fan
+
+        def garch_simulate():
+            paths = simulate_returns(garch_fit, args.horizon)
+            return risk_metrics(paths), fan(paths, float(pf.iloc[-1]))
+
+        out["garch_simulate"] = (garch_simulate, args.repeat)
+
+    try:
+        from utils.report import generate_report
+    except ImportError as e:
+        print(f"skip generate_report: {e}")
+    else:
+        tmp = tempfile.NamedTemporaryFile(suffix=".html", delete=False).name
+        out["generate_report"] = (lambda: generate_report(pf, imoex, tmp), args.repeat_slow)
+
+    if args.only:
+        out = {k: v for k, v in out.items() if k in args.only}
+    return out
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> list[str]:
+    bad = []
+    for name, res in results.items():
+        base = baseline.get("results", {}).get(name)
+        if not base:
+            continue
+        ratio = res["median_s"] / base["median_s"] if base["median_s"] else 1.0
+        flag = "REGRESSION" if ratio > 1 + tolerance else ""
+        print(f"  {name:20s} {base['median_s']:9.4f}s → {res['median_s']:9.4f}s  ×{ratio:5.2f} {flag}")
+        if flag:
+            bad.append(name)
+    return bad
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--secs", type=int, default=50, help="бумаг на рынке")
+    ap.add_argument("--years", type=float, default=5, help="лет истории")
+    ap.add_argument("--seed", type=int, default=42)
+    ap.add_argument("--index-size", type=int, default=30, help="бумаг в индексе")
+    ap.add_argument("--portfolio-size", type=int, default=5, help="бумаг в портфеле для прогноза/отчёта")
+    ap.add_argument("--horizon", type=int, default=60)
+    ap.add_argument("--repeat", type=int, default=5)
+    ap.add_argument("--repeat-slow", type=int, default=2, help="повторов для ML-замеров")
+    ap.add_argument("--quick", action="store_true", help="облегчённые параметры CatBoost")
+    ap.add_argument("--only", nargs="*", help="запустить только эти замеры")
+    ap.add_argument("--out", type=Path, default=HERE / "results.json")
+    ap.add_argument("--baseline", type=Path, default=BASELINE)
+    ap.add_argument("--update-baseline", action="store_true")
+    ap.add_argument("--tolerance", type=float, default=0.3)
+    args = ap.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        market = _setup(tmp, args)
+        results = {}
+        for name, (fn, repeat) in benches(market, args).items():
+            results[name] = _time(fn, repeat)
+            print(f"{name:20s} median {results[name]['median_s']:.4f}s  min {results[name]['min_s']:.4f}s")
+
+    doc = {
+        "meta": {
+            "date": str(date.today()),
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            "cpu_count": os.cpu_count(),
+            "scale": {"secs": args.secs, "years": args.years, "seed": args.seed,
+                      "index_size": args.index_size, "portfolio_size": args.portfolio_size,
+                      "quick": args.quick},
+        },
+        "results": results,
+    }
+    args.out.write_text(json.dumps(doc, indent=2))
+    if args.update_baseline:
+        args.baseline.write_text(json.dumps(doc, indent=2))
+        print(f"baseline written to {args.baseline}")
+        return
+    if args.baseline.exists():
+        baseline = json.loads(args.baseline.read_text())
+        if baseline["meta"]["scale"] != doc["meta"]["scale"]:
+            print("baseline scale differs, comparison skipped")
+            return
+        sys.exit(1 if compare(results, baseline, args.tolerance) else 0)
+
+
+if __name__ == "__main__":
+    main()
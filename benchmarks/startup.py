@@ -0,0 +1,92 @@
+"""Замер времени холодного старта API: `import main` в чистом интерпретаторе.
+
+    python benchmarks/startup.py            # сравнить с baseline, код 1 при регрессии
+    python benchmarks/startup.py --update   # записать новый baseline
+
+Также печатает самые дорогие импорты (по `-X importtime`) и следит, чтобы
+тяжёлый ML-стек не попадал в старт воркера.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+APP = ROOT / "app"
+BASELINE = Path(__file__).resolve().parent / "startup_baseline.json"
+HEAVY = ("torch", "lightning", "pytorch_forecasting", "catboost", "arch", "ta", "quantstats")
+
+PROBE = (
+    "import sys, time; t = time.perf_counter(); import main; "
+    "print(time.perf_counter() - t); "
+    f"print(','.join(m for m in {HEAVY!r} if m in sys.modules))"
+)
+
+
+def _env(db_dir: str) -> dict:
+    return {**os.environ, "DB_URL": f"sqlite:///{db_dir}/startup.sqlite3", "WARMUP": "false"}
+
+
+def measure(runs: int) -> dict:
+    with tempfile.TemporaryDirectory() as tmp:
+        times, heavy = [], ""
+        for _ in range(runs):
+            t0 = time.perf_counter()
+            out = subprocess.run(
+                [sys.executable, "-c", PROBE], cwd=APP, env=_env(tmp),
+                capture_output=True, text=True, check=True,
+            ).stdout.split("\n")
+            times.append({"import_main": float(out[0]), "process": time.perf_counter() - t0})
+            heavy = out[1]
+        top = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", "import main"], cwd=APP, env=_env(tmp),
+            capture_output=True, text=True, check=True,
+        ).stderr
+    rows = []
+    for line in top.splitlines()[1:]:
+        _, cum, name = line.split("|")
+        rows.append((int(cum) / 1e6, name.rstrip()))
+    return {
+        "import_main_s": statistics.median(t["import_main"] for t in times),
+        "process_s": statistics.median(t["process"] for t in times),
+        "heavy_loaded": [m for m in heavy.split(",") if m],
+        "top_imports": [{"module": n.strip(), "cumulative_s": round(c, 4)}
+                        for c, n in sorted(rows, reverse=True)[:15]],
+    }
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--runs", type=int, default=5)
+    ap.add_argument("--tolerance", type=float, default=0.25, help="допустимый рост относительно baseline")
+    ap.add_argument("--update", action="store_true", help="перезаписать baseline")
+    args = ap.parse_args()
+
+    res = measure(args.runs)
+    print(f"import main: {res['import_main_s']:.3f}s, process: {res['process_s']:.3f}s")
+    for row in res["top_imports"]:
+        print(f"  {row['cumulative_s']:8.3f}s  {row['module']}")
+
+    failed = False
+    if res["heavy_loaded"]:
+        print(f"FAIL: heavy modules imported at startup: {res['heavy_loaded']}")
+        failed = True
+    if args.update:
+        BASELINE.write_text(json.dumps(res, indent=2))
+        print(f"baseline written to {BASELINE}")
+    elif BASELINE.exists():
+        base = json.loads(BASELINE.read_text())["import_main_s"]
+        limit = base * (1 + args.tolerance)
+        if res["import_main_s"] > limit:
+            print(f"FAIL: import main {res['import_main_s']:.3f}s > {limit:.3f}s (baseline {base:.3f}s)")
+            failed = True
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+"""Синтетические данные MOEX заданного масштаба (бумаги × годы) для бенчмарков и стендов.
+
+Цены — геометрическое броуновское движение с общим рыночным фактором, IMOEX —
+взвешенная по капитализации корзина тех же бумаг. Всё детерминировано по seed.
+"""
+import zlib
+from dataclasses import dataclass
+from datetime import date, timedelta
+
+import numpy as np
+import pandas as pd
+
+
+@dataclass
+class SyntheticMarket:
+    secids: list[str]
+    dates: np.ndarray            # datetime.date, торговые дни
+    closes: np.ndarray           # (даты × бумаги)
+    shares_out: np.ndarray       # (бумаги,)
+    free_float: np.ndarray       # (бумаги,) в процентах
+    div_yield: np.ndarray        # (бумаги,) в процентах
+    imoex: np.ndarray            # (даты,)
+
+    def prices_frame(self) -> pd.DataFrame:
+        """Длинная таблица (secid, date, close)."""
+        n_d, n_s = self.closes.shape
+        return pd.DataFrame({
+            "secid": np.tile(self.secids, n_d),
+            "date": np.repeat(self.dates, n_s),
+            "close": self.closes.ravel(),
+        })
+
+    def series(self, secid: str) -> pd.DataFrame:
+        j = self.secids.index(secid)
+        return pd.DataFrame({"date": self.dates, "close": self.closes[:, j]})
+
+    def cap_table(self, year: int, quarter: int) -> pd.DataFrame:
+        """Таблица капитализации на первый торговый день квартала (как страница s26)."""
+        start = date(year, 3 * quarter - 2, 1)
+        i = min(int(np.searchsorted(self.dates, start)), len(self.dates) - 1)
+        price = self.closes[i]
+        return pd.DataFrame({
+            "secid": self.secids,
+            "name": [f"ПАО {s}" for s in self.secids],
+            "state_reg": [state_reg(s) for s in self.secids],
+            "shares_out": self.shares_out,
+            "price": price,
+            "cap": price * self.shares_out,
+        })
+
+    def quarters(self) -> list[tuple[int, int]]:
+        q = {(d.year, (d.month - 1) // 3 + 1) for d in self.dates}
+        return sorted(q)
+
+
+def state_reg(secid: str) -> str:
+    return f"1-01-{zlib.crc32(secid.encode()) % 100000:05d}-A"
+
+
+def make_market(n_secs: int = 50, years: float = 5, seed: int = 42, end: date | None = None) -> SyntheticMarket:
+    rng = np.random.default_rng(seed)
+    end = end or date.today()
+    dates = pd.bdate_range(end - timedelta(days=int(365.25 * years)), end).date
+    n_d = len(dates)
+
+    market = rng.standard_t(5, n_d) * 0.01
+    beta = rng.uniform(0.5, 1.5, n_secs)
+    idio = rng.standard_t(5, (n_d, n_secs)) * rng.uniform(0.01, 0.025, n_secs)
+    rets = np.clip(market[:, None] * beta + idio, -0.5, 0.5)
+    start = rng.uniform(10, 5000, n_secs)
+    closes = np.round(start * np.cumprod(1 + rets, axis=0), 4)
+
+    shares = rng.integers(10**7, 10**10, n_secs)
+    caps = closes * shares
+    imoex = 3000 * (caps.sum(axis=1) / caps[0].sum())
+
+    return SyntheticMarket(
+        secids=[f"S{j:03d}" for j in range(n_secs)],
+        dates=np.asarray(dates),
+        closes=closes,
+        shares_out=shares,
+        free_float=np.round(rng.uniform(5, 90, n_secs), 1),
+        div_yield=np.round(rng.uniform(0, 15, n_secs), 2),
+        imoex=np.round(imoex, 2),
+    )
+
+
+def seed_db(m: SyntheticMarket, engine) -> None:
+    """Залить рынок в таблицы кэша (Price, ImoexPrice, ImoexFetched, Capitalization, FreeFloat, DividendYield)."""
+    from sqlmodel import SQLModel
+    from models import Price, ImoexPrice, ImoexFetched, Capitalization, FreeFloat, DividendYield
+
+    SQLModel.metadata.create_all(engine)
+    prices = m.prices_frame()
+    caps = pd.concat(
+        [m.cap_table(y, q).assign(year=y, quarter=q) for y, q in m.quarters()], ignore_index=True
+    )
+    today = date.today()
+    with engine.begin() as conn:
+        conn.execute(Price.__table__.insert(), [
+            {"secid": s, "trade_date": d, "close": float(c)}
+            for s, d, c in zip(prices.secid, prices.date, prices.close)
+        ])
+        conn.execute(ImoexPrice.__table__.insert(), [
+            {"date": d, "close": float(c)} for d, c in zip(m.dates, m.imoex)
+        ])
+        conn.execute(ImoexFetched.__table__.insert(), [{"start": m.dates[0], "end": m.dates[-1]}])
+        conn.execute(Capitalization.__table__.insert(), caps[
+            ["year", "quarter", "secid", "name", "state_reg", "shares_out", "price", "cap"]
+        ].to_dict(orient="records"))
+        conn.execute(FreeFloat.__table__.insert(), [
+            {"date": today, "secid": s, "free_float": float(f)} for s, f in zip(m.secids, m.free_float)
+        ])
+        conn.execute(DividendYield.__table__.insert(), [
+            {"year": 2020, "state_reg": state_reg(s), "div_yield": float(y), "loaded_at": today}
+            for s, y in zip(m.secids, m.div_yield)
+        ])
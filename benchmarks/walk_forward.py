@@ -0,0 +1,276 @@
+"""Walk-forward оценка моделей прогноза: точность против времени и памяти.
+
+    python benchmarks/walk_forward.py                                   # fast и fast-quick, 8 портфелей × 6 срезов
+    python benchmarks/walk_forward.py --config fast-lite=fast,reg.iterations=300,clf.iterations=500
+    python benchmarks/walk_forward.py --config quality=quality,tft.max_epochs=10 --workers 2
+
+Для каждого портфеля синтетического рынка и каждой даты среза модель обучается на
+истории по срез и прогнозирует --horizon дней вперёд; прогноз сравнивается с тем,
+что было на самом деле. Фолды (конфигурация × портфель × срез) идут в пуле процессов,
+у каждого воркера --threads потоков для CatBoost/torch.
+
+Конфигурация — NAME=MODEL[,секция.ключ=значение…]: MODEL — fast (GARCH + CatBoost)
+или quality (TFT); секции reg/clf/tft накладываются поверх default_params_reg,
+default_params_clf и параметров fit_tft. Значения разбираются как JSON (300, 0.05, "RMSE").
+
+Метрики фолда: MAPE траектории, ошибка доходности за горизонт, доля факта внутри
+95%-полосы, Brier-score вероятности роста (классификатор и симуляции GARCH — только fast),
+время обучения+прогноза и пиковый RSS процесса за фолд. Сводка по конфигурациям
+печатается и пишется в benchmarks/walk_forward.json вместе со всеми фолдами.
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import statistics
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import date
+from pathlib import Path
+
+HERE = Path(__file__).resolve().parent
+APP = HERE.parent / "app"
+
+DEFAULT_CONFIGS = ("fast=fast", "fast-quick=fast,reg.iterations=100,reg.depth=6,clf.iterations=100,clf.depth=6")
+
+_MARKET = None
+_THREADS = 1
+
+
+def parse_config(text: str) -> tuple[str, dict]:
+    """«fast-lite=fast,reg.iterations=300» → ("fast-lite", {"model": "fast", "reg": {"iterations": 300}})."""
+    name, _, rest = text.partition("=")
+    model, *overrides = rest.split(",")
+    if model not in ("fast", "quality"):
+        raise argparse.ArgumentTypeError(f"{name}: model must be fast or quality, got {model!r}")
+    spec = {"model": model}
+    for item in overrides:
+        key, _, raw = item.partition("=")
+        section, _, param = key.partition(".")
+        if section not in ("reg", "clf", "tft") or not param:
+            raise argparse.ArgumentTypeError(f"{name}: bad override {item!r}")
+        try:
+            value = json.loads(raw)
+        except json.JSONDecodeError:
+            value = raw
+        spec.setdefault(section, {})[param] = value
+    return name, spec
+
+
+# --- пиковая память фолда ---
+
+def _reset_peak() -> bool:
+    """Сбросить VmHWM процесса (Linux ≥ 4.0); False — пик накапливается с начала воркера."""
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+        return True
+    except OSError:
+        return False
+
+
+def _peak_mb() -> float:
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    import resource
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss / 2**20 if sys.platform == "darwin" else rss / 1024
+
+
+# --- воркер ---
+
+def _init(market, threads: int):
+    global _MARKET, _THREADS
+    sys.path[:0] = [str(APP), str(HERE)]
+    _MARKET, _THREADS = market, threads
+    # ML-стек грузится до первого фолда, чтобы импорт не попадал в его время
+    import utils.dataset, utils.catboost  # noqa: F401
+    try:
+        import utils.tft  # noqa: F401
+    except ImportError:
+        pass
+
+
+def _series(assets: dict[str, int]):
+    import pandas as pd
+
+    m = _MARKET
+    cols = [m.secids.index(s) for s in assets]
+    index = pd.to_datetime(m.dates)
+    pf = pd.Series(m.closes[:, cols] @ list(assets.values()), index=index)
+    return pf, pd.Series(m.imoex, index=index)
+
+
+def _predict(spec: dict, pf, imoex, horizon: int) -> tuple:
+    """(forecast, lo95, hi95, p_up_clf, p_up_garch) для конфигурации *spec*."""
+    if spec["model"] == "quality":
+        from utils.tft import fit_tft, forecast_tft, default_params
+
+        params = {**default_params, **spec.get("tft", {})}
+        model, ds, enc_df = fit_tft(pf, imoex, horizon, horizon, params=params, threads=_THREADS)
+        return (*forecast_tft(model, ds, enc_df, horizon), None, None)
+
+    from utils.dataset import make_dataset
+    from utils.garch import simulate_returns, risk_metrics
+    from utils.catboost import (
+        fit_catboost, forecast_catboost, fit_predict_catboost_clf, default_params_reg, default_params_clf,
+    )
+
+    df, garch_fit = make_dataset(pf, imoex)
+    paths = simulate_returns(garch_fit, horizon)
+    cb, feats = fit_catboost(df, {**default_params_reg, **spec.get("reg", {})}, thread_count=_THREADS)
+    fc, lo, hi = forecast_catboost(df, garch_fit, cb, feats, horizon, thread_count=_THREADS, paths=paths)
+    p_clf = fit_predict_catboost_clf(df, {**default_params_clf, **spec.get("clf", {})}, thread_count=_THREADS)
+    return fc, lo, hi, float(p_clf), risk_metrics(paths)[f"P_up_{horizon}d"]
+
+
+def run_fold(config: str, spec: dict, portfolio: int, assets: dict[str, int], cut: int, horizon: int) -> dict:
+    import numpy as np
+
+    pf, imoex = _series(assets)
+    train, actual = pf.iloc[: cut + 1], pf.iloc[cut + 1: cut + 1 + horizon].to_numpy()
+    peak_reset = _reset_peak()
+    t0 = time.perf_counter()
+    fc, lo, hi, p_clf, p_garch = _predict(spec, train, imoex.iloc[: cut + 1], horizon)
+    wall = time.perf_counter() - t0
+
+    fc, lo, hi = (np.asarray(a, dtype=float)[: len(actual)] for a in (fc, lo, hi))
+    p0 = float(train.iloc[-1])
+    up = float(actual[-1] > p0)
+    return {
+        "config": config,
+        "portfolio": portfolio,
+        "cutoff": str(train.index[-1].date()),
+        "mape": float(np.mean(np.abs(fc - actual) / actual)),
+        "ret_err": float(abs(fc[-1] - actual[-1]) / p0),
+        "coverage95": float(np.mean((actual >= lo) & (actual <= hi))),
+        "brier_clf": None if p_clf is None else (p_clf - up) ** 2,
+        "brier_garch": None if p_garch is None else (p_garch - up) ** 2,
+        "wall_s": wall,
+        "peak_rss_mb": _peak_mb(),
+        "peak_reset": peak_reset,
+    }
+
+
+# --- сводка ---
+
+def summarize(folds: list[dict]) -> dict:
+    out = {}
+    for config in dict.fromkeys(f["config"] for f in folds):
+        rows = [f for f in folds if f["config"] == config]
+
+        def mean(key):
+            vals = [r[key] for r in rows if r[key] is not None]
+            return statistics.fmean(vals) if vals else None
+
+        out[config] = {
+            "folds": len(rows),
+            **{k: mean(k) for k in ("mape", "ret_err", "coverage95", "brier_clf", "brier_garch")},
+            "wall_median_s": statistics.median(r["wall_s"] for r in rows),
+            "wall_total_s": sum(r["wall_s"] for r in rows),
+            "peak_rss_median_mb": statistics.median(r["peak_rss_mb"] for r in rows),
+            "peak_rss_max_mb": max(r["peak_rss_mb"] for r in rows),
+        }
+    return out
+
+
+def _print(summary: dict):
+    cols = ("mape", "ret_err", "coverage95", "brier_clf", "brier_garch", "wall_median_s", "peak_rss_max_mb")
+    print(f"{'config':16s} {'folds':>5s} " + " ".join(f"{c:>14s}" for c in cols))
+    for name, s in summary.items():
+        cells = ("—" if s[c] is None else f"{s[c]:.4f}" for c in cols)
+        print(f"{name:16s} {s['folds']:5d} " + " ".join(f"{c:>14s}" for c in cells))
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--secs", type=int, default=20, help="бумаг на рынке")
+    ap.add_argument("--years", type=float, default=5, help="лет истории")
+    ap.add_argument("--seed", type=int, default=42)
+    ap.add_argument("--portfolios", type=int, default=8)
+    ap.add_argument("--portfolio-size", type=int, default=5, help="бумаг в портфеле")
+    ap.add_argument("--folds", type=int, default=6, help="срезов на портфель")
+    ap.add_argument("--min-train", type=int, default=500, help="торговых дней истории до первого среза")
+    ap.add_argument("--horizon", type=int, default=60)
+    ap.add_argument("--config", action="append", type=parse_config, help="NAME=MODEL[,секция.ключ=значение…]")
+    ap.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    ap.add_argument("--threads", type=int, help="потоков на воркер (по умолчанию CPU / workers)")
+    ap.add_argument("--out", type=Path, default=HERE / "walk_forward.json")
+    args = ap.parse_args()
+
+    configs = dict(args.config or [parse_config(c) for c in DEFAULT_CONFIGS])
+    threads = args.threads or max(1, (os.cpu_count() or 1) // args.workers)
+
+    sys.path.insert(0, str(HERE))
+    from synthetic import make_market
+
+    # конец рынка фиксируется здесь, чтобы прогоны в разные дни были сравнимы при том же seed
+    market = make_market(args.secs, args.years, args.seed, end=date(2025, 12, 31))
+    n_days = len(market.dates)
+    last = n_days - 1 - args.horizon
+    if last < args.min_train:
+        sys.exit(f"history too short: {n_days} days for --min-train {args.min_train} + --horizon {args.horizon}")
+    step = max(1, (last - args.min_train) // max(1, args.folds - 1))
+    cutoffs = list(range(last, args.min_train - 1, -step))[: args.folds][::-1]
+
+    rng = random.Random(args.seed)
+    size = min(args.portfolio_size, len(market.secids))
+    portfolios = [
+        {s: rng.randint(1, 100) for s in rng.sample(market.secids, size)} for _ in range(args.portfolios)
+    ]
+    tasks = [
+        (name, spec, i, assets, cut, args.horizon)
+        for name, spec in configs.items()
+        for i, assets in enumerate(portfolios)
+        for cut in cutoffs
+    ]
+    print(f"{len(tasks)} folds ({len(configs)} configs × {len(portfolios)} portfolios × {len(cutoffs)} cutoffs), "
+          f"{args.workers} workers × {threads} threads")
+
+    folds, skipped, t0 = [], set(), time.perf_counter()
+    with ProcessPoolExecutor(args.workers, initializer=_init, initargs=(market, threads)) as pool:
+        futures = {pool.submit(run_fold, *task): task for task in tasks}
+        for fut in as_completed(futures):
+            name, _, i, _, cut, _ = futures[fut]
+            try:
+                folds.append(fut.result())
+            except ImportError as e:
+                if name not in skipped:
+                    skipped.add(name)
+                    print(f"skip {name}: {e}")
+                continue
+            print(f"  {name:16s} portfolio {i:2d} cutoff {market.dates[cut]}  {folds[-1]['wall_s']:7.2f}s")
+    elapsed = time.perf_counter() - t0
+    folds.sort(key=lambda f: (f["config"], f["portfolio"], f["cutoff"]))
+
+    summary = summarize(folds) if folds else {}
+    _print(summary)
+    print(f"wall time {elapsed:.1f}s")
+    doc = {
+        "meta": {
+            "date": str(date.today()),
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            "cpu_count": os.cpu_count(),
+            "workers": args.workers,
+            "threads": threads,
+            "elapsed_s": elapsed,
+            "scale": {"secs": args.secs, "years": args.years, "seed": args.seed, "portfolios": args.portfolios,
+                      "portfolio_size": size, "folds": len(cutoffs), "horizon": args.horizon},
+            "configs": configs,
+        },
+        "summary": summary,
+        "folds": folds,
+    }
+    args.out.write_text(json.dumps(doc, indent=2, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,13 +1,17 @@
-import streamlit as st, requests, pandas as pd, datetime as dt, altair as alt
+import streamlit as st, pandas as pd, datetime as dt, altair as alt
+import api_client as api
 
 
-BASE = "http://localhost:8000/api"
+CHART_POINTS = 1000
 
 weightings = {
     "equal": "Равные веса",
     "market_cap": "По капитализации",
     "cap_freefloat": "Капитализация × Free‑float",
-    "cap_divyield": "Капитализация × Дивдоходность"
+    "cap_divyield": "Капитализация × Дивдоходность",
+    "min_variance": "Минимальная дисперсия",
+    "risk_parity": "Паритет риска",
+    "max_diversification": "Максимальная диверсификация",
 }
 weightings_inv = {v: k for k, v in weightings.items()}
 metrics_map = {
@@ -22,7 +26,7 @@ metrics_map = {
     "te": "Трек-ошибка (Tracking Error)",
     "ir": "Коэффициент информации (Information Ratio)"
 }
-for k, v in {"report_ready": False, "report_bytes":  None}.items():
+for k, v in {"show_series": False, "show_stats": False, "forecast_req": None}.items():
     st.session_state.setdefault(k, v)
 
 st.set_page_config(page_title="MOEX Index Lab", layout="wide")
@@ -34,15 +38,27 @@ with tabs[0]:
     st.subheader("Найти индекс")
     query = st.text_input("Поиск по ID или названию", placeholder="MOEX_Utilities")
     if st.button("🔍 Найти"):
-        r = requests.get(f"{BASE}/index/indices", params={"q": query})
-        if r.ok:
-            res_df = pd.DataFrame(r.json())
+        st.session_state["search"] = {"q": query, "cursors": [None], "total": None}
+    if search := st.session_state.get("search"):
+        try:
+            res_df, next_cursor, total = api.find_indices(search["q"], search["cursors"][-1])
+        except api.ApiError as e:
+            st.error(str(e))
+        else:
+            search["total"] = total if total is not None else search["total"]
             if res_df.empty:
                 st.info("Ничего не найдено")
             else:
+                page = len(search["cursors"])
+                st.caption(f"Найдено: {search['total']} · страница {page}")
                 st.dataframe(res_df[["id", "name", "base_date", "weighting"]])
-        else:
-            st.error(r.text)
+                colPrev, colNext = st.columns(2)
+                if page > 1 and colPrev.button("← Назад"):
+                    search["cursors"].pop()
+                    st.rerun()
+                if next_cursor and colNext.button("Дальше →"):
+                    search["cursors"].append(next_cursor)
+                    st.rerun()
 
     st.markdown("---")
 
@@ -57,9 +73,7 @@ with tabs[0]:
 
     if st.button("Получить данные"):
         with st.spinner("Загружается список бумаг…"):
-            r = requests.get(f"{BASE}/securities", params={"year": Y, "quarter": Q})
-            r.raise_for_status()
-            st.session_state["securities_df"] = pd.DataFrame(r.json(), columns=["ID", "Name"])
+            st.session_state["securities_df"] = api.securities(int(Y), Q)
 
     if not st.session_state["securities_df"].empty:
         df_sec = st.session_state["securities_df"]
@@ -81,51 +95,59 @@ with tabs[0]:
                 "weighting": w_type,
                 "securities": [{"secid": s} for s in selected_ids],
             }
-            res = requests.post(f"{BASE}/index", json=payload)
-            if res.ok:
-                info = res.json()
+            try:
+                info = api.create_index(payload)
+            except api.ApiError as e:
+                st.error(str(e))
+            else:
                 st.session_state["index_id"] = info["id"]
+                st.session_state.show_series = st.session_state.show_stats = False
                 st.success(f"Индекс создан, ID={info['id']}, базовое значение={info['base_value']:.2f}")
-            else:
-                st.error(res.text)
 
     if "index_id" in st.session_state:
+        index_id = st.session_state["index_id"]
         colF, colT = st.columns(2)
         d_from = colF.date_input("С", value=dt.date.today() - dt.timedelta(days=30))
         d_till = colT.date_input("По", value=dt.date.today())
-        if st.button("Показать динамику"):
-            with st.spinner("Расчёт…"):
-                s = requests.get(
-                    f"{BASE}/index/{st.session_state['index_id']}/series",
-                    params={"from": str(d_from), "till": str(d_till)},
+        colS, colP = st.columns(2)
+        if colS.button("Показать динамику"):
+            st.session_state.show_series = True
+        if colP.button("Паспорт индекса"):
+            st.session_state.show_stats = True
+
+        # независимые панели грузятся параллельно; при неизменных входах — из кэша
+        calls = {}
+        if st.session_state.show_series:
+            calls["series"] = (api.index_series, index_id, d_from, d_till, CHART_POINTS)
+        if st.session_state.show_stats:
+            calls["stats"] = (api.index_stats, index_id)
+        with st.spinner("Расчёт…"):
+            panels = dict(zip(calls, api.parallel(*calls.values())))
+
+        if "series" in panels:
+            df = panels["series"]
+            if isinstance(df, api.ApiError):
+                st.warning(str(df))
+            elif not df.empty:
+                left, right = st.columns(2)
+
+                left.subheader(st.session_state.get("index_name", "Ваш индекс"))
+                left.line_chart(
+                    df[["value"]].rename(columns={"value": st.session_state.get("index_name", "index")}),
+                    use_container_width=True
                 )
-                if s.ok and s.json():
-                    df = pd.DataFrame(s.json())
-                    df["date"] = pd.to_datetime(df["date"])
-                    df = df.set_index("date")
-
-                    left, right = st.columns(2)
-
-                    left.subheader(st.session_state.get("index_name", "Ваш индекс"))
-                    left.line_chart(
-                        df[["value"]].rename(columns={"value": st.session_state.get("index_name", "index")}),
-                        use_container_width=True
-                    )
-
-                    right.subheader("IMOEX")
-                    right.line_chart(
-                        df[["imoex"]].rename(columns={"imoex": "IMOEX"}),
-                        use_container_width=True
-                    )
-                else:
-                    st.warning(s.text)
 
-    if "index_id" in st.session_state:
-        if st.button("Паспорт индекса"):
-            r = requests.get(f"{BASE}/index/{st.session_state['index_id']}/stats")
-            if r.ok:
-                stats = r.json()
+                right.subheader("IMOEX")
+                right.line_chart(
+                    df[["imoex"]].rename(columns={"imoex": "IMOEX"}),
+                    use_container_width=True
+                )
 
+        if "stats" in panels:
+            stats = panels["stats"]
+            if isinstance(stats, api.ApiError):
+                st.error(str(stats))
+            else:
                 with st.expander("Основные характеристики", expanded=True):
                     col1, col2, col3 = st.columns(3)
                     col1.metric("YTD", f"{stats['performance']['ytd']:.2%}")
@@ -141,8 +163,6 @@ with tabs[0]:
                 with col22:
                     with st.expander("Относительно IMOEX"):
                         st.table(pd.Series(stats['vs_imoex']).to_frame("value").rename(metrics_map))
-            else:
-                st.error(r.text)
 
 with tabs[1]:
     st.header("🔮Прогнозирование доходности портфеля")
@@ -171,46 +191,46 @@ with tabs[1]:
         model_code = "fast" if model_choice.startswith("Быстрее") else "quality"
 
         if st.button("Смоделировать", disabled=not weights):
-            payload = {"assets": [{"secid": s, "shares": n} for s, n in weights.items()],
-                       "model": model_code}
-            with st.spinner("Обучаем модель..."):
-                r = requests.post(f"{BASE}/forecast", json=payload)
-            if r.ok:
-                data = r.json()
-                df_h = pd.DataFrame(data["history"], columns=["date", "value"]).set_index("date")
-                df_f = pd.DataFrame(data["forecast"], columns=["date", "value"]).set_index("date")
-                df_lo = pd.DataFrame(data["lo95"], columns=["date", "value"]).set_index("date")
-                df_hi = pd.DataFrame(data["hi95"], columns=["date", "value"]).set_index("date")
+            st.session_state.forecast_req = (tuple(weights.items()), model_code)
+
+        if st.session_state.forecast_req:
+            assets, model_code = st.session_state.forecast_req
+            with st.spinner("Обучаем модель и создаём отчёт..."):
+                fc_res, report_res = api.parallel(
+                    (api.forecast, assets, model_code),
+                    (api.report, assets),
+                )
+            if isinstance(fc_res, api.ApiError):
+                st.error(str(fc_res))
+            else:
+                frame, metrics = fc_res
+                df_h = frame["history"].dropna().rename("value").to_frame()
+                df_f = frame[["forecast", "lo95", "hi95", "p25", "p75"]].dropna().reset_index()
 
                 left, right = st.columns(2)
                 left.subheader("История портфеля")
                 left.line_chart(df_h)
 
                 right.subheader("Прогноз на 60 торговых дней")
-                base = alt.Chart(df_f.reset_index()).encode(x="date:T")
-                band = alt.Chart(
-                    pd.concat([df_lo, df_hi], axis=1, keys=["lo", "hi"]).reset_index()
-                ).mark_area(opacity=0.2).encode(x="date:T", y="lo:Q", y2="hi:Q")
-                line = base.mark_line(color="#1f77b4").encode(y="value:Q")
-                right.altair_chart(band + line, use_container_width=True)
-
-                col1, col2, col3 = st.columns(3)
-                col1.metric("Среднегодовая волатильность", f"{data['metrics']['annual_volatility']:.2%}")
-                col2.metric("VaR 95%", f"{data['metrics']['VaR_95']:.2%}")
-                col3.metric("Вероятность роста портфеля через 60 дней", f"{data['metrics']['P_up_60d']:.1%}")
+                base = alt.Chart(df_f).encode(x="date:T")
+                band = base.mark_area(opacity=0.2).encode(y="lo95:Q", y2="hi95:Q")
+                fan = base.mark_area(opacity=0.3, color="#ff7f0e").encode(y="p25:Q", y2="p75:Q")
+                line = base.mark_line(color="#1f77b4").encode(y="forecast:Q")
+                right.altair_chart(band + fan + line, use_container_width=True)
+                right.caption("Оранжевым — 50% траекторий симуляции GARCH")
+
+                col1, col2, col3, col4 = st.columns(4)
+                col1.metric("Среднегодовая волатильность", f"{metrics['annual_volatility']:.2%}")
+                col2.metric("VaR 95% (день)", f"{metrics['VaR_95']:.2%}")
+                col3.metric("CVaR 95% за 60 дней", f"{metrics['CVaR_95_60d']:.2%}")
+                col4.metric("Вероятность роста портфеля через 60 дней", f"{metrics['P_up_60d']:.1%}")
+
+            if isinstance(report_res, api.ApiError):
+                st.error(str(report_res))
             else:
-                st.error(r.text)
-
-            with st.spinner("Создаём отчёт..."):
-                r = requests.post(f"{BASE}/report", json=payload)
-                r.raise_for_status()
-                st.session_state.report_bytes = r.content
-                st.session_state.report_ready = True
-
-        if st.session_state.report_ready:
-            st.download_button(
-                "Скачать отчёт",
-                data=st.session_state.report_bytes,
-                file_name="portfolio_report.html",
-                mime="text/html",
-            )
+                st.download_button(
+                    "Скачать отчёт",
+                    data=report_res,
+                    file_name="portfolio_report.html",
+                    mime="text/html",
+                )
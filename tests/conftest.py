@@ -0,0 +1,21 @@
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+import pytest
+
+# модули приложения импортируются так же, как при запуске из каталога app
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "app"))
+# своя SQLite-база на прогон: тесты не трогают db.sqlite3
+os.environ["DB_URL"] = f"sqlite:///{tempfile.mkdtemp()}/test.sqlite3"
+os.environ["UPSTREAM_URL"] = "http://127.0.0.1:9"  # случайный запрос к MOEX сразу падает, а не уходит в сеть
+
+
+@pytest.fixture(scope="session")
+def db():
+    import models  # noqa: F401 — таблицы регистрируются в metadata при импорте
+    from database import create_db_and_tables, engine
+
+    create_db_and_tables()
+    return engine
@@ -0,0 +1,40 @@
+import numpy as np
+
+from services.backtest import chain_link
+
+
+def _basket_return(prices, units, t):
+    return (units @ prices[t]) / (units @ prices[t - 1])
+
+
+def test_chain_link_is_continuous_across_rebalances():
+    rng = np.random.default_rng(0)
+    prices = 100 * np.cumprod(1 + rng.normal(0, 0.02, (12, 3)), axis=0)
+    rebal = np.array([0, 4, 8])
+    weights = np.array([[0.5, 0.3, 0.2], [0.1, 0.1, 0.8], [1 / 3, 1 / 3, 1 / 3]])
+
+    values, divisors = chain_link(prices, rebal, weights)
+
+    assert values.shape == (12,)
+    # старт совпадает с compute_series: Σ w·P на первую дату
+    assert np.isclose(values[0], weights[0] @ prices[0])
+    units = weights / prices[rebal]
+    for k, r in enumerate(rebal[1:], start=1):
+        # в день ребалансировки ряд движется по старой корзине, на следующий — по новой: скачка нет
+        assert np.isclose(values[r] / values[r - 1], _basket_return(prices, units[k - 1], r))
+        assert np.isclose(values[r + 1] / values[r], _basket_return(prices, units[k], r + 1))
+    assert len(divisors) == len(rebal)
+
+
+def test_chain_link_flat_prices_give_flat_index():
+    prices = np.full((6, 2), 50.0)
+    values, _ = chain_link(prices, np.array([0, 3]), np.array([[0.9, 0.1], [0.2, 0.8]]))
+    assert np.allclose(values, 50.0)
+
+
+def test_chain_link_ignores_security_without_price_at_rebalance():
+    prices = np.array([[10.0, np.nan], [11.0, np.nan], [12.0, 20.0], [13.0, 22.0]])
+    values, _ = chain_link(prices, np.array([0, 2]), np.array([[0.5, 0.5], [0.5, 0.5]]))
+    # до появления цены вторая бумага не входит в корзину, её вес уходит первой
+    assert np.allclose(values[:3], [10.0, 11.0, 12.0])
+    assert np.isclose(values[3], 12.0 * (0.5 * 13 / 12 + 0.5 * 22 / 20))
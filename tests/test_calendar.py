@@ -0,0 +1,76 @@
+import asyncio
+import time
+from datetime import date, timedelta
+
+import pandas as pd
+import pytest
+
+from services import benchmark, calendar
+
+
+def _sessions(start: date, end: date, skip=()) -> list[date]:
+    return [d.date() for d in pd.bdate_range(start, end) if d.date() not in skip]
+
+
+@pytest.fixture
+def cal(monkeypatch):
+    def use(days, fetched):
+        c = calendar._build(days, fetched)
+        c.loaded_at = time.monotonic()
+        monkeypatch.setattr(calendar, "_cal", c)
+        return c
+    return use
+
+
+def test_holidays_only_inside_fetched_ranges(cal):
+    hole = {date(2024, 3, 4), date(2024, 3, 5)}       # дыра в кэше: отрезок не получен из ISS
+    holiday = {date(2024, 5, 1), date(2024, 5, 9)}
+    days = _sessions(date(2024, 1, 1), date(2024, 6, 28), hole | holiday)
+    c = cal(days, [(date(2024, 1, 1), date(2024, 2, 29)), (date(2024, 3, 6), date(2024, 6, 28))])
+    assert holiday <= c.holidays
+    assert not hole & c.holidays
+    assert calendar.is_trading_day(date(2024, 3, 4))
+    assert not calendar.is_trading_day(date(2024, 5, 1))
+
+
+def test_adjacent_ranges_are_merged(cal):
+    days = _sessions(date(2024, 1, 1), date(2024, 1, 31), {date(2024, 1, 15)})
+    c = cal(days, [(date(2024, 1, 1), date(2024, 1, 14)), (date(2024, 1, 15), date(2024, 1, 31))])
+    assert date(2024, 1, 15) in c.holidays
+
+
+def test_trading_days_matches_is_trading_day(cal):
+    holidays = {date(y, 1, 5) for y in (2021, 2022, 2023)} | {date(2023, 6, 12)}
+    days = _sessions(date(2021, 1, 1), date(2023, 12, 29), holidays) + [date(2023, 4, 29)]  # рабочая суббота
+    cal(days, [(date(2021, 1, 1), date(2023, 12, 29))])
+    start, end = date(2022, 12, 20), date(2024, 1, 10)
+    expected = [start + timedelta(days=k) for k in range((end - start).days + 1)]
+    expected = [d for d in expected if calendar.is_trading_day(d)]
+    got = calendar.trading_days(start, end)
+    assert got == expected
+    assert date(2023, 4, 29) in got
+    assert date(2024, 1, 5) not in got  # повторяющийся праздник вне истории
+
+
+def test_imoex_fills_cache_holes(db, monkeypatch):
+    calls = []
+
+    async def fake_fetch(d_from, d_till):
+        calls.append((d_from, d_till))
+        dates = _sessions(d_from, d_till)
+        return pd.DataFrame({"date": dates, "close": [3000.0] * len(dates)})
+
+    monkeypatch.setattr(benchmark, "_fetch_imoex_from_iss", fake_fetch)
+    d_from, d_till = date(2015, 3, 2), date(2015, 3, 31)
+    # кэш заполнен по краям, середина не скачана
+    benchmark._save_to_db(asyncio.run(fake_fetch(d_from, date(2015, 3, 6))), d_from, date(2015, 3, 6))
+    benchmark._save_to_db(asyncio.run(fake_fetch(date(2015, 3, 23), d_till)), date(2015, 3, 23), d_till)
+    calls.clear()
+
+    df = asyncio.run(benchmark.get_imoex_series(d_from, d_till))
+    assert calls == [(date(2015, 3, 7), date(2015, 3, 22))]
+    assert list(df["date"].dt.date) == _sessions(d_from, d_till)
+
+    calls.clear()
+    asyncio.run(benchmark.get_imoex_series(d_from, d_till))
+    assert calls == []
@@ -0,0 +1,98 @@
+import asyncio
+
+import pytest
+
+from config import settings
+from services.cpu_budget import CpuBudget, Overloaded, Priority
+
+
+def test_grant_is_capped_by_free_threads():
+    async def main():
+        b = CpuBudget(capacity=4)
+        async with b.acquire(Priority.FAST, want=3) as g1:
+            assert g1.threads == 3
+            async with b.acquire(Priority.INTERACTIVE, want=3) as g2:
+                assert g2.threads == 1
+                assert b.free == 0
+        assert b.free == 4
+
+    asyncio.run(main())
+
+
+def test_training_leaves_interactive_reserve(monkeypatch):
+    monkeypatch.setattr(settings, "CPU_INTERACTIVE_RESERVE", 1)
+
+    async def main():
+        b = CpuBudget(capacity=4)
+        async with b.acquire(Priority.TRAINING, want=4) as g:
+            assert g.threads == 3
+            async with b.acquire(Priority.INTERACTIVE, want=1) as r:
+                assert r.threads == 1
+
+    asyncio.run(main())
+
+
+def test_queue_is_served_by_priority(monkeypatch):
+    monkeypatch.setattr(settings, "CPU_QUEUE_TIMEOUT", 5)
+
+    async def main():
+        b = CpuBudget(capacity=2)
+        order = []
+
+        async def job(name, priority):
+            async with b.acquire(priority, want=2):
+                order.append(name)
+                await asyncio.sleep(0.01)
+
+        async with b.acquire(Priority.FAST, want=2):
+            tasks = [asyncio.create_task(job(n, p)) for n, p in (
+                ("training", Priority.TRAINING), ("fast", Priority.FAST), ("report", Priority.INTERACTIVE),
+            )]
+            await asyncio.sleep(0.01)
+            assert order == [] and b._waiting() == 3
+        await asyncio.gather(*tasks)
+        # отчёт раньше прогноза, прогноз раньше обучения — независимо от порядка прихода
+        assert order == ["report", "fast", "training"]
+        assert b.free == 2
+
+    asyncio.run(main())
+
+
+def test_queue_timeout_raises_overloaded(monkeypatch):
+    monkeypatch.setattr(settings, "CPU_QUEUE_TIMEOUT", 0.05)
+
+    async def main():
+        b = CpuBudget(capacity=1)
+        async with b.acquire(Priority.FAST, want=1):
+            with pytest.raises(Overloaded) as e:
+                async with b.acquire(Priority.INTERACTIVE, want=1):
+                    pass
+            assert e.value.retry_after >= 1
+            assert b._waiting() == 0
+        assert b.free == 1
+
+    asyncio.run(main())
+
+
+def test_full_queue_rejects_immediately(monkeypatch):
+    monkeypatch.setattr(settings, "CPU_QUEUE_MAX", 1)
+    monkeypatch.setattr(settings, "CPU_QUEUE_TIMEOUT", 5)
+
+    async def main():
+        b = CpuBudget(capacity=1)
+        async def queued():
+            async with b.acquire(Priority.FAST, want=1):
+                pass
+
+        async with b.acquire(Priority.FAST, want=1):
+            waiter = asyncio.create_task(queued())
+            await asyncio.sleep(0)
+            with pytest.raises(Overloaded):
+                async with b.acquire(Priority.INTERACTIVE, want=1):
+                    pass
+            waiter.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await waiter
+        assert b.free == 1
+
+    asyncio.run(main())
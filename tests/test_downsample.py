@@ -0,0 +1,43 @@
+import numpy as np
+import pytest
+
+from utils.downsample import downsample, lttb, minmax
+
+
+def _walk(n: int, seed: int = 0) -> np.ndarray:
+    return 100 + np.cumsum(np.random.default_rng(seed).normal(size=n))
+
+
+@pytest.mark.parametrize("n, n_out", [(1000, 3), (1000, 100), (1001, 37), (50, 49)])
+def test_lttb_count_and_ends(n, n_out):
+    idx = lttb(_walk(n), n_out)
+    assert len(idx) == n_out
+    assert idx[0] == 0 and idx[-1] == n - 1
+    assert (np.diff(idx) > 0).all()
+
+
+def test_lttb_keeps_spike():
+    y = np.zeros(1000)
+    y[537] = 10.0
+    assert 537 in lttb(y, 20)
+
+
+@pytest.mark.parametrize("n, n_out", [(1000, 3), (1000, 4), (1000, 100), (1001, 37), (50, 49)])
+def test_minmax_count_and_ends(n, n_out):
+    idx = minmax(_walk(n), n_out)
+    assert 2 <= len(idx) <= n_out
+    assert idx[0] == 0 and idx[-1] == n - 1
+    assert (np.diff(idx) > 0).all()
+
+
+def test_minmax_keeps_global_extremes():
+    y = _walk(5000, seed=1)
+    idx = minmax(y, 60)
+    assert y.argmin() in idx and y.argmax() in idx
+
+
+@pytest.mark.parametrize("method", ["lttb", "minmax"])
+def test_short_series_untouched(method):
+    y = _walk(10)
+    assert (downsample(y, 10, method) == np.arange(10)).all()
+    assert (downsample(y, 500, method) == np.arange(10)).all()
@@ -0,0 +1,89 @@
+from datetime import date
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlmodel import Session
+
+from models import Index
+
+
+@pytest.fixture(scope="module")
+def client(db):
+    from routers import index
+
+    app = FastAPI()
+    app.include_router(index.router, prefix="/api")
+    return TestClient(app)
+
+
+def _add(db, *names) -> list[int]:
+    with Session(db) as ss:
+        rows = [Index(name=n, base_date=date(2025, 1, 1), weighting="equal", base_value=1000.0) for n in names]
+        ss.add_all(rows)
+        ss.commit()
+        return [r.id for r in rows]
+
+
+def _names(resp) -> list[str]:
+    return [r["name"] for r in resp.json()]
+
+
+def test_prefix_match_on_every_word(client, db):
+    _add(db, "Zephyr Energy", "Zephyrine Tech", "Energy Zephyr Blend", "Quiet Banks", "Нефтегаз Плюс")
+
+    r = client.get("/api/index/indices", params={"q": "zeph"})
+    assert sorted(_names(r)) == ["Energy Zephyr Blend", "Zephyr Energy", "Zephyrine Tech"]
+    assert r.headers["X-Total-Count"] == "3"
+    # все слова обязательны, каждое — префикс
+    assert sorted(_names(client.get("/api/index/indices", params={"q": "ener zeph"}))) == [
+        "Energy Zephyr Blend", "Zephyr Energy",
+    ]
+    assert _names(client.get("/api/index/indices", params={"q": "нефте"})) == ["Нефтегаз Плюс"]
+    r = client.get("/api/index/indices", params={"q": "nomatchword"})
+    assert r.json() == [] and r.headers["X-Total-Count"] == "0"
+
+
+def test_triggers_follow_rename_and_delete(client, db):
+    (idx_id,) = _add(db, "Kestrel Value")
+    assert _names(client.get("/api/index/indices", params={"q": "kestrel"})) == ["Kestrel Value"]
+
+    with Session(db) as ss:
+        ss.get(Index, idx_id).name = "Osprey Value"
+        ss.commit()
+    assert client.get("/api/index/indices", params={"q": "kestrel"}).json() == []
+    assert _names(client.get("/api/index/indices", params={"q": "osprey"})) == ["Osprey Value"]
+
+    with Session(db) as ss:
+        ss.delete(ss.get(Index, idx_id))
+        ss.commit()
+    assert client.get("/api/index/indices", params={"q": "osprey"}).json() == []
+
+
+def test_bm25_keyset_cursor_walks_all_hits(client, db):
+    names = ["Harrier", "Harrier Growth", "Harrier Growth Income", "Harrier Small Cap Growth Fund"]
+    names += [f"Harrier Sector {i}" for i in range(6)]
+    _add(db, *names)
+
+    full = client.get("/api/index/indices", params={"q": "harrier", "limit": 500})
+    assert full.headers["X-Total-Count"] == str(len(names))
+    assert "X-Next-Cursor" not in full.headers
+    # самое короткое название — самый релевантный ответ
+    assert _names(full)[0] == "Harrier"
+
+    seen, cursor, pages = [], None, 0
+    while True:
+        params = {"q": "harrier", "limit": 3} | ({"cursor": cursor} if cursor else {})
+        page = client.get("/api/index/indices", params=params)
+        assert ("X-Total-Count" in page.headers) == (cursor is None)
+        seen += [r["id"] for r in page.json()]
+        pages += 1
+        cursor = page.headers.get("X-Next-Cursor")
+        if cursor is None:
+            break
+    assert seen == [r["id"] for r in full.json()]
+    assert pages == 4
+
+
+def test_malformed_cursor(client):
+    assert client.get("/api/index/indices", params={"q": "harrier", "cursor": "x"}).status_code == 422
@@ -0,0 +1,49 @@
+import asyncio
+from datetime import date
+
+import numpy as np
+import pandas as pd
+
+from services import index_builder
+from services.index_builder import series_matrix, weight_matrix
+
+
+def _closes() -> pd.DataFrame:
+    rng = np.random.default_rng(0)
+    dates = pd.bdate_range("2025-01-01", periods=20).date
+    closes = pd.DataFrame(rng.uniform(50, 150, (20, 4)), index=dates, columns=["A", "B", "C", "D"])
+    closes.iloc[:5, 2] = np.nan  # C ещё не торговалась
+    closes.iloc[12, 0] = np.nan  # у A нет свечи в один из дней
+    return closes
+
+
+def test_weight_matrix_places_triples():
+    m = weight_matrix([(7, "B", 0.5), (7, "A", 0.5), (3, "C", 1.0)], [3, 7], ["A", "B", "C"])
+    assert m.shape == (2, 3)
+    assert np.allclose(m.toarray(), [[0, 0, 1.0], [0.5, 0.5, 0]])
+    assert weight_matrix([], [1], ["A"]).nnz == 0
+
+
+def test_series_matrix_matches_compute_series(monkeypatch):
+    closes = _closes()
+    indices = {
+        1: {"A": 0.2, "B": 0.8},
+        2: {"C": 0.5, "D": 0.3, "A": 0.2},
+        3: {"D": 1.0},
+    }
+
+    async def close_matrix(secids, date_from, date_to, interval=24):
+        return closes[secids]
+
+    monkeypatch.setattr(index_builder, "close_matrix", close_matrix)
+    rows = [(k, s, w) for k, ws in indices.items() for s, w in ws.items()]
+    keys, secids = list(indices), list(closes.columns)
+    values = series_matrix(weight_matrix(rows, keys, secids), closes)
+
+    assert values.shape == (len(keys), len(closes))
+    # бумага без свечи в этот день ничего не добавляет
+    assert np.allclose(values[1, :5], 0.2 * closes["A"].iloc[:5] + 0.3 * closes["D"].iloc[:5])
+    for i, k in enumerate(keys):
+        one = asyncio.run(index_builder.compute_series(indices[k], date(2025, 1, 1), date(2025, 1, 28)))
+        assert [p["date"] for p in one] == [str(d) for d in closes.index]
+        assert np.allclose(values[i], [p["value"] for p in one])
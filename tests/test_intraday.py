@@ -0,0 +1,71 @@
+from datetime import date, timedelta
+
+import numpy as np
+from sqlmodel import Session, select
+
+from config import settings
+from models import IntradayBars
+from services.intraday import DAILY, pack, resample, roll_up, unpack
+
+SESSION = np.arange(600, 1130)  # 10:00–18:49, минута от полуночи
+
+
+def _row(secid, day, interval, minutes, closes):
+    m, c = pack(minutes, closes)
+    return IntradayBars(secid=secid, day=day, interval=interval, minutes=m, close=c)
+
+
+def test_pack_unpack_roundtrip():
+    closes = 100 + np.cumsum(np.random.default_rng(0).normal(0, 0.1, len(SESSION)))
+    row = _row("SBER", date(2026, 10, 16), 1, SESSION, closes)
+    assert len(row.minutes) == 2 * len(SESSION) and len(row.close) == 4 * len(SESSION)
+    minutes, back = unpack(row)
+    assert (minutes == SESSION).all()
+    assert np.allclose(back, closes, rtol=1e-6)  # float32
+
+
+def test_resample_takes_last_close_of_each_bucket():
+    minutes = np.array([600, 601, 609, 610, 625, 659, 700])
+    closes = np.array([1.0, 2.0, 3.0, 4.0, 5.0, 6.0, 7.0])
+    m10, c10 = resample(minutes, closes, 10)
+    assert m10.tolist() == [600, 610, 620, 650, 700]
+    assert c10.tolist() == [3.0, 4.0, 5.0, 6.0, 7.0]
+    m60, c60 = resample(minutes, closes, 60)
+    assert m60.tolist() == [600, 660] and c60.tolist() == [6.0, 7.0]
+    md, cd = resample(minutes, closes, DAILY)
+    assert md.tolist() == [700] and cd.tolist() == [7.0]
+    empty = np.array([], dtype=int), np.array([])
+    assert len(resample(*empty, 10)[0]) == 0
+
+
+def test_resample_is_composable():
+    closes = np.random.default_rng(1).uniform(90, 110, len(SESSION))
+    direct = resample(SESSION, closes, 60)
+    via_10 = resample(*resample(SESSION, closes, 10), 60)
+    assert (direct[0] == via_10[0]).all() and (direct[1] == via_10[1]).all()
+
+
+def test_roll_up_moves_old_days_to_coarser_tiers(db):
+    today = date(2026, 10, 19)
+    old_1m = today - timedelta(days=settings.INTRADAY_KEEP_1M_DAYS + 1)
+    old_10m = today - timedelta(days=settings.INTRADAY_KEEP_10M_DAYS + 1)
+    fresh = today - timedelta(days=1)
+    closes = np.linspace(100, 110, len(SESSION))
+    with Session(db) as ss:
+        ss.add(_row("ROLL", old_1m, 1, SESSION, closes))
+        ss.add(_row("ROLL", fresh, 1, SESSION, closes))
+        ss.add(_row("ROLL", old_10m, 10, *resample(SESSION, closes, 10)))
+        ss.commit()
+
+    done = roll_up(today)
+    assert done == {1: 1, 10: 1}
+
+    with Session(db) as ss:
+        rows = {(r.day, r.interval): r for r in ss.exec(select(IntradayBars).where(IntradayBars.secid == "ROLL"))}
+    assert set(rows) == {(old_1m, 10), (fresh, 1), (old_10m, 60)}
+    for (day, tier), row in rows.items():
+        expected = resample(SESSION, closes, tier)
+        minutes, close = unpack(row)
+        assert (minutes == expected[0]).all()
+        assert np.allclose(close, expected[1])
+    assert roll_up(today) == {1: 0, 10: 0}
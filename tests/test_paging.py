@@ -0,0 +1,36 @@
+from datetime import datetime
+
+import pandas as pd
+
+from utils.paging import BAR_FMT, DAY_FMT, keyset_page
+
+
+def test_intraday_pages_walk_through_one_day():
+    # 10-минутные бары одной сессии: в дне больше баров, чем limit
+    ts = pd.date_range("2026-10-12 10:00", "2026-10-12 18:40", freq="10min")
+    df = pd.DataFrame({"ts": ts, "value": range(len(ts))})
+
+    seen, cursor = [], None
+    for _ in range(len(ts)):
+        page, next_cursor = keyset_page(df, "ts", cursor and datetime.fromisoformat(cursor), 5, BAR_FMT)
+        seen += page["value"].tolist()
+        if next_cursor is None:
+            break
+        assert next_cursor != cursor, "cursor must move forward"
+        cursor = next_cursor
+    else:
+        raise AssertionError("paging did not terminate")
+
+    assert seen == list(range(len(ts)))
+    assert cursor == "2026-10-12T18:10:00"
+
+
+def test_daily_cursor_is_a_date():
+    df = pd.DataFrame({"date": pd.date_range("2025-01-01", periods=7, freq="D"), "value": range(7)})
+
+    page, cursor = keyset_page(df, "date", None, 3, DAY_FMT)
+    assert cursor == "2025-01-03"
+    page, cursor = keyset_page(df, "date", datetime.fromisoformat(cursor), 3, DAY_FMT)
+    assert page["value"].tolist() == [3, 4, 5]
+    page, cursor = keyset_page(df, "date", datetime.fromisoformat(cursor), 3, DAY_FMT)
+    assert page["value"].tolist() == [6] and cursor is None
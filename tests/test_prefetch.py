@@ -0,0 +1,11 @@
+import asyncio
+
+from services import calendar, prefetch, valuation
+
+
+def test_flush_requested_moves_buffer_to_recent_securities(db):
+    today = calendar.now().date()
+    valuation.REQUESTED.update({"SBER": today, "GAZP": today})
+    asyncio.run(prefetch.flush_requested())
+    assert not valuation.REQUESTED
+    assert {"SBER", "GAZP"} <= set(prefetch.active_secids())
@@ -0,0 +1,76 @@
+from datetime import date
+
+import pytest
+from fastapi import FastAPI, Request
+from fastapi.testclient import TestClient
+
+from services import calendar, result_cache
+from utils.encoding import preferred
+
+
+@pytest.fixture(autouse=True)
+def empty_cache():
+    result_cache.cache.clear()
+    yield
+    result_cache.cache.clear()
+
+
+def test_etag_and_304_without_recompute():
+    app, calls = FastAPI(), []
+
+    @app.get("/value")
+    async def value(request: Request, version: str):
+        async def compute():
+            calls.append(version)
+            return {"value": 42, "version": version}
+        return await result_cache.respond(request, "value", {}, version, compute)
+
+    client = TestClient(app)
+    first = client.get("/value", params={"version": "2026-10-16"})
+    etag = first.headers["etag"]
+    assert first.status_code == 200 and etag
+
+    again = client.get("/value", params={"version": "2026-10-16"}, headers={"If-None-Match": etag})
+    assert again.status_code == 304 and again.content == b""
+    assert again.headers["etag"] == etag
+    assert calls == ["2026-10-16"]
+
+    # новая версия данных — другой ключ: пересчёт, старый ETag не подходит
+    fresh = client.get("/value", params={"version": "2026-10-19"}, headers={"If-None-Match": etag})
+    assert fresh.status_code == 200 and fresh.headers["etag"] != etag
+    assert calls == ["2026-10-16", "2026-10-19"]
+
+
+def test_report_cache_hit_skips_valuation(db, monkeypatch):
+    from routers import report
+
+    valuated = []
+
+    async def fake_valuate(assets):
+        valuated.append(assets)
+        raise ValueError("no common history")
+
+    session = date(2026, 10, 16)
+    monkeypatch.setattr(report, "valuate", fake_valuate)
+    monkeypatch.setattr(calendar, "last_session", lambda ts=None: session)
+    app = FastAPI()
+    app.include_router(report.router, prefix="/api")
+    client = TestClient(app)
+    body = {"assets": [{"secid": "SBER", "shares": 10}]}
+
+    # готовый отчёт за эту сессию уже в кэше
+    payload = {"assets": [("SBER", 10)]}
+    media = preferred(Request({"type": "http", "headers": []}))
+    key = result_cache.make_key("report", payload, str(session), media)
+    result_cache.cache.put(key, result_cache._Entry(b"<html/>", "text/html", '"r1"'))
+
+    hit = client.post("/api/report/", json=body)
+    assert hit.status_code == 200 and hit.content == b"<html/>"
+    assert client.post("/api/report/", json=body, headers={"If-None-Match": '"r1"'}).status_code == 304
+    assert valuated == []
+
+    # закрылась следующая сессия — ключ другой, цены загружаются заново
+    monkeypatch.setattr(calendar, "last_session", lambda ts=None: date(2026, 10, 19))
+    miss = client.post("/api/report/", json=body, headers={"If-None-Match": '"r1"'})
+    assert miss.status_code == 400
+    assert len(valuated) == 1
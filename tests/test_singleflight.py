@@ -0,0 +1,56 @@
+import asyncio
+
+import pytest
+
+from utils.singleflight import SingleFlight
+
+
+def test_concurrent_calls_share_one_load():
+    async def main():
+        flight, calls = SingleFlight(), []
+
+        async def load():
+            calls.append(1)
+            await asyncio.sleep(0.01)
+            return len(calls)
+
+        results = await asyncio.gather(*[flight.do("k", load) for _ in range(5)])
+        assert results == [1] * 5 and "k" not in flight
+        # готовое не запоминается: следующий вызов загружает заново
+        assert await flight.do("k", load) == 2
+
+    asyncio.run(main())
+
+
+def test_error_reaches_every_waiter():
+    async def main():
+        flight = SingleFlight()
+
+        async def fail():
+            await asyncio.sleep(0.01)
+            raise ValueError("boom")
+
+        results = await asyncio.gather(*[flight.do("k", fail) for _ in range(3)], return_exceptions=True)
+        assert all(isinstance(r, ValueError) for r in results)
+
+    asyncio.run(main())
+
+
+def test_cancelled_waiter_does_not_cancel_load():
+    async def main():
+        flight = SingleFlight()
+
+        async def load():
+            await asyncio.sleep(0.02)
+            return "ok"
+
+        leader = asyncio.create_task(flight.do("k", load))
+        await asyncio.sleep(0)
+        waiter = asyncio.create_task(flight.do("k", load))
+        await asyncio.sleep(0)
+        waiter.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiter
+        assert await leader == "ok"
+
+    asyncio.run(main())
@@ -0,0 +1,131 @@
+import asyncio
+import time
+
+import aiohttp
+import pytest
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+
+from config import settings
+from services import upstream
+
+
+@pytest.fixture(autouse=True)
+def fast_settings(monkeypatch):
+    monkeypatch.setattr(settings, "UPSTREAM_TIMEOUT", 2.0)
+    monkeypatch.setattr(settings, "UPSTREAM_DEADLINE", 5.0)
+    monkeypatch.setattr(settings, "UPSTREAM_RETRIES", 2)
+    monkeypatch.setattr(settings, "UPSTREAM_BACKOFF", 0.001)
+    monkeypatch.setattr(settings, "UPSTREAM_BREAKER_FAILURES", 3)
+    monkeypatch.setattr(settings, "UPSTREAM_BREAKER_COOLDOWN", 0.2)
+    upstream._HEALTH.clear()
+    yield
+    upstream._HEALTH.clear()
+
+
+def _serve(handler, scenario):
+    """Запустить стенд с handler на GET /x и выполнить scenario(get, hits)."""
+    hits = []
+
+    async def counted(request):
+        hits.append(time.monotonic())
+        return await handler(len(hits))
+
+    async def main():
+        app = web.Application()
+        app.router.add_get("/x", counted)
+        async with TestServer(app) as server:
+            url = str(server.make_url("/x"))
+
+            async def get():
+                async with upstream.ResilientSession(aiohttp.ClientSession()) as s, s.get(url) as r:
+                    return r.status, await r.text()
+
+            return await scenario(get, hits)
+
+    return asyncio.run(main())
+
+
+def test_retries_transient_errors():
+    async def handler(n):
+        return web.Response(status=503) if n <= 2 else web.Response(text="ok")
+
+    async def scenario(get, hits):
+        assert await get() == (200, "ok")
+        assert len(hits) == 3
+
+    _serve(handler, scenario)
+
+
+def test_breaker_opens_then_half_open_probe_closes_it():
+    healthy = False
+
+    async def handler(n):
+        return web.Response(text="ok") if healthy else web.Response(status=500)
+
+    async def scenario(get, hits):
+        nonlocal healthy
+        with pytest.raises(upstream.UpstreamUnavailable):
+            await get()
+        assert len(hits) == 3  # попытка и два повтора, третья неудача размыкает хост
+
+        # разомкнут: вызов отклоняется без обращения к хосту
+        with pytest.raises(upstream.UpstreamUnavailable, match="circuit open"):
+            await get()
+        assert len(hits) == 3
+        assert upstream.retry_after("127.0.0.1") >= 1
+
+        # пауза прошла: пробный запрос проходит, успех замыкает хост
+        await asyncio.sleep(settings.UPSTREAM_BREAKER_COOLDOWN)
+        healthy = True
+        assert await get() == (200, "ok")
+        assert not upstream._health("127.0.0.1").is_open
+
+    _serve(handler, scenario)
+
+
+def test_failed_half_open_probe_reopens():
+    async def handler(n):
+        return web.Response(status=500)
+
+    async def scenario(get, hits):
+        with pytest.raises(upstream.UpstreamUnavailable):
+            await get()
+        await asyncio.sleep(settings.UPSTREAM_BREAKER_COOLDOWN)
+        with pytest.raises(upstream.UpstreamUnavailable):
+            await get()
+        # одна неудачная проба снова размыкает — без повторов
+        assert len(hits) == 4
+        assert upstream._health("127.0.0.1").is_open
+
+    _serve(handler, scenario)
+
+
+def test_slow_request_is_hedged():
+    async def handler(n):
+        if n == 1:
+            await asyncio.sleep(1.0)
+            return web.Response(text="slow")
+        return web.Response(text="fast")
+
+    async def scenario(get, hits):
+        # история задержек хоста: перцентиль ниже HEDGE_MIN_DELAY
+        upstream._health("127.0.0.1").latencies.extend([0.01] * upstream.HEDGE_MIN_SAMPLES)
+        t0 = time.monotonic()
+        assert await get() == (200, "fast")
+        assert time.monotonic() - t0 < 0.5
+        assert len(hits) == 2
+
+    _serve(handler, scenario)
+
+
+def test_no_hedge_without_latency_history():
+    async def handler(n):
+        await asyncio.sleep(0.1)
+        return web.Response(text="ok")
+
+    async def scenario(get, hits):
+        assert await get() == (200, "ok")
+        assert len(hits) == 1
+
+    _serve(handler, scenario)
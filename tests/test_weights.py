@@ -0,0 +1,107 @@
+import numpy as np
+import pytest
+
+from services.covariance import ledoit_wolf
+from utils import weights
+from utils.weights import SOLVERS, max_diversification, min_variance, risk_parity
+
+
+def _random_cov(n: int, seed: int) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    a = rng.normal(size=(3 * n, n)) * rng.uniform(0.5, 2, n)
+    return a.T @ a / (3 * n)
+
+
+def test_diagonal_cov_closed_forms():
+    sigma = np.array([0.1, 0.2, 0.4])
+    cov = np.diag(sigma ** 2)
+    inv_var = 1 / sigma ** 2
+    inv_vol = 1 / sigma
+    assert np.allclose(min_variance(cov), inv_var / inv_var.sum())
+    # без корреляций паритет риска и максимальная диверсификация — веса ∝ 1/σ
+    assert np.allclose(risk_parity(cov), inv_vol / inv_vol.sum())
+    assert np.allclose(max_diversification(cov), inv_vol / inv_vol.sum())
+
+
+def test_min_variance_two_assets():
+    s1, s2, rho = 0.2, 0.3, 0.4
+    c = rho * s1 * s2
+    cov = np.array([[s1 * s1, c], [c, s2 * s2]])
+    w1 = (s2 * s2 - c) / (s1 * s1 + s2 * s2 - 2 * c)
+    assert np.allclose(min_variance(cov), [w1, 1 - w1])
+
+
+def test_min_variance_long_only_corner():
+    # сильная корреляция и разная волатильность: без ограничения вес второй бумаги отрицателен
+    s1, s2, rho = 0.1, 0.3, 0.9
+    c = rho * s1 * s2
+    cov = np.array([[s1 * s1, c], [c, s2 * s2]])
+    assert (s2 * s2 - c) / (s1 * s1 + s2 * s2 - 2 * c) > 1
+    assert np.allclose(min_variance(cov), [1, 0])
+
+
+def test_risk_parity_equal_contributions():
+    cov = _random_cov(8, seed=1)
+    w = risk_parity(cov)
+    contrib = w * (cov @ w)
+    assert np.isclose(w.sum(), 1) and (w > 0).all()
+    assert np.allclose(contrib, contrib.mean(), rtol=1e-8)
+
+
+@pytest.mark.parametrize("name", sorted(SOLVERS))
+def test_solvers_long_only_normalized(name):
+    w = SOLVERS[name](_random_cov(12, seed=2))
+    assert np.isclose(w.sum(), 1) and (w >= 0).all()
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_projected_fallback_matches_active_set(seed):
+    cov = _random_cov(10, seed)
+    w = min_variance(cov)
+    fallback = weights._projected_min_variance(cov)
+    assert np.isclose(fallback.sum(), 1) and (fallback >= 0).all()
+    assert fallback @ cov @ fallback == pytest.approx(w @ cov @ w, rel=1e-6)
+
+
+def test_min_variance_falls_back_when_active_set_does_not_converge(monkeypatch):
+    cov = _random_cov(6, seed=3)
+    expected = min_variance(cov)
+
+    def singular(a, b):
+        raise np.linalg.LinAlgError("singular")
+
+    monkeypatch.setattr(weights.np.linalg, "solve", singular)
+    w = min_variance(cov)
+    assert np.allclose(w, expected, atol=1e-5)
+
+
+def test_min_variance_singular_cov():
+    # две одинаковые бумаги: Σ вырождена, решение — любое деление между ними
+    cov = np.array([[0.04, 0.04, 0.0], [0.04, 0.04, 0.0], [0.0, 0.0, 0.09]])
+    w = min_variance(cov)
+    assert np.isclose(w.sum(), 1) and (w >= -1e-12).all()
+    assert w @ cov @ w == pytest.approx(1 / (1 / 0.04 + 1 / 0.09), rel=1e-6)
+
+
+def test_ledoit_wolf_hand_computed():
+    x = np.array([[1.0, 0.0], [-1.0, 0.0], [0.0, 2.0], [0.0, -2.0]])
+    # S = diag(0.5, 2), μ = 1.25, π = 8.5 − 4.25, δ² = 1.125 → усадка π / T / δ² = 17/18
+    k = 17 / 18
+    expected = np.diag([(1 - k) * 0.5 + k * 1.25, (1 - k) * 2 + k * 1.25])
+    assert np.allclose(ledoit_wolf(x), expected)
+
+
+def test_ledoit_wolf_keeps_scaled_identity():
+    # выборочная ковариация уже равна μI — сжимать некуда
+    x = np.array([[1.0, 1.0], [1.0, -1.0], [-1.0, 1.0], [-1.0, -1.0]])
+    assert np.allclose(ledoit_wolf(x), np.eye(2))
+
+
+def test_ledoit_wolf_preserves_trace():
+    rng = np.random.default_rng(4)
+    x = rng.normal(size=(30, 20))
+    s = np.cov(x, rowvar=False, bias=True)
+    lw = ledoit_wolf(x)
+    assert np.isclose(np.trace(lw), np.trace(s))
+    # мало наблюдений на число бумаг: оценка ближе к μI, собственные числа сжаты
+    assert np.ptp(np.linalg.eigvalsh(lw)) < np.ptp(np.linalg.eigvalsh(s))